@@ -0,0 +1,8 @@
+--! Previous: sha1:914d20d8e81f79b1e98e114302e6e48534463c27
+--! Hash: sha1:3869926c9376cf622cfbfa057a09dea340f0bab7
+
+-- NB: several chains may share the genesis tables, see scripts/genesis.py
+ALTER TABLE IF EXISTS app.genesis_balances ADD COLUMN IF NOT EXISTS chain_id text;
+ALTER TABLE IF EXISTS app.contracts ADD COLUMN IF NOT EXISTS chain_id text;
+CREATE INDEX IF NOT EXISTS genesis_balances_chain_id ON app.genesis_balances (chain_id);
+CREATE INDEX IF NOT EXISTS contracts_chain_id ON app.contracts (chain_id);
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import argparse
+import random
+import time
+from os import environ
+
+import psycopg
+
+from src.genesis.db.table_manager import TableManager
+from src.genesis.processing.balances import BalanceManager
+
+default_db_host = "localhost"
+default_db_port = 5432
+default_db_user = "subquery"
+default_db_pass = "subquery"
+default_db_name = "subquery"
+default_rows = 1_000_000
+
+BENCHMARK_TABLE_ID = "genesis_balances_benchmark"
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=default_rows,
+        dest="rows",
+        help=f"Number of synthetic genesis_balances rows to copy (default: {default_rows})",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        dest="repeat",
+        help="Number of runs per COPY format, the best one is reported (default: 3)",
+    )
+
+    parser.add_argument(
+        "--db-host",
+        type=str,
+        default=default_db_host,
+        dest="db_host",
+        help="Database hostname (default: localhost)",
+    )
+
+    parser.add_argument(
+        "--db-port",
+        type=str,
+        default=default_db_port,
+        dest="db_port",
+        help="Database port number (default: 5432)",
+    )
+
+    parser.add_argument(
+        "--db-user",
+        type=str,
+        default=default_db_user,
+        dest="db_user",
+        help="Database username (default: subquery)",
+    )
+
+    parser.add_argument(
+        "--db-pass",
+        type=str,
+        default=default_db_pass,
+        dest="db_pass",
+        help="Database password (default: subquery)",
+    )
+
+    parser.add_argument(
+        "--db-name",
+        type=str,
+        default=default_db_name,
+        dest="db_name",
+        help="Database name to use (default: subquery)",
+    )
+
+
+def generate_rows(count: int):
+    rng = random.Random(0)
+    denoms = ("afet", "nanomobx", "ibc/" + "A" * 64)
+    rows = []
+    for i in range(count):
+        address = f"fetch1{i:038d}"
+        denom = denoms[i % len(denoms)]
+        # 18 decimal denominations put mainnet amounts well beyond 64 bits
+        amount = rng.randrange(10**26, 10**28)
+        rows.append((f"{address}-{denom}", address, amount, denom))
+    return rows
+
+
+def copy_rows(db_conn: psycopg.Connection, rows, binary_copy: bool) -> float:
+    table_manager = TableManager(
+        db_conn,
+        BENCHMARK_TABLE_ID,
+        BalanceManager(db_conn).table_manager.columns,
+        binary_copy=binary_copy,
+    )
+    table_manager.create_temp_table()
+
+    start = time.perf_counter()
+    with table_manager.db_copy(commit=False) as copy:
+        for row in rows:
+            copy.write_row(row)
+    elapsed = time.perf_counter() - start
+
+    # drops the temporary table
+    db_conn.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""
+        Compare text and binary COPY throughput of genesis_balances rows into a temporary table.
+        Environment variables DB_HOST, DB_PORT, DB_USER, DB_PASS, and DB_NAME will override flags.
+    """
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    db_connection = psycopg.connect(
+        host=environ.get("DB_HOST") or args.db_host,
+        port=environ.get("DB_PORT") or args.db_port,
+        dbname=environ.get("DB_NAME") or args.db_name,
+        user=environ.get("DB_USER") or args.db_user,
+        password=environ.get("DB_PASS") or args.db_pass,
+    )
+
+    rows = generate_rows(args.rows)
+    for binary_copy in (False, True):
+        elapsed = min(
+            copy_rows(db_connection, rows, binary_copy) for _ in range(args.repeat)
+        )
+        label = "binary" if binary_copy else "text"
+        print(
+            f"{label:<8} {len(rows)} rows in {elapsed:6.2f}s, {len(rows) / elapsed:12,.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 #!/usr/bin/env python
 
 import argparse
-import json
+import logging
 from os import environ
-from typing import Dict
-from urllib.request import urlopen
 
 import psycopg
-from src.genesis.genesis import process_genesis
+from src.genesis.compiled import compile_genesis, load_compiled
+from src.genesis.diff import process_genesis_diff
+from src.genesis.genesis import process_genesis_sources
+from src.genesis.helpers.sharding import Shard
+from src.genesis.parquet import export_parquet
+from src.genesis.sources.download import DownloadCache
+from src.genesis.sources.genesis_source import GenesisSource
 
 dorado_genesis_url = (
     "https://storage.googleapis.com/fetch-ai-testnet-genesis/genesis-dorado-827201.json"
@@ -21,24 +25,14 @@ default_db_schema = "app"
 default_db_name = "subquery"
 
 
-def download_json(json_url: str) -> Dict:
-    # TODO: can we do this as a stream?
-
-    with urlopen(json_url) as response:
-        # TODO: handle error
-        data = json.loads(response.read())
-
-    return data
-
-
 def add_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
-        "json_url",
+        "json_urls",
         metavar="JSON_URL",
         type=str,
-        nargs="?",
-        default=dorado_genesis_url,
-        help="URL to genesis JSON data to process",
+        nargs="*",
+        default=[dorado_genesis_url],
+        help="URLs or local paths to genesis JSON data to process (e.g. of several chains, processed concurrently into tables partitioned by chain_id, see --partitioned), streamed rather than loaded into memory",
     )
 
     parser.add_argument(
@@ -95,6 +89,206 @@ def add_arguments(parser: argparse.ArgumentParser):
         help="Database name to use (default: subquery)",
     )
 
+    parser.add_argument(
+        "--fused",
+        action="store_true",
+        dest="fused",
+        help="Populate accounts and genesis_balances from a single pass over the bank balances, committed together",
+    )
+
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        dest="concurrent",
+        help="Process independent genesis sections in parallel, each over its own DB connection",
+    )
+
+    parser.add_argument(
+        "--binary-copy",
+        action="store_true",
+        dest="binary_copy",
+        help="Use binary rather than text COPY, values are sent in their typed wire format",
+    )
+
+    parser.add_argument(
+        "--shadow-load",
+        action="store_true",
+        dest="shadow_load",
+        help="Load empty tables into an UNLOGGED shadow table which is indexed then swapped in, keeping the load out of the WAL",
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        dest="chunk_size",
+        help="Commit every CHUNK_SIZE items of a section and checkpoint the progress, a restarted run resumes after the last committed chunk",
+    )
+
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        dest="restart",
+        help="Discard the checkpoints and completed sections of previous runs and process every item again",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        dest="cache_dir",
+        help="Download the genesis JSON into CACHE_DIR (resuming partial downloads) and reuse it while it's unchanged, otherwise it's streamed",
+    )
+
+    parser.add_argument(
+        "--spool-cache-dir",
+        type=str,
+        default=None,
+        dest="spool_cache_dir",
+        help="Keep the parsed genesis sections in SPOOL_CACHE_DIR, later runs of the same (local or cached) genesis skip parsing it",
+    )
+
+    parser.add_argument(
+        "--decode-workers",
+        type=int,
+        default=None,
+        dest="decode_workers",
+        help="Decode the genesis items and build their rows over DECODE_WORKERS processes, sections only forward the COPY data (not with --binary-copy)",
+    )
+
+    parser.add_argument(
+        "--copy-shards",
+        type=int,
+        default=1,
+        dest="copy_shards",
+        help="Load genesis_balances over COPY_SHARDS parallel COPY streams and connections, sharded by account (not with --fused)",
+    )
+
+    parser.add_argument(
+        "--only",
+        action="append",
+        default=None,
+        dest="only",
+        help="Only process the sections named ONLY, or reading module ONLY (e.g. contracts, bank, wasm), may be repeated; wasm codes, contracts and states (e.g. --only wasm) are only processed when selected",
+    )
+
+    parser.add_argument(
+        "--skip",
+        action="append",
+        default=[],
+        dest="skip",
+        help="Don't process the sections named SKIP, or reading module SKIP (e.g. contracts, bank, wasm), may be repeated",
+    )
+
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=None,
+        dest="shard_index",
+        help="Only process the items of shard SHARD_INDEX (of --shard-count, by address) e.g. as one pod of an indexed Job, the last shard to complete builds the indexes",
+    )
+
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=1,
+        dest="shard_count",
+        help="Number of shards the genesis items are split into, the same for every shard of a run (a single shard processes every item, as without --shard-index)",
+    )
+
+    parser.add_argument(
+        "--export-height",
+        type=int,
+        default=None,
+        dest="export_height",
+        help="Height of the state export (e.g. `fetchd export`) JSON_URL is, by default the one before its initial_height; recorded in genesis_baselines, the node starts from the next block",
+    )
+
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        dest="partitioned",
+        help="Create the genesis_balances and contracts tables which don't exist yet partitioned by chain_id (PARTITION BY LIST), one partition per chain",
+    )
+
+    parser.add_argument(
+        "--reload-chain",
+        action="store_true",
+        dest="reload_chain",
+        help="Drop the partitions of each JSON_URL's chain in partitioned tables and load them again (implies --restart, not with --shard-index)",
+    )
+
+    parser.add_argument(
+        "--shadow-schema",
+        type=str,
+        default=None,
+        dest="shadow_schema",
+        help="Load and index the tables into this schema (created empty), then swap them in at once while queries carry on over the previous ones; accounts and contracts are merged (implies --restart, a single JSON_URL, not with --shard-index, --shadow-load or --partitioned)",
+    )
+
+    parser.add_argument(
+        "--compile-to",
+        type=str,
+        default=None,
+        dest="compile_to",
+        help="Write the rows of JSON_URL as text COPY files and a manifest into this directory instead, without a DB connection (accounts, balances and contracts, or the --only processors; not wasm codes and contract states)",
+    )
+
+    parser.add_argument(
+        "--compile-parts",
+        type=int,
+        default=1,
+        dest="compile_parts",
+        help="COPY files per table for --compile-to, rows split by hash of their primary key (default: 1)",
+    )
+
+    parser.add_argument(
+        "--compile-sorted",
+        action="store_true",
+        dest="compile_sorted",
+        help='Sort the rows of every COPY file by primary key for --compile-to, in COLLATE "C" order, spilling to --spill-dir; indexes built over them are only laid out in order if the key column has the "C" collation',
+    )
+
+    parser.add_argument(
+        "--parquet-to",
+        type=str,
+        default=None,
+        dest="parquet_to",
+        help="Write accounts, genesis_balances and contracts (or the --only processors) of JSON_URL as Parquet files into this directory instead, without a DB connection (requires pyarrow)",
+    )
+
+    parser.add_argument(
+        "--load-compiled",
+        type=str,
+        default=None,
+        dest="load_compiled",
+        help="Load the COPY files of a --compile-to directory (into tables without their rows, e.g. a new DB) instead of JSON_URL, then build the indexes",
+    )
+
+    parser.add_argument(
+        "--load-workers",
+        type=int,
+        default=None,
+        dest="load_workers",
+        help="Parallel connections loading the COPY files of a table for --load-compiled (default: one per file)",
+    )
+
+    parser.add_argument(
+        "--diff-from",
+        type=str,
+        default=None,
+        dest="diff_from",
+        help="URL or local path to the genesis JSON (e.g. a previous state export) the DB was loaded from, only the balance and contract rows which differ in JSON_URL are written",
+    )
+
+    parser.add_argument(
+        "--spill-dir",
+        type=str,
+        default=None,
+        dest="spill_dir",
+        help="Directory the genesis items are spooled in, and sorted runs spilled to, for --diff-from, --compile-to and --parquet-to (default: the system's temporary directory)",
+    )
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -114,6 +308,40 @@ def main():
     add_arguments(parser)
     args = parser.parse_args()
 
+    # per-section timings are logged at info level
+    logging.getLogger().setLevel(logging.INFO)
+
+    download_cache = (
+        DownloadCache(args.cache_dir) if args.cache_dir is not None else None
+    )
+    if args.compile_to is not None:
+        if len(args.json_urls) != 1:
+            raise Exception("--compile-to takes a single JSON_URL")
+        # NB: offline, no DB connection
+        compile_genesis(
+            GenesisSource(args.json_urls[0], download_cache),
+            args.compile_to,
+            parts=args.compile_parts,
+            sort=args.compile_sorted,
+            only=args.only,
+            skip=args.skip,
+            spill_dir=args.spill_dir,
+            export_height=args.export_height,
+        )
+        return
+
+    if args.parquet_to is not None:
+        if len(args.json_urls) != 1:
+            raise Exception("--parquet-to takes a single JSON_URL")
+        export_parquet(
+            GenesisSource(args.json_urls[0], download_cache),
+            args.parquet_to,
+            only=args.only,
+            skip=args.skip,
+            spill_dir=args.spill_dir,
+        )
+        return
+
     db_host = env_db_host or args.db_host
     if db_host is None:
         raise Exception("either --db-host flag OR DB_HOST env var must be set")
@@ -133,10 +361,67 @@ def main():
         "options": f"-c search_path={db_schema}",
     }
 
+    if args.decode_workers and args.binary_copy:
+        raise Exception("--decode-workers sends text COPY data, not with --binary-copy")
+
+    shard = None
+    if args.shard_index is not None:
+        if not 0 <= args.shard_index < args.shard_count:
+            raise Exception("--shard-index must be in [0, --shard-count)")
+        # NB: a single shard is the whole run, its sections keep their names
+        if args.shard_count > 1:
+            shard = Shard(args.shard_index, args.shard_count)
+
     db_connection = psycopg.connect(**connection_args)
-    data = download_json(args.json_url)
+    if args.load_compiled is not None:
+        load_compiled(
+            db_connection, args.load_compiled, args.load_workers, schema=db_schema
+        )
+        return
+
+    sources = [GenesisSource(url, download_cache) for url in args.json_urls]
+    if args.export_height is not None and len(sources) != 1:
+        raise Exception("--export-height takes a single JSON_URL")
 
-    process_genesis(db_connection, data)
+    if args.shadow_schema is not None and len(sources) != 1:
+        raise Exception("--shadow-schema takes a single JSON_URL")
+
+    if args.diff_from is not None:
+        if len(sources) != 1:
+            raise Exception("--diff-from takes a single JSON_URL")
+        process_genesis_diff(
+            db_connection,
+            GenesisSource(args.diff_from, download_cache),
+            sources[0],
+            only=args.only,
+            skip=args.skip,
+            directory=args.spill_dir,
+            export_height=args.export_height,
+            schema=db_schema,
+        )
+        return
+
+    process_genesis_sources(
+        db_connection,
+        sources,
+        fused=args.fused,
+        concurrent=args.concurrent,
+        binary_copy=args.binary_copy,
+        shadow_load=args.shadow_load,
+        chunk_size=args.chunk_size,
+        restart=args.restart,
+        decode_workers=args.decode_workers,
+        copy_shards=args.copy_shards,
+        shard=shard,
+        spool_cache=args.spool_cache_dir,
+        only=args.only,
+        skip=args.skip,
+        export_height=args.export_height,
+        partitioned=args.partitioned,
+        reload_chain=args.reload_chain,
+        schema=db_schema,
+        shadow_schema=args.shadow_schema,
+    )
 
 
 if __name__ == "__main__":
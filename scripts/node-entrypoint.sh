@@ -1,6 +1,20 @@
 #!/bin/sh
 set -e
 
+export PGPASSWORD=$DB_PASS
+
+# start after the state export the genesis tables were seeded from, if any
+if [[ -z "${START_BLOCK}" ]]; then
+    baseline_chain_id=${CHAIN_ID:-$(yq '.network.chainId' project.yaml)}
+    START_BLOCK=$(psql -h $DB_HOST \
+                       -U $DB_USER \
+                       -p $DB_PORT \
+                       -tA \
+                       -c "SELECT height + 1 FROM ${DB_SCHEMA:-app}.genesis_baselines WHERE chain_id = '${baseline_chain_id}';" \
+                       $DB_DATABASE 2>/dev/null || true)
+    export START_BLOCK
+fi
+
 # perform any updates that are required based on the environment variables
 if [[ ! -z "${START_BLOCK}" ]]; then
     echo "[Config Update] Start Block: ${START_BLOCK}"
@@ -17,7 +31,6 @@ if [[ ! -z "${NETWORK_ENDPOINT}" ]]; then
     yq -i '.network.endpoint = strenv(NETWORK_ENDPOINT)' project.yaml
 fi
 
-export PGPASSWORD=$DB_PASS
 has_migrations=$(psql -h $DB_HOST \
                       -U $DB_USER \
                       -p $DB_PORT \
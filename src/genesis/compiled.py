@@ -0,0 +1,237 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import IO, Any, Collection, Dict, Iterator, List, Optional
+
+from psycopg import Connection
+
+from src.genesis.db.baselines import GenesisBaselines, get_export_height
+from src.genesis.db.connection import clone_connection
+from src.genesis.db.copy_encoder import format_copy_row
+from src.genesis.db.indexes import build_indexes
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, TableManager
+from src.genesis.helpers.external_sort import DEFAULT_RUN_SIZE, sort_lines
+from src.genesis.helpers.sharding import get_shard
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    INITIAL_HEIGHT_PATH,
+    GenesisProcessor,
+)
+from src.genesis.processing.registry import PROCESSORS, select_processors
+from src.genesis.sources.genesis_source import GenesisSource
+from src.genesis.sources.genesis_spool import GenesisSpool
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+# NB: large enough for the server, small enough not to hold whole parts
+READ_SIZE = 1 << 20
+
+
+def get_part_name(table: str, part: int) -> str:
+    return f"{table}.{part}.copy"
+
+
+def _get_key(line: str) -> str:
+    # NB: the first column is the primary key, as escaped in the COPY line
+    return line.split("\t", 1)[0]
+
+
+def iter_copy_lines(
+    spool: GenesisSpool, processor: GenesisProcessor, chain_id: str
+) -> Iterator[str]:
+    """Text COPY lines of the rows of every item of processor (see get_rows)."""
+    assert processor.get_rows is not None
+    for item in spool.iter_items(processor.path):
+        for row in processor.get_rows(item, chain_id):
+            yield format_copy_row(row)
+
+
+def compile_genesis(
+    source: GenesisSource,
+    directory: str,
+    parts: int = 1,
+    sort: bool = False,
+    only: Optional[Collection[str]] = None,
+    skip: Collection[str] = (),
+    run_size: int = DEFAULT_RUN_SIZE,
+    spill_dir: Optional[str] = None,
+    export_height: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Write the rows of source as text COPY files in directory, without a database
+    connection: parts files per table (rows by hash of their primary key, see
+    get_shard) and a manifest, for load_compiled or e.g. `\\copy` / COPY FROM 'file'
+    on the database host
+
+    NB: only processors declaring their rows (see GenesisProcessor.get_rows) are
+    compiled, i.e. not wasm codes and contract states
+
+    :param sort: rows of every part in order of their primary key, that of COLLATE
+        "C" (code points, i.e. bytes of UTF-8; sorted runs beyond run_size rows are
+        spilled to spill_dir). Indexes built over them are only laid out in order if
+        the key column has the "C" collation, not e.g. a database default of
+        en_US.UTF-8. NB: keys are compared as escaped in the COPY text, the same for
+        ids without backslashes or control characters
+    :param export_height: height of the state export source is, by default the one
+        before its initial_height; recorded by load_compiled
+    :return: the manifest
+    """
+    processors = [
+        processor
+        for processor in select_processors(False, only, skip)
+        if processor.get_rows is not None
+    ]
+    os.makedirs(directory, exist_ok=True)
+
+    manifest: Dict[str, Any] = {"version": MANIFEST_VERSION, "tables": []}
+    with GenesisSpool(
+        source,
+        CHAIN_ID_PATH,
+        INITIAL_HEIGHT_PATH,
+        *(processor.path for processor in processors),
+        directory=spill_dir,
+        blob_paths=tuple(
+            blob_path for processor in processors for blob_path in processor.blob_paths
+        ),
+        skip_paths=tuple(
+            skip_path for processor in processors for skip_path in processor.skip_paths
+        ),
+    ) as spool:
+        spool.load()
+        chain_id = spool.read_value(CHAIN_ID_PATH)
+        if export_height is None:
+            try:
+                export_height = get_export_height(spool.read_value(INITIAL_HEIGHT_PATH))
+            except KeyError:
+                pass
+        manifest.update(
+            source=source.location,
+            source_digest=spool.source_digest,
+            chain_id=chain_id,
+            export_height=export_height,
+            sorted=sort,
+        )
+
+        for processor in processors:
+            start = time.perf_counter()
+            assert processor.table is not None
+            lines = iter_copy_lines(spool, processor, chain_id)
+            if sort:
+                lines = (
+                    line for _, line in sort_lines(lines, _get_key, run_size, spill_dir)
+                )
+            counts = _write_parts(lines, directory, processor.table, parts)
+
+            manifest["tables"].append(
+                {
+                    "processor": processor.name,
+                    "table": processor.table,
+                    "columns": [name for name, _ in processor.columns],
+                    "parts": [
+                        {"path": get_part_name(processor.table, part), "rows": count}
+                        for part, count in enumerate(counts)
+                    ],
+                }
+            )
+            _logger.info(
+                f"{processor.table:<24} {sum(counts):>10} rows "
+                f"{time.perf_counter() - start:8.2f}s"
+            )
+
+    with open(os.path.join(directory, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def _write_parts(
+    lines: Iterator[str], directory: str, table: str, parts: int
+) -> List[int]:
+    counts = [0] * parts
+    with ExitStack() as stack:
+        files: List[IO[str]] = [
+            stack.enter_context(
+                open(os.path.join(directory, get_part_name(table, part)), "w")
+            )
+            for part in range(parts)
+        ]
+        for line in lines:
+            part = get_shard(_get_key(line), parts) if parts > 1 else 0
+            files[part].write(line)
+            counts[part] += 1
+    return counts
+
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MANIFEST)) as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(
+            f"{directory}: manifest version {manifest.get('version')}, "
+            f"expected {MANIFEST_VERSION}"
+        )
+    return manifest
+
+
+def load_compiled(
+    db_conn: Connection,
+    directory: str,
+    workers: Optional[int] = None,
+    schema: str = DEFAULT_SCHEMA,
+) -> Dict[str, float]:
+    """
+    Load the COPY files compiled by compile_genesis, the parts of each table over
+    workers (default: one per part) connections in parallel, then build the indexes
+    and record the baseline
+
+    NB: plain COPY, like pg_restore the rows mustn't exist yet (e.g. a new database
+    or truncated tables); tables are loaded in the order they were compiled, e.g.
+    accounts before the genesis_balances referencing them
+
+    :return: seconds spent loading each table, by name
+    """
+    manifest = read_manifest(directory)
+    chain_id = manifest["chain_id"]
+    timings: Dict[str, float] = {}
+    table_managers: List[TableManager] = []
+
+    for table in manifest["tables"]:
+        processor = PROCESSORS[table["processor"]]
+        table_manager = processor.get_tables(db_conn, schema)[0]
+        if list(table_manager.get_column_names()) != table["columns"]:
+            raise ValueError(
+                f"{table['table']}: compiled with columns {table['columns']}, "
+                f"the table has {list(table_manager.get_column_names())}"
+            )
+        table_manager.ensure_partition(chain_id)
+        table_managers.append(table_manager)
+
+        def load_part(path: str):
+            with clone_connection(db_conn) as part_conn:
+                part_manager = processor.get_tables(part_conn, schema)[0]
+                with open(os.path.join(directory, path), "rb") as file:
+                    with part_manager.db_copy() as copy:
+                        for block in iter(lambda: file.read(READ_SIZE), b""):
+                            copy.write(block)
+
+        start = time.perf_counter()
+        paths = [part["path"] for part in table["parts"]]
+        with ThreadPoolExecutor(max_workers=workers or len(paths)) as executor:
+            # NB: list() re-raises the first failure
+            list(executor.map(load_part, paths))
+        timings[table["table"]] = time.perf_counter() - start
+        _logger.info(f"{table['table']:<24} {timings[table['table']]:8.2f}s")
+
+    build_indexes(db_conn, table_managers)
+    if manifest["export_height"] is not None:
+        GenesisBaselines(db_conn, schema).record(
+            chain_id,
+            manifest["export_height"],
+            manifest["source_digest"],
+            manifest["source"],
+        )
+    return timings
@@ -0,0 +1,95 @@
+from typing import Optional
+
+from psycopg import Connection
+
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.state import GenesisLike, GenesisState
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+ID = "id"
+CHAIN_ID = "chain_id"
+HEIGHT = "height"
+SOURCE_DIGEST = "source_digest"
+LOCATION = "location"
+LOADED_AT = "loaded_at"
+TABLE_ID = "genesis_baselines"
+
+
+def get_export_height(initial_height: Optional[str]) -> Optional[int]:
+    """
+    Height a state export was taken at, None for the genesis of a chain
+
+    NB: `fetchd export` at height H sets initial_height to H + 1, the first block of
+    a chain started from it
+    """
+    if not initial_height or int(initial_height) <= 1:
+        return None
+    return int(initial_height) - 1
+
+
+def get_genesis_export_height(genesis_data: GenesisLike) -> Optional[int]:
+    return get_export_height(GenesisState.of(genesis_data).initial_height)
+
+
+class GenesisBaselines:
+    """
+    Height of the state each chain's genesis tables were loaded from, the indexer
+    only has the blocks after it to process (e.g. from H + 1 of an export at H).
+    """
+
+    def __init__(self, db_conn: Connection, schema: str = DEFAULT_SCHEMA):
+        """
+        :param schema: schema of the genesis tables, e.g. the indexer's (DB_SCHEMA),
+            which the node entrypoint reads the start block from
+        """
+        columns = (
+            (ID, DBTypes.text),
+            (CHAIN_ID, DBTypes.text),
+            (HEIGHT, DBTypes.bigint),
+            (SOURCE_DIGEST, DBTypes.text),
+            (LOCATION, DBTypes.text),
+            (LOADED_AT, DBTypes.timestamptz),
+        )
+
+        self.db_conn = db_conn
+        self.table_manager = TableManager(
+            db_conn, TABLE_ID, columns, (CHAIN_ID,), schema=schema, primary_key=ID
+        )
+        self.table_manager.ensure_table()
+
+    def record(
+        self,
+        chain_id: str,
+        height: int,
+        source_digest: Optional[str] = None,
+        location: Optional[str] = None,
+    ):
+        """Record the baseline of chain_id, replacing any previous one."""
+        table = self.table_manager.get_qualified_table()
+        with self.db_conn.cursor() as db:
+            db.execute(f"DELETE FROM {table} WHERE {ID} = %s", (chain_id,))
+            db.execute(
+                f"""
+                INSERT INTO {table} ({ID}, {CHAIN_ID}, {HEIGHT}, {SOURCE_DIGEST}, {LOCATION}, {LOADED_AT})
+                VALUES (%s, %s, %s, %s, %s, now())
+                """,
+                (chain_id, chain_id, height, source_digest, location),
+            )
+        self.db_conn.commit()
+        _logger.info(
+            f"{chain_id}: baseline at height {height}, start from {height + 1}"
+        )
+
+    def get_height(self, chain_id: str) -> Optional[int]:
+        res = self.db_conn.execute(
+            f"SELECT {HEIGHT} FROM {self.table_manager.get_qualified_table()} WHERE {ID} = %s",
+            (chain_id,),
+        ).fetchone()
+        return None if res is None else res[0]
+
+    def get_start_block(self, chain_id: str) -> Optional[int]:
+        """First block the indexer has to process, None without a baseline."""
+        height = self.get_height(chain_id)
+        return None if height is None else height + 1
@@ -0,0 +1,127 @@
+import itertools
+from typing import Iterable, Iterator, Optional, Sequence, TypeVar
+
+from psycopg import Connection
+
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+ID = "id"
+RUN_ID = "run_id"
+SECTION = "section"
+ITEM_OFFSET = "item_offset"
+TABLE_ID = "genesis_checkpoints"
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+class Checkpoint:
+    """
+    Progress of one genesis section (number of items committed so far), saved in the
+    same transaction as every chunk of rows so a restarted run resumes at the first
+    item which wasn't committed.
+    """
+
+    def __init__(
+        self,
+        db_conn: Connection,
+        run_id: str,
+        section: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        schema: str = DEFAULT_SCHEMA,
+    ):
+        columns = (
+            (ID, DBTypes.text),
+            (RUN_ID, DBTypes.text),
+            (SECTION, DBTypes.text),
+            (ITEM_OFFSET, DBTypes.bigint),
+        )
+
+        self.db_conn = db_conn
+        self.run_id = run_id
+        self.section = section
+        self.chunk_size = chunk_size
+        self.table_manager = TableManager(db_conn, TABLE_ID, columns, schema=schema)
+        self.table_manager.ensure_table()
+
+    def get_id(self) -> str:
+        return f"{self.run_id}/{self.section}"
+
+    def get_offset(self) -> int:
+        res = self.db_conn.execute(
+            f"SELECT {ITEM_OFFSET} FROM {self.table_manager.get_qualified_table()} WHERE {ID} = %s",
+            (self.get_id(),),
+        ).fetchone()
+        return 0 if res is None else int(res[0])
+
+    def save(self, offset: int):
+        """Record offset in the current transaction, committed along with its chunk."""
+        table = self.table_manager.get_qualified_table()
+        with self.db_conn.cursor() as db:
+            db.execute(
+                f"UPDATE {table} SET {ITEM_OFFSET} = %s WHERE {ID} = %s",
+                (offset, self.get_id()),
+            )
+            if db.rowcount == 0:
+                db.execute(
+                    f"INSERT INTO {table} ({ID}, {RUN_ID}, {SECTION}, {ITEM_OFFSET}) VALUES (%s, %s, %s, %s)",
+                    (self.get_id(), self.run_id, self.section, offset),
+                )
+
+    def reset(self):
+        self.db_conn.execute(
+            f"DELETE FROM {self.table_manager.get_qualified_table()} WHERE {ID} = %s",
+            (self.get_id(),),
+        )
+        self.db_conn.commit()
+
+    def iter_chunks(self, items: Iterable[T]) -> Iterator[Iterator[T]]:
+        """
+        Skip the items committed by a previous run then split the rest in chunks of
+        at most chunk_size items. Once a chunk has been processed (before resuming the
+        iteration) its offset is saved and the transaction committed.
+        """
+        offset = self.get_offset()
+        if offset:
+            _logger.info(f"{self.section}: resuming after {offset} items")
+
+        remaining = iter(items)
+        # NB: consumes the committed items without processing them
+        next(itertools.islice(remaining, offset, offset), None)
+
+        # NB: every chunk consumes its items from remaining
+        for first in remaining:
+            counter = itertools.count()
+            chunk = itertools.chain(
+                [first], itertools.islice(remaining, self.chunk_size - 1)
+            )
+            yield (item for item, _ in zip(chunk, counter))
+
+            # NB: the whole chunk has been processed once the iteration resumes
+            offset += next(counter)
+            self.save(offset)
+            self.db_conn.commit()
+            _logger.info(f"{self.section}: committed {offset} items")
+
+
+def iter_chunks(
+    items: Iterable[T],
+    checkpoint: Optional[Checkpoint],
+    reconciled: Sequence[TableManager] = (),
+) -> Iterator[Iterable[T]]:
+    """
+    Chunks of items committed by checkpoint, or all items in one chunk without one
+
+    :param reconciled: tables the rows of every chunk are reconciled with (see
+        TableManager.insert_missing), their primary key is built before the first one
+    """
+    if checkpoint is None:
+        yield items
+        return
+    for table_manager in reconciled:
+        table_manager.build_primary_key()
+    yield from checkpoint.iter_chunks(items)
@@ -0,0 +1,38 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import psycopg
+from psycopg import Connection
+
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+
+def clone_connection(db_conn: Connection) -> Connection:
+    """Open a new connection to the same database, with the same user and options as db_conn."""
+    return psycopg.connect(db_conn.info.dsn, password=db_conn.info.password)
+
+
+def execute_parallel(
+    db_conn: Connection, statements: List[str], max_workers: Optional[int] = None
+):
+    """
+    Execute independent statements outside of any transaction, each on its own
+    connection cloned from db_conn, max_workers (default: all) at a time.
+    """
+    if not statements:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(statements)) as executor:
+        # NB: list() re-raises the first failure
+        list(executor.map(_execute_autocommit, [db_conn] * len(statements), statements))
+
+
+def _execute_autocommit(db_conn: Connection, statement: str):
+    start = time.perf_counter()
+    with clone_connection(db_conn) as statement_conn:
+        statement_conn.autocommit = True
+        statement_conn.execute(statement)
+    _logger.info(f"{statement} ({time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,113 @@
+import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Sequence
+
+DEFAULT_BATCH_SIZE = 10_000
+# hex encoded bytea chunks buffered between two writes of a row
+COPY_WRITE_SIZE = 1 << 20
+# batches in flight per worker, bounds the memory held by results not yet written
+BATCHES_PER_WORKER = 2
+
+# builds the rows of one decoded item, must be picklable (e.g. a classmethod)
+RowsFunction = Callable[[Any], Iterable[Sequence[Any]]]
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+
+def format_copy_value(value: Any) -> str:
+    return "\\N" if value is None else str(value).translate(_COPY_ESCAPES)
+
+
+def format_copy_row(row: Sequence[Any]) -> str:
+    """One row in the text COPY format, None values are NULL."""
+    return "\t".join(format_copy_value(value) for value in row) + "\n"
+
+
+def write_copy_row(write: Callable[[bytes], None], row: Sequence[Any]):
+    """
+    Write one row in the text COPY format, bytea values given as iterators of bytes
+    (e.g. spooled blobs) are hex encoded chunk by chunk rather than held whole
+    """
+    parts: List[bytes] = []
+    size = 0
+    for i, value in enumerate(row):
+        if i:
+            parts.append(b"\t")
+        if not isinstance(value, Iterator):
+            parts.append(format_copy_value(value).encode())
+            continue
+
+        # NB: bytea hex format, its backslash escaped
+        parts.append(b"\\\\x")
+        for chunk in value:
+            parts.append(chunk.hex().encode())
+            size += 2 * len(chunk)
+            if size >= COPY_WRITE_SIZE:
+                write(b"".join(parts))
+                parts = []
+                size = 0
+    parts.append(b"\n")
+    write(b"".join(parts))
+
+
+def encode_lines(get_rows: RowsFunction, lines: List[str]) -> bytes:
+    """Text COPY data of the rows built from every JSON line."""
+    return "".join(
+        format_copy_row(row) for line in lines for row in get_rows(json.loads(line))
+    ).encode()
+
+
+def _batches(lines: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ParallelCopyEncoder:
+    """
+    Pool of processes decoding JSON lines (e.g. from a GenesisSpool) and formatting
+    the rows built from them, so the process writing the COPY only forwards blocks of
+    text COPY data. JSON decoding and row building otherwise keep one core busy while
+    the others sit idle.
+    """
+
+    def __init__(self, max_workers: int, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        # NB: sections run on threads holding DB connections, forked workers would
+        # inherit them
+        self._executor = ProcessPoolExecutor(
+            max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def __enter__(self) -> "ParallelCopyEncoder":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def iter_blocks(
+        self, get_rows: RowsFunction, lines: Iterable[str]
+    ) -> Iterator[bytes]:
+        """
+        Text COPY data of the rows of lines, in batches encoded in parallel and
+        yielded in the original order
+        """
+        pending: Deque[Future] = deque()
+        for batch in _batches(lines, self.batch_size):
+            pending.append(self._executor.submit(encode_lines, get_rows, batch))
+            if len(pending) >= self.max_workers * BATCHES_PER_WORKER:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
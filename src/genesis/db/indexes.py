@@ -0,0 +1,47 @@
+from typing import List, Optional
+
+from psycopg import Connection
+
+from src.genesis.db.connection import execute_parallel
+from src.genesis.db.table_manager import TableManager
+
+
+def build_indexes(
+    db_conn: Connection,
+    table_managers: List[TableManager],
+    max_workers: Optional[int] = None,
+    like_schema: Optional[str] = None,
+):
+    """
+    Post-load phase: build the declared indexes and primary keys of the tables once
+    over their final data, each index on its own connection in parallel, then ANALYZE.
+
+    :param db_conn: connection the other connections are cloned from
+    :param table_managers: loaded tables
+    :param max_workers: concurrent index builds, defaults to one per index
+    :param like_schema: build the indexes of every table like those of the table of
+        the same name in this schema, e.g. the live tables a shadow schema replaces
+        (see TableManager.get_index_statements)
+    """
+    execute_parallel(
+        db_conn,
+        [
+            statement
+            for table_manager in table_managers
+            for statement in table_manager.get_index_statements(
+                None
+                if like_schema is None
+                else TableManager(db_conn, table_manager.table, schema=like_schema)
+            )
+        ],
+        max_workers,
+    )
+
+    for table_manager in table_managers:
+        # NB: needs an ACCESS EXCLUSIVE lock, only once the builds are done
+        table_manager.add_primary_key()
+
+    with db_conn.cursor() as db:
+        for table_manager in table_managers:
+            db.execute(f"ANALYZE {table_manager.get_qualified_table()}")
+    db_conn.commit()
@@ -0,0 +1,28 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from psycopg import Connection
+
+
+@contextmanager
+def advisory_lock(
+    db_conn: Connection, name: str, shared: bool = False
+) -> Iterator[None]:
+    """
+    Hold a session level advisory lock on name, waiting for any conflicting holder
+    (other runs, possibly in other pods) to release it first. Shared locks only
+    conflict with exclusive ones.
+
+    NB: a failed transaction is rolled back before the lock is released
+    """
+    suffix = "_shared" if shared else ""
+    db_conn.execute(f"SELECT pg_advisory_lock{suffix}(hashtext(%s))", (name,))
+    db_conn.commit()
+    try:
+        yield
+    except BaseException:
+        db_conn.rollback()
+        raise
+    finally:
+        db_conn.execute(f"SELECT pg_advisory_unlock{suffix}(hashtext(%s))", (name,))
+        db_conn.commit()
@@ -0,0 +1,96 @@
+from typing import Collection, Optional
+
+from psycopg import Connection
+
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+ID = "id"
+SOURCE_DIGEST = "source_digest"
+SECTION = "section"
+SECTION_DIGEST = "section_digest"
+LOCATION = "location"
+ELAPSED = "elapsed"
+COMPLETED_AT = "completed_at"
+TABLE_ID = "genesis_runs"
+
+
+class GenesisRuns:
+    """
+    Completed genesis sections, by SHA-256 of the whole source and of the section's
+    own inputs. A section whose digest is already recorded has nothing left to do.
+    """
+
+    def __init__(self, db_conn: Connection, schema: str = DEFAULT_SCHEMA):
+        columns = (
+            (ID, DBTypes.text),
+            (SOURCE_DIGEST, DBTypes.text),
+            (SECTION, DBTypes.text),
+            (SECTION_DIGEST, DBTypes.text),
+            (LOCATION, DBTypes.text),
+            (ELAPSED, DBTypes.numeric),
+            (COMPLETED_AT, DBTypes.timestamptz),
+        )
+        indexes = (SOURCE_DIGEST, SECTION_DIGEST)
+
+        self.db_conn = db_conn
+        self.table_manager = TableManager(
+            db_conn, TABLE_ID, columns, indexes, schema=schema, primary_key=ID
+        )
+        self.table_manager.ensure_table()
+
+    @classmethod
+    def _get_db_id(cls, source_digest: str, section: str) -> str:
+        return f"{source_digest}/{section}"
+
+    def is_source_completed(
+        self, source_digest: str, sections: Collection[str]
+    ) -> bool:
+        rows = self.db_conn.execute(
+            f"SELECT {SECTION} FROM {self.table_manager.get_qualified_table()} WHERE {SOURCE_DIGEST} = %s",
+            (source_digest,),
+        ).fetchall()
+        return set(sections) <= {section for section, in rows}
+
+    def is_section_completed(self, section: str, section_digest: str) -> bool:
+        res = self.db_conn.execute(
+            f"""
+            SELECT EXISTS (
+                SELECT FROM {self.table_manager.get_qualified_table()}
+                WHERE {SECTION} = %s AND {SECTION_DIGEST} = %s
+            )
+            """,
+            (section, section_digest),
+        ).fetchone()
+        assert res is not None
+        return res[0]
+
+    def record(
+        self,
+        source_digest: str,
+        section: str,
+        section_digest: str,
+        location: Optional[str],
+        elapsed: float,
+    ):
+        db_id = self._get_db_id(source_digest, section)
+        table = self.table_manager.get_qualified_table()
+        with self.db_conn.cursor() as db:
+            db.execute(f"DELETE FROM {table} WHERE {ID} = %s", (db_id,))
+            db.execute(
+                f"""
+                INSERT INTO {table} ({ID}, {SOURCE_DIGEST}, {SECTION}, {SECTION_DIGEST}, {LOCATION}, {ELAPSED}, {COMPLETED_AT})
+                VALUES (%s, %s, %s, %s, %s, %s, now())
+                """,
+                (db_id, source_digest, section, section_digest, location, elapsed),
+            )
+        self.db_conn.commit()
+
+    def reset(self, sections: Collection[str]):
+        self.db_conn.execute(
+            f"DELETE FROM {self.table_manager.get_qualified_table()} WHERE {SECTION} = ANY(%s)",
+            (list(sections),),
+        )
+        self.db_conn.commit()
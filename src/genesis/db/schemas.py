@@ -0,0 +1,124 @@
+import time
+from typing import Collection, List, Sequence, Tuple
+
+from psycopg import Connection, errors, sql
+
+from src.genesis.db.table_manager import (
+    ForeignKey,
+    TableManager,
+    add_foreign_keys,
+    validate_foreign_keys,
+)
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+ID = "id"
+DEFAULT_LOCK_TIMEOUT = "5s"
+DEFAULT_SWAP_RETRIES = 5
+DEFAULT_SWAP_BACKOFF = 1.0
+
+
+def create_schema(db_conn: Connection, schema: str):
+    """Create schema empty, dropping whatever a previous (failed) load left in it."""
+    with db_conn.cursor() as db:
+        db.execute(
+            sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(schema))
+        )
+        db.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(schema)))
+    db_conn.commit()
+
+
+def drop_schema(db_conn: Connection, schema: str):
+    with db_conn.cursor() as db:
+        db.execute(
+            sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(schema))
+        )
+    db_conn.commit()
+
+
+def swap_in_schema(
+    db_conn: Connection,
+    table_managers: Sequence[Tuple[TableManager, TableManager]],
+    merged_tables: Collection[str] = (),
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+    retries: int = DEFAULT_SWAP_RETRIES,
+    backoff: float = DEFAULT_SWAP_BACKOFF,
+):
+    """
+    Replace live tables by the ones loaded (and indexed) in a shadow schema, all of
+    them in one transaction: queries see either the previous tables or the new ones,
+    never a partial load
+
+    NB: the swap only changes the catalog, the live tables are locked (ACCESS
+    EXCLUSIVE) for milliseconds; waiting longer than lock_timeout for them (e.g.
+    behind a long query) rolls back and tries again later, rather than queueing every
+    other query behind the swap
+
+    :param table_managers: (live, shadow) managers of each table
+    :param merged_tables: tables also written by the indexer (e.g. accounts): the
+        shadow rows they don't have yet are inserted in the same transaction, they're
+        not replaced
+    """
+    replaced = [
+        (live, shadow)
+        for live, shadow in table_managers
+        if live.table not in merged_tables
+    ]
+    for live, _ in replaced:
+        if live.is_partitioned():
+            raise ValueError(
+                f"{live.get_qualified_table()} is partitioned, other chains' rows "
+                "would be replaced too (reload the chain's partitions instead)"
+            )
+
+    merged = [
+        (live, shadow) for live, shadow in table_managers if live.table in merged_tables
+    ]
+
+    for attempt in range(retries + 1):
+        try:
+            foreign_keys = _replace_tables(db_conn, replaced, merged, lock_timeout)
+            break
+        except errors.LockNotAvailable as e:
+            db_conn.rollback()
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt
+            _logger.warning(f"swap: {e}, retrying in {delay}s")
+            time.sleep(delay)
+
+    _logger.info(
+        f"swapped in {', '.join(live.get_qualified_table() for live, _ in replaced)}"
+    )
+    validate_foreign_keys(db_conn, foreign_keys)
+
+
+def _replace_tables(
+    db_conn: Connection,
+    replaced: Sequence[Tuple[TableManager, TableManager]],
+    merged: Sequence[Tuple[TableManager, TableManager]],
+    lock_timeout: str,
+) -> List[ForeignKey]:
+    with db_conn.cursor() as db:
+        db.execute("SELECT set_config('lock_timeout', %s, true)", (lock_timeout,))
+
+    # NB: merged before the replaced tables are locked, which is only for the swap;
+    # the merged rows are committed with it, never seen next to the previous tables
+    for live, shadow in merged:
+        inserted = live.insert_missing(shadow.get_qualified_table(), ID)
+        _logger.info(f"{live.get_qualified_table()}: merged {inserted} rows")
+
+    with db_conn.cursor() as db:
+        # NB: every table is locked before any is changed, in a consistent order
+        for live, _ in replaced:
+            db.execute(
+                f"LOCK TABLE {live.get_qualified_table()} IN ACCESS EXCLUSIVE MODE"
+            )
+
+    foreign_keys: List[ForeignKey] = []
+    for live, shadow in replaced:
+        foreign_keys += live.replace(shadow)
+    add_foreign_keys(db_conn, foreign_keys)
+    db_conn.commit()
+    return foreign_keys
@@ -1,17 +1,51 @@
-import itertools
+import re
 from contextlib import contextmanager
 from enum import Enum
-from typing import Any, Generator, List, Optional, Tuple
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple, Union
 
-from psycopg import Connection
+from psycopg import Connection, Cursor, sql
+from psycopg.adapt import Dumper
+from psycopg.copy import QueuedLibpqWriter
+from psycopg.pq import Format
+from psycopg.types import TypeInfo
+
+from src.genesis.db.connection import execute_parallel
+
+DEFAULT_SCHEMA = "app"
+# NB: the session's own schema of temporary tables
+TEMP_SCHEMA = "pg_temp"
+STAGING_SUFFIX = "_staging"
+SHADOW_SUFFIX = "_shadow"
+# NB: longer identifiers are truncated by postgres
+MAX_IDENTIFIER_LENGTH = 63
 
 
 class DBTypes(Enum):
     text = "text"
     numeric = "numeric"
+    bigint = "bigint"
+    bytea = "bytea"
+    timestamptz = "timestamp with time zone"
     interface = "public.app_enum_0f6c2478ba"
 
 
+# user defined enum types, their binary COPY representation is the label itself
+ENUM_DB_TYPES = frozenset({DBTypes.interface})
+
+# table, name, definition and comment (e.g. PostGraphile's @foreignFieldName) of a
+# constraint
+ForeignKey = Tuple[str, str, str, Optional[str]]
+
+
+class EnumLabelBinaryDumper(Dumper):
+    """Dumps str labels to an enum type, subclassed with the oid of a specific type"""
+
+    format = Format.BINARY
+
+    def dump(self, obj: Any) -> bytes:
+        return str(obj).encode()
+
+
 class TableManager:
     def __init__(
         self,
@@ -19,40 +53,359 @@ class TableManager:
         table: Optional[str] = None,
         columns: Optional[Tuple[Tuple[str, DBTypes], ...]] = None,
         indexes: Optional[Tuple[str, ...]] = None,
-        schema: str = "app",
+        schema: str = DEFAULT_SCHEMA,
+        binary_copy: bool = False,
+        primary_key: Optional[str] = None,
+        shadow_load: bool = False,
+        partition_by: Optional[str] = None,
+        partitioned: bool = False,
     ):
+        """
+        :param partition_by: column the rows of a partitioned table are listed by, e.g.
+            chain_id
+        :param partitioned: create the table PARTITION BY LIST (partition_by) when it
+            doesn't exist yet, an existing table is used as it is
+        """
         self.db_conn = db_conn
         self.table = table
         self.columns = columns
+        # NB: indexes and primary key are only built after loading, see build_indexes
         self.indexes = indexes
+        self.primary_key = primary_key
+        # NB: first-time loads go through an UNLOGGED shadow table, see db_copy_shadow
+        self.shadow_load = shadow_load
+        self.partition_by = partition_by
+        self.partitioned = partitioned
         self.schema = schema
+        # NB: binary COPY requires numeric values as int/Decimal rather than str
+        self.binary_copy = binary_copy
+        self._copy_types: Optional[List[Union[str, int]]] = None
 
     def get_column_names(self) -> Generator[str, Any, None]:
         assert self.columns
         return (name for name, _ in self.columns)
 
-    def select_query(self, column_names: List[str]) -> List[str]:
-        res = self.db_conn.execute(
-            f"""
-            SELECT {",".join(column_names)} FROM {self.table}
+    def get_copy_types(self) -> List[Union[str, int]]:
+        """
+        Binary COPY types of the columns, enum types get a dumper for their labels
+
+        NB: looked up once per manager and before any COPY is started, the connection
+        can't run queries while it is in COPY mode
+
+        :return: type names or oids to pass to Copy.set_types
         """
-        ).fetchall()
-        return list(itertools.chain(*res))
+        if self._copy_types is not None:
+            return self._copy_types
+
+        assert self.columns
+        copy_types: List[Union[str, int]] = []
+        for _, type_ in self.columns:
+            if type_ not in ENUM_DB_TYPES:
+                copy_types.append(type_.value)
+                continue
+
+            info = TypeInfo.fetch(self.db_conn, type_.value)
+            assert info is not None, f"type {type_.value} does not exist"
+            dumper = type(
+                f"{info.name}BinaryDumper", (EnumLabelBinaryDumper,), {"oid": info.oid}
+            )
+            self.db_conn.adapters.register_dumper(None, dumper)
+            copy_types.append(info.oid)
+
+        self._copy_types = copy_types
+        return copy_types
+
+    def get_qualified_table(self) -> str:
+        return f"{self.schema}.{self.table}"
+
+    def get_column_definitions(self) -> str:
+        assert self.columns
+        return ", ".join([f"{name} {type_.value}" for name, type_ in self.columns])
 
     def ensure_table(self):
+        """Create the table, or add the columns an existing one doesn't have yet."""
+        partition_clause = ""
+        if self.partitioned:
+            assert self.partition_by is not None
+            partition_clause = f"PARTITION BY LIST ({self.partition_by})"
+
         with self.db_conn.cursor() as db:
+            # NB: concurrent CREATE TABLE IF NOT EXISTS (e.g. by the pods of a sharded
+            # Job) can still both try to create it, the loser failing
+            db.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                (self.get_qualified_table(),),
+            )
             db.execute(
                 f"""
                 CREATE TABLE IF NOT EXISTS {self.schema}.{self.table} (
-                    {", ".join([f"{name} {type_.value}" for name, type_ in self.columns])}
-                );
-                -- TODO: psycopg break out of transaction
-                -- CREATE INDEX CONCURRENTLY ON {self.schema}.{self.table} ({",".join(self.indexes)})
+                    {self.get_column_definitions()}
+                ) {partition_clause};
             """
             )
+
+            # NB: ALTER TABLE locks the table even when there's nothing to add
+            existing = {
+                name
+                for name, in db.execute(
+                    """
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_schema = %s AND table_name = %s
+                    """,
+                    (self.schema, self.table),
+                )
+            }
+            assert self.columns
+            for name, type_ in self.columns:
+                if name not in existing:
+                    db.execute(
+                        f"ALTER TABLE {self.get_qualified_table()} ADD COLUMN IF NOT EXISTS {name} {type_.value}"
+                    )
             self.db_conn.commit()
             # TODO error checking / handling (?)
 
+    def is_partitioned(self) -> bool:
+        with self.db_conn.cursor() as db:
+            res_db_execute = db.execute(
+                "SELECT EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                (self.get_qualified_table(),),
+            ).fetchone()
+
+            assert res_db_execute is not None
+
+            return res_db_execute[0]
+
+    def get_partition_name(self, value: str) -> str:
+        suffix = re.sub(r"[^a-z0-9]+", "_", value.lower())
+        return f"{self.table}_{suffix}"[:MAX_IDENTIFIER_LENGTH]
+
+    def ensure_partition(self, value: str):
+        """Create the partition of the rows whose partition_by is value, if partitioned."""
+        if not self.is_partitioned():
+            return
+
+        with self.db_conn.cursor() as db:
+            db.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                (self.get_qualified_table(),),
+            )
+            db.execute(
+                sql.SQL(
+                    "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES IN ({})"
+                ).format(
+                    sql.Identifier(self.schema, self.get_partition_name(value)),
+                    sql.SQL(self.get_qualified_table()),
+                    sql.Literal(value),
+                )
+            )
+            self.db_conn.commit()
+
+    def drop_partition(self, value: str):
+        """
+        Drop the rows whose partition_by is value, the whole partition at once rather
+        than a DELETE of each row (if partitioned)
+
+        NB: the partition is detached first, the table is only locked briefly
+        """
+        if not self.is_partitioned():
+            return
+
+        partition = sql.Identifier(self.schema, self.get_partition_name(value))
+        with self.db_conn.cursor() as db:
+            exists = db.execute(
+                "SELECT to_regclass(%s) IS NOT NULL",
+                (f"{self.schema}.{self.get_partition_name(value)}",),
+            ).fetchone()
+            assert exists is not None
+            if not exists[0]:
+                return
+
+            db.execute(
+                sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                    sql.SQL(self.get_qualified_table()), partition
+                )
+            )
+            db.execute(sql.SQL("DROP TABLE {}").format(partition))
+            self.db_conn.commit()
+
+    def get_key_columns(self, key_column: str) -> Tuple[str, ...]:
+        """Columns identifying a row: its key, within the partition (if partitioned)."""
+        if self.partition_by is None or self.partition_by == key_column:
+            return (key_column,)
+        if not self.is_partitioned():
+            return (key_column,)
+        return key_column, self.partition_by
+
+    def get_index_name(self, column: str) -> str:
+        # NB: same naming as the tables created by subquery, so existing indexes match
+        return f"{self.table}_{column}"
+
+    def get_primary_key_name(self) -> str:
+        return f"{self.table}_pkey"
+
+    def get_index_statements(
+        self, like_manager: Optional["TableManager"] = None
+    ) -> List[str]:
+        """
+        Statements building the declared indexes (and the primary key's unique index)
+        which don't exist yet, independent of each other so they can run in parallel
+
+        NB: plain CREATE INDEX only takes a SHARE lock, builds on the same table don't
+        block each other (CONCURRENTLY would serialize them) and reads carry on
+
+        :param like_manager: table whose indexes are built the same way, e.g. the live
+            table a shadow table replaces (subquery creates some as hash indexes);
+            the declared indexes it doesn't have are built as well
+        """
+        table = self.get_qualified_table()
+        statements: Dict[str, str] = {}
+        if like_manager is not None:
+            for name, unique, method in like_manager.get_index_definitions():
+                name = self.get_like_index_name(like_manager, name)
+                unique_clause = "UNIQUE " if unique else ""
+                statements[
+                    name
+                ] = f"CREATE {unique_clause}INDEX IF NOT EXISTS {name} ON {table} USING {method}"
+
+        # NB: the primary key of a partitioned table is built by add_primary_key
+        if self.primary_key is not None and not self.is_partitioned():
+            statements.setdefault(
+                self.get_primary_key_name(),
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {self.get_primary_key_name()} "
+                f"ON {table} ({self.primary_key})",
+            )
+        for column in self.indexes or ():
+            if column == self.primary_key:
+                continue
+            statements.setdefault(
+                self.get_index_name(column),
+                f"CREATE INDEX IF NOT EXISTS {self.get_index_name(column)} ON {table} ({column})",
+            )
+        return list(statements.values())
+
+    def get_index_definitions(self) -> List[Tuple[str, bool, str]]:
+        """
+        Name, uniqueness and method (and what follows USING, e.g. "hash (account_id)")
+        of the indexes of this table, but those of constraints other than its primary
+        key
+        """
+        with self.db_conn.cursor() as db:
+            definitions = db.execute(
+                """
+                SELECT c.relname, i.indisunique, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = to_regclass(%s) AND NOT EXISTS (
+                    SELECT FROM pg_constraint
+                    WHERE conindid = i.indexrelid AND contype <> 'p'
+                )
+                ORDER BY c.relname
+                """,
+                (self.get_qualified_table(),),
+            ).fetchall()
+        return [
+            (name, unique, definition.split(" USING ", 1)[1])
+            for name, unique, definition in definitions
+        ]
+
+    def get_like_index_name(self, like_manager: "TableManager", name: str) -> str:
+        """
+        Name of the index of this table built like the index name of like_manager,
+        see replace which renames them back
+
+        NB: index names are unique within a schema
+        """
+        if self.table == like_manager.table:
+            return name
+        prefix = f"{like_manager.table}_"
+        if name.startswith(prefix):
+            name = name[len(prefix) :]
+        return f"{self.table}_{name}"[:MAX_IDENTIFIER_LENGTH]
+
+    def has_primary_key(self) -> bool:
+        with self.db_conn.cursor() as db:
+            res_db_execute = db.execute(
+                """
+                SELECT EXISTS (
+                    SELECT FROM pg_constraint
+                    WHERE conrelid = to_regclass(%s) AND contype = 'p'
+                )
+                """,
+                (self.get_qualified_table(),),
+            ).fetchone()
+
+            assert res_db_execute is not None
+
+            return res_db_execute[0]
+
+    def add_primary_key(self):
+        """Promote the unique index built by get_index_statements to the primary key."""
+        if self.primary_key is None or self.has_primary_key():
+            return
+
+        with self.db_conn.cursor() as db:
+            if self.is_partitioned():
+                # NB: unique across partitions only with the partition key, USING INDEX
+                # isn't supported; every partition builds its own index
+                db.execute(
+                    f"""
+                    ALTER TABLE {self.get_qualified_table()}
+                        ADD CONSTRAINT {self.get_primary_key_name()}
+                        PRIMARY KEY ({", ".join(self.get_key_columns(self.primary_key))})
+                """
+                )
+                self.db_conn.commit()
+                return
+
+            db.execute(
+                f"""
+                ALTER TABLE {self.get_qualified_table()}
+                    ADD CONSTRAINT {self.get_primary_key_name()}
+                    PRIMARY KEY USING INDEX {self.get_primary_key_name()}
+            """
+            )
+            self.db_conn.commit()
+
+    def build_primary_key(self):
+        """
+        Build the primary key ahead of the other indexes (see build_indexes), e.g.
+        before rows are reconciled with the table chunk after chunk: without its
+        index, every chunk's anti-join scans the rows of all the chunks before it
+        """
+        if self.primary_key is None or self.has_primary_key():
+            return
+
+        with self.db_conn.cursor() as db:
+            # NB: the runs of every shard reconcile with the same table
+            db.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                (self.get_qualified_table(),),
+            )
+            if not self.is_partitioned():
+                db.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {self.get_primary_key_name()} "
+                    f"ON {self.get_qualified_table()} ({self.primary_key})"
+                )
+        self.add_primary_key()
+        self.db_conn.commit()
+
+    def create_temp_table(self):
+        # NB: dropped by the commit which ends the current transaction
+        self.schema = TEMP_SCHEMA
+        with self.db_conn.cursor() as db:
+            db.execute(
+                f"""
+                CREATE TEMP TABLE {self.table} (
+                    {self.get_column_definitions()}
+                ) ON COMMIT DROP;
+            """
+            )
+
+    def analyze(self):
+        # NB: temporary tables are never analyzed by autovacuum, without statistics
+        # the planner may pick a nested loop anti-join over a freshly loaded table
+        with self.db_conn.cursor() as db:
+            db.execute(f"ANALYZE {self.get_qualified_table()}")
+
     def drop_table(self, cascade: bool = False):
         cascade_clause = ""
         if cascade:
@@ -68,15 +421,27 @@ class TableManager:
             # TODO error checking / handling (?)
 
     def table_exists(self, table: str) -> bool:
+        """Whether table exists in the schema of this table."""
         with self.db_conn.cursor() as db:
             res_db_execute = db.execute(
-                f"""
+                """
                     SELECT EXISTS (
                         SELECT FROM pg_tables WHERE
-                            schemaname = 'app' AND
-                            tablename  = '{table}'
+                            schemaname = %s AND
+                            tablename  = %s
                     )
-                """
+                """,
+                (self.schema, table),
+            ).fetchone()
+
+            assert res_db_execute is not None
+
+            return res_db_execute[0]
+
+    def is_empty(self) -> bool:
+        with self.db_conn.cursor() as db:
+            res_db_execute = db.execute(
+                f"SELECT NOT EXISTS (SELECT FROM {self.get_qualified_table()})"
             ).fetchone()
 
             assert res_db_execute is not None
@@ -84,10 +449,343 @@ class TableManager:
             return res_db_execute[0]
 
     @contextmanager
-    def db_copy(self):
+    def db_copy(self, commit: bool = True, freeze: bool = False):
+        """
+        :param commit: commit once the COPY is done
+        :param freeze: COPY ... FREEZE, the table must have been created (or truncated)
+            in the current transaction
+        """
+        options = []
+        if self.binary_copy:
+            options.append("FORMAT BINARY")
+        if freeze:
+            options.append("FREEZE")
+        options_clause = f' ({", ".join(options)})' if options else ""
+
+        copy_types = self.get_copy_types() if self.binary_copy else None
         with self.db_conn.cursor() as db:
+            # NB: data is sent to the server from the writer's own thread, building and
+            # formatting rows doesn't wait on the network
             with db.copy(
-                f'COPY {self.table} ({",".join(self.get_column_names())}) FROM STDIN'
+                f'COPY {self.get_qualified_table()} ({",".join(self.get_column_names())}) FROM STDIN{options_clause}',
+                writer=QueuedLibpqWriter(db),
             ) as copy:
+                if copy_types is not None:
+                    copy.set_types(copy_types)
                 yield copy
+        if commit:
+            self.db_conn.commit()
+
+    @contextmanager
+    def db_copy_reconcile(self, key_column: str = "id", commit: bool = True):
+        """
+        COPY into a temporary staging table then insert only the rows whose key_column
+        is not in the table yet, so existing IDs never leave the database
+
+        :param key_column: column identifying a row
+        :param commit: commit the merge (and drop the staging table) on exit, only
+            committed loads of an empty table go through the shadow table
+        """
+        if (
+            commit
+            and self.shadow_load
+            and self.is_empty()
+            and not self.is_partitioned()
+        ):
+            # NB: nothing to reconcile against, the shadow swap commits by itself;
+            # partitions are dropped and loaded again instead, see drop_partition
+            with self.db_copy_shadow() as copy:
+                yield copy
+            return
+
+        staging_manager = TableManager(
+            self.db_conn,
+            f"{self.table}{STAGING_SUFFIX}",
+            self.columns,
+            binary_copy=self.binary_copy,
+        )
+        staging_manager.create_temp_table()
+
+        with staging_manager.db_copy(commit=False) as copy:
+            yield copy
+
+        staging_manager.analyze()
+        self.insert_missing(str(staging_manager.table), key_column)
+        if commit:
+            self.db_conn.commit()
+
+    @contextmanager
+    def db_copy_upsert(self, key_column: str = "id", commit: bool = True):
+        """
+        COPY into a temporary staging table then replace the rows whose key_column
+        matches a staged row, and insert the others
+
+        NB: delete then insert, the table may not have its primary key yet (see
+        build_indexes) for an INSERT ... ON CONFLICT
+
+        :param key_column: column identifying a row
+        :param commit: commit the merge (and drop the staging table) on exit
+        """
+        staging_manager = TableManager(
+            self.db_conn,
+            f"{self.table}{STAGING_SUFFIX}",
+            self.columns,
+            binary_copy=self.binary_copy,
+        )
+        staging_manager.create_temp_table()
+
+        with staging_manager.db_copy(commit=False) as copy:
+            yield copy
+
+        staging_manager.analyze()
+        key_columns = self.get_key_columns(key_column)
+        with self.db_conn.cursor() as db:
+            db.execute(
+                f"""
+                DELETE FROM {self.get_qualified_table()} t
+                USING {staging_manager.table} s
+                WHERE {" AND ".join(f"t.{name} = s.{name}" for name in key_columns)}
+            """
+            )
+        self.insert_missing(str(staging_manager.table), key_column)
+        if commit:
+            self.db_conn.commit()
+
+    def delete_rows(
+        self,
+        keys: Sequence[Any],
+        key_column: str = "id",
+        partition: Optional[str] = None,
+    ) -> int:
+        """
+        Delete the rows whose key_column is one of keys, not committed
+
+        :param partition: only delete the rows whose partition_by is partition
+        :return: number of deleted rows
+        """
+        partition_clause = ""
+        params: List[Any] = [list(keys)]
+        if partition is not None:
+            assert self.partition_by is not None
+            partition_clause = f"AND {self.partition_by} = %s"
+            params.append(partition)
+
+        with self.db_conn.cursor() as db:
+            db.execute(
+                f"DELETE FROM {self.get_qualified_table()} WHERE {key_column} = ANY(%s) {partition_clause}",
+                params,
+            )
+            return db.rowcount
+
+    def get_shadow_manager(self) -> "TableManager":
+        return TableManager(
+            self.db_conn,
+            f"{self.table}{SHADOW_SUFFIX}",
+            self.columns,
+            self.indexes,
+            self.schema,
+            binary_copy=self.binary_copy,
+            primary_key=self.primary_key,
+        )
+
+    @contextmanager
+    def db_copy_shadow(self):
+        """
+        First-time load which keeps the bulk of the data out of the WAL: COPY ... FREEZE
+        into an UNLOGGED shadow table created in the same transaction, build its indexes,
+        then flip it to LOGGED (one sequential WAL write) and swap it in for the table.
+
+        NB: the table is replaced, only use while it's empty; columns, defaults,
+        constraints and comments are carried over, foreign keys are re-created
+        """
+        shadow_manager = self.get_shadow_manager()
+        shadow_manager.create_shadow_table(self.get_qualified_table())
+
+        with shadow_manager.db_copy(freeze=True) as copy:
+            yield copy
+
+        execute_parallel(self.db_conn, shadow_manager.get_index_statements(self))
+        shadow_manager.add_primary_key()
+        shadow_manager.analyze()
+        self.swap_in(shadow_manager)
+
+    def create_shadow_table(self, like_table: str, unlogged: bool = True):
+        """
+        Create this table like like_table: columns, NOT NULL and check constraints,
+        defaults and comments; indexes are built once loaded (see get_index_statements)
+
+        NB: not committed, e.g. a COPY FREEZE has to follow in the same transaction
+
+        :param unlogged: False for a table which outlives the load (e.g. in a schema
+            swapped in), an UNLOGGED one is truncated after a crash
+        """
+        table = self.get_qualified_table()
+        unlogged_clause = "UNLOGGED " if unlogged else ""
+        with self.db_conn.cursor() as db:
+            db.execute(f"DROP TABLE IF EXISTS {table}")
+            db.execute(
+                f"""
+                CREATE {unlogged_clause}TABLE {table} (
+                    LIKE {like_table} INCLUDING ALL EXCLUDING INDEXES
+                )
+            """
+            )
+
+            comment = db.execute(
+                "SELECT obj_description(%s::regclass, 'pg_class')", (like_table,)
+            ).fetchone()
+            if comment is not None and comment[0] is not None:
+                db.execute(
+                    sql.SQL("COMMENT ON TABLE {} IS {}").format(
+                        sql.SQL(table), sql.Literal(comment[0])
+                    )
+                )
+
+    def swap_in(self, shadow_manager: "TableManager"):
+        """Replace this table by the (loaded and indexed) shadow table, atomically."""
+        with self.db_conn.cursor() as db:
+            # NB: rewrites table and indexes into the WAL, before the table is locked
+            db.execute(f"ALTER TABLE {shadow_manager.get_qualified_table()} SET LOGGED")
+            self.db_conn.commit()
+
+            db.execute(
+                f"LOCK TABLE {self.get_qualified_table()} IN ACCESS EXCLUSIVE MODE"
+            )
+        foreign_keys = self.replace(shadow_manager)
+        add_foreign_keys(self.db_conn, foreign_keys)
         self.db_conn.commit()
+        validate_foreign_keys(self.db_conn, foreign_keys)
+
+    def get_foreign_keys(self) -> List[ForeignKey]:
+        """Foreign keys of this table, and referencing it."""
+        table = self.get_qualified_table()
+        with self.db_conn.cursor() as db:
+            return db.execute(
+                """
+                SELECT
+                    conrelid::regclass::text, conname, pg_get_constraintdef(oid),
+                    obj_description(oid, 'pg_constraint')
+                FROM pg_constraint
+                WHERE contype = 'f' AND (conrelid = %s::regclass OR confrelid = %s::regclass)
+                """,
+                (table, table),
+            ).fetchall()
+
+    def replace(self, shadow_manager: "TableManager") -> List[ForeignKey]:
+        """
+        Drop this (locked) table and move the shadow table, possibly of another schema,
+        in its place; not committed
+
+        :return: foreign keys which were dropped, to add back once every table is
+            replaced (see add_foreign_keys)
+        """
+        foreign_keys = self.get_foreign_keys()
+        with self.db_conn.cursor() as db:
+            # NB: e.g. the primary key's, the others are copied by create_shadow_table
+            constraint_comments = db.execute(
+                """
+                SELECT conname, obj_description(oid, 'pg_constraint') FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype <> 'f'
+                    AND obj_description(oid, 'pg_constraint') IS NOT NULL
+                """,
+                (self.get_qualified_table(),),
+            ).fetchall()
+
+            for fk_table, name, _, _ in foreign_keys:
+                db.execute(f"ALTER TABLE {fk_table} DROP CONSTRAINT {name}")
+            db.execute(f"DROP TABLE {self.get_qualified_table()}")
+
+            # NB: indexes and constraints move along with the table
+            if shadow_manager.schema != self.schema:
+                db.execute(
+                    f"ALTER TABLE {shadow_manager.get_qualified_table()} SET SCHEMA {self.schema}"
+                )
+            if shadow_manager.table != self.table:
+                db.execute(
+                    f"ALTER TABLE {self.schema}.{shadow_manager.table} RENAME TO {self.table}"
+                )
+                # NB: renaming the index of a constraint renames the constraint too
+                prefix = f"{shadow_manager.table}_"
+                for name, _, _ in self.get_index_definitions():
+                    if name.startswith(prefix):
+                        db.execute(
+                            f"""
+                            ALTER INDEX {self.schema}.{name}
+                                RENAME TO {self.table}_{name[len(prefix):]}
+                        """
+                        )
+
+            for name, comment in constraint_comments:
+                exists = db.execute(
+                    "SELECT EXISTS (SELECT FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s)",
+                    (self.get_qualified_table(), name),
+                ).fetchone()
+                assert exists is not None
+                if exists[0]:
+                    comment_on_constraint(db, self.get_qualified_table(), name, comment)
+        return foreign_keys
+
+    def insert_missing(
+        self,
+        source: str,
+        key_column: str = "id",
+        params: Optional[Sequence[Any]] = None,
+    ) -> int:
+        """
+        Insert rows from source which don't match an existing row on key_column (anti-join)
+
+        :param source: table or parenthesized subquery providing this table's column names
+        :param key_column: column identifying a row
+        :param params: query parameters referenced by source
+        :return: number of inserted rows
+        """
+        column_names = list(self.get_column_names())
+        table = self.get_qualified_table()
+        # NB: the same key may be in several partitions, e.g. an address of two chains
+        key_columns = self.get_key_columns(key_column)
+
+        # NB: the anti-join doesn't see the rows of concurrent transactions (e.g. of
+        # another chain), once the table has its primary key they're skipped on conflict
+        with self.db_conn.cursor() as db:
+            db.execute(
+                f"""
+                INSERT INTO {table} ({",".join(column_names)})
+                SELECT {",".join(f"s.{name}" for name in column_names)} FROM {source} s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} t
+                    WHERE {" AND ".join(f"t.{name} = s.{name}" for name in key_columns)}
+                )
+                ON CONFLICT DO NOTHING
+            """,
+                params,
+            )
+            return db.rowcount
+
+
+def add_foreign_keys(db_conn: Connection, foreign_keys: List[ForeignKey]):
+    """Add back foreign keys dropped by TableManager.replace, not committed."""
+    with db_conn.cursor() as db:
+        # NB: NOT VALID doesn't scan the referencing table while it's locked
+        for fk_table, name, definition, comment in foreign_keys:
+            db.execute(
+                f"ALTER TABLE {fk_table} ADD CONSTRAINT {name} {definition} NOT VALID"
+            )
+            if comment is not None:
+                comment_on_constraint(db, fk_table, name, comment)
+
+
+def validate_foreign_keys(db_conn: Connection, foreign_keys: List[ForeignKey]):
+    """Validate foreign keys added NOT VALID, reads and writes carry on meanwhile."""
+    with db_conn.cursor() as db:
+        for fk_table, name, _, _ in foreign_keys:
+            db.execute(f"ALTER TABLE {fk_table} VALIDATE CONSTRAINT {name}")
+    db_conn.commit()
+
+
+def comment_on_constraint(db: Cursor, table: str, name: str, comment: str):
+    # NB: PostGraphile derives field names from them, e.g. @foreignFieldName
+    db.execute(
+        sql.SQL("COMMENT ON CONSTRAINT {} ON {} IS {}").format(
+            sql.Identifier(name), sql.SQL(table), sql.Literal(comment)
+        )
+    )
@@ -0,0 +1,258 @@
+import json
+import time
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from psycopg import Connection
+
+from src.genesis.db.table_manager import DEFAULT_SCHEMA
+from src.genesis.genesis import record_spool_baseline
+from src.genesis.helpers.external_sort import DEFAULT_RUN_SIZE, group_sorted, sort_lines
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    INITIAL_HEIGHT_PATH,
+    GenesisProcessor,
+)
+from src.genesis.processing.registry import SHARED_TABLES, select_processors
+from src.genesis.sources.genesis_source import GenesisSource
+from src.genesis.sources.genesis_spool import GenesisSpool
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+ID = "id"
+DEFAULT_DELETE_SIZE = 10_000
+
+Row = Tuple[Any, ...]
+
+
+class DiffCounts(NamedTuple):
+    inserted: int = 0
+    changed: int = 0
+    removed: int = 0
+
+
+def diff_rows(
+    old_rows: Iterable[Row], new_rows: Iterable[Row]
+) -> Tuple[List[Row], List[Row], List[Any]]:
+    """
+    :return: rows which are new, rows which changed and ids of the removed rows, rows
+        are identified by their first column
+    """
+    old_by_id = {row[0]: row for row in old_rows}
+    new_by_id = {row[0]: row for row in new_rows}
+    inserted = [row for id_, row in new_by_id.items() if id_ not in old_by_id]
+    changed = [
+        row
+        for id_, row in new_by_id.items()
+        if id_ in old_by_id and old_by_id[id_] != row
+    ]
+    removed = [id_ for id_ in old_by_id if id_ not in new_by_id]
+    return inserted, changed, removed
+
+
+def merge_join(
+    old: Iterator[Tuple[str, List[str]]], new: Iterator[Tuple[str, List[str]]]
+) -> Iterator[Tuple[List[str], List[str]]]:
+    """Lines of every key of two sorted (key, lines) streams, in either or both."""
+    old_item = next(old, None)
+    new_item = next(new, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            assert old_item is not None
+            yield old_item[1], []
+            old_item = next(old, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield [], new_item[1]
+            new_item = next(new, None)
+        else:
+            yield old_item[1], new_item[1]
+            old_item, new_item = next(old, None), next(new, None)
+
+
+def iter_sorted_items(
+    spool: GenesisSpool,
+    processor: GenesisProcessor,
+    run_size: int = DEFAULT_RUN_SIZE,
+    directory: Optional[str] = None,
+) -> Iterator[Tuple[str, List[str]]]:
+    """Items of processor (as spooled) by key, e.g. address, in order of the keys."""
+
+    def get_key(line: str) -> str:
+        return processor.get_key(json.loads(line))
+
+    lines = sort_lines(spool.iter_lines(processor.path), get_key, run_size, directory)
+    return group_sorted(lines)
+
+
+def apply_diff(
+    db_conn: Connection,
+    processor: GenesisProcessor,
+    changes: Iterable[Tuple[List[str], List[str]]],
+    old_chain_id: str,
+    new_chain_id: str,
+    delete_size: int = DEFAULT_DELETE_SIZE,
+    schema: str = DEFAULT_SCHEMA,
+) -> DiffCounts:
+    """
+    Write the rows which are new or changed, then delete the removed ones, committed
+    together; the rows of a shared table (see SHARED_TABLES) are only inserted
+
+    :param changes: old and new items of every key, as spooled
+    :param schema: schema of the tables loaded from the old source
+    """
+    assert processor.get_rows is not None
+    table_manager = processor.get_tables(db_conn, schema)[0]
+    insert_only = table_manager.table in SHARED_TABLES
+    counts = DiffCounts()
+    removed: List[Any] = []
+    # NB: the rows of a table loaded before chain_id was added have none, only a
+    # partitioned table keeps the rows of each chain apart
+    partitioned = table_manager.is_partitioned()
+    # NB: the rows of a new chain_id move to its own partition
+    moved = partitioned and old_chain_id != new_chain_id
+    if partitioned:
+        table_manager.ensure_partition(new_chain_id)
+
+    if insert_only:
+        copy_context = table_manager.db_copy_reconcile(ID, commit=False)
+    else:
+        copy_context = table_manager.db_copy_upsert(ID, commit=False)
+    with copy_context as copy:
+        for old_lines, new_lines in changes:
+            # NB: most items of an export are the same as in the previous one
+            if old_lines == new_lines and old_chain_id == new_chain_id:
+                continue
+            old_rows = [
+                row
+                for line in old_lines
+                for row in processor.get_rows(json.loads(line), old_chain_id)
+            ]
+            new_rows = [
+                row
+                for line in new_lines
+                for row in processor.get_rows(json.loads(line), new_chain_id)
+            ]
+            inserted, changed, removed_ids = diff_rows(old_rows, new_rows)
+            if insert_only:
+                # NB: the rows of a new chain_id are new rows of its partition
+                if moved:
+                    inserted += changed
+                changed, removed_ids = [], []
+            for row in inserted + changed:
+                copy.write_row(row)
+            removed += removed_ids
+            if moved:
+                removed += [row[0] for row in changed]
+            counts = DiffCounts(
+                counts.inserted + len(inserted),
+                counts.changed + len(changed),
+                counts.removed + len(removed_ids),
+            )
+
+    # NB: the connection can't run queries while it is in COPY mode
+    # NB: the removed rows are the old chain's, other chains' rows may share ids
+    partition = old_chain_id if partitioned else None
+    for start in range(0, len(removed), delete_size):
+        table_manager.delete_rows(removed[start : start + delete_size], ID, partition)
+    db_conn.commit()
+    return counts
+
+
+def process_genesis_diff(
+    db_conn: Connection,
+    old_source: GenesisSource,
+    new_source: GenesisSource,
+    only: Optional[Collection[str]] = None,
+    skip: Collection[str] = (),
+    run_size: int = DEFAULT_RUN_SIZE,
+    directory: Optional[str] = None,
+    export_height: Optional[int] = None,
+    schema: str = DEFAULT_SCHEMA,
+) -> Dict[str, DiffCounts]:
+    """
+    Apply the difference between two genesis sources (e.g. state exports before and
+    after an upgrade) to tables loaded from old_source: only the rows which are new,
+    changed or removed in new_source are written. Both sources are streamed in order
+    of their items' keys (e.g. addresses), sorted runs beyond run_size items are
+    spilled to directory.
+
+    NB: only processors declaring their rows (see GenesisProcessor.get_rows) are
+    diffed, accounts and contracts are only inserted
+
+    :param only: processor or module names to diff, see select_processors
+    :param skip: processor or module names not to diff
+    :param export_height: height of the state export new_source is, see
+        process_genesis_source
+    :param schema: schema of the tables, e.g. the indexer's
+    :return: counts of the rows inserted, changed and removed, by processor name
+    """
+    processors = [
+        processor
+        for processor in select_processors(False, only, skip)
+        if processor.get_rows is not None
+    ]
+    paths = (CHAIN_ID_PATH, INITIAL_HEIGHT_PATH) + tuple(
+        processor.path for processor in processors
+    )
+    # NB: blobs aren't part of the rows, only kept out of memory
+    blob_paths = tuple(
+        blob_path for processor in processors for blob_path in processor.blob_paths
+    )
+    skip_paths = tuple(
+        skip_path for processor in processors for skip_path in processor.skip_paths
+    )
+
+    counts: Dict[str, DiffCounts] = {}
+    with GenesisSpool(
+        old_source,
+        *paths,
+        directory=directory,
+        blob_paths=blob_paths,
+        skip_paths=skip_paths,
+    ) as old_spool, GenesisSpool(
+        new_source,
+        *paths,
+        directory=directory,
+        blob_paths=blob_paths,
+        skip_paths=skip_paths,
+    ) as new_spool:
+        old_spool.load()
+        new_spool.load()
+
+        for processor in processors:
+            if old_spool.digest(processor.path) == new_spool.digest(processor.path):
+                _logger.info(f"{processor.name}: unchanged, skipped")
+                counts[processor.name] = DiffCounts()
+                continue
+
+            start = time.perf_counter()
+            changes = merge_join(
+                iter_sorted_items(old_spool, processor, run_size, directory),
+                iter_sorted_items(new_spool, processor, run_size, directory),
+            )
+            counts[processor.name] = apply_diff(
+                db_conn,
+                processor,
+                changes,
+                old_spool.read_value(CHAIN_ID_PATH),
+                new_spool.read_value(CHAIN_ID_PATH),
+                schema=schema,
+            )
+            _logger.info(
+                f"{processor.name:<16} {counts[processor.name]} "
+                f"{time.perf_counter() - start:8.2f}s"
+            )
+
+        record_spool_baseline(db_conn, new_spool, export_height, schema)
+
+    return counts
@@ -1,21 +1,647 @@
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
 from psycopg import Connection
 
+from src.genesis.db.baselines import (
+    GenesisBaselines,
+    get_export_height,
+    get_genesis_export_height,
+)
+from src.genesis.db.checkpoint import Checkpoint
+from src.genesis.db.connection import clone_connection
+from src.genesis.db.copy_encoder import ParallelCopyEncoder
+from src.genesis.db.indexes import build_indexes
+from src.genesis.db.locks import advisory_lock
+from src.genesis.db.runs import GenesisRuns
+from src.genesis.db.schemas import create_schema, drop_schema, swap_in_schema
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, TableManager
+from src.genesis.helpers.sharding import Shard
 from src.genesis.processing.accounts import AccountsManager
 from src.genesis.processing.balances import BalanceManager
+from src.genesis.processing.bank import FusedBankManager
 from src.genesis.processing.contracts import ContractsManager
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    INITIAL_HEIGHT_PATH,
+    GenesisProcessor,
+    ProcessorRun,
+)
+from src.genesis.processing.registry import (
+    CHAIN_TABLES,
+    SHARED_TABLES,
+    SINGLE_CHAIN_PROCESSORS,
+    select_processors,
+)
+from src.genesis.sources.genesis_source import GenesisSource
+from src.genesis.sources.genesis_spool import GenesisSpool
+from src.genesis.state import GenesisLike, GenesisState
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+# single pass over the genesis source, every other section depends on it
+SOURCE_SECTION = "source"
+# post-load index build, depends on every other section
+INDEXES_SECTION = "indexes"
+
+
+class GenesisSection(NamedTuple):
+    name: str
+    process: Callable[[Connection], None]
+    # sections which must be committed first, e.g. genesis_balances references accounts
+    depends_on: Tuple[str, ...] = ()
 
 
-def get_chain_id(genesis_data: dict):
-    return genesis_data["chain_id"]
+def get_chain_id(genesis_data: GenesisLike) -> str:
+    return GenesisState.of(genesis_data).chain_id
 
 
-def process_genesis(db_conn: Connection, genesis_data: dict):
+def process_genesis(
+    db_conn: Connection,
+    genesis_data: GenesisLike,
+    fused: bool = False,
+    concurrent: bool = False,
+    binary_copy: bool = False,
+    shadow_load: bool = False,
+    export_height: Optional[int] = None,
+    partitioned: bool = False,
+) -> Dict[str, float]:
+    """
+    :param genesis_data: the decoded document, or its content: sections then only
+        decode the parts of it they read
+    :param partitioned: create the tables which don't exist yet partitioned by
+        chain_id (PARTITION BY LIST), see TableManager
+    :param export_height: height of the state export genesis_data is, by default
+        the one before its initial_height (none for the genesis of a chain)
+    """
+    # NB: shared by every section, each part is decoded once
+    genesis_data = GenesisState.of(genesis_data)
     chain_id = get_chain_id(genesis_data)
-    accounts_manager = AccountsManager(db_conn)
-    balances_manager = BalanceManager(db_conn)
-    contracts_manager = ContractsManager(db_conn)
+    if export_height is None:
+        export_height = get_genesis_export_height(genesis_data)
+    sections: List[GenesisSection] = []
+
+    if fused:
+        sections.append(
+            GenesisSection(
+                "bank",
+                lambda conn: FusedBankManager(
+                    conn, binary_copy, partitioned
+                ).process_genesis(genesis_data, chain_id),
+            )
+        )
+    else:
+        sections.append(
+            GenesisSection(
+                "accounts",
+                lambda conn: AccountsManager(
+                    conn, binary_copy, shadow_load
+                ).process_genesis(genesis_data, chain_id),
+            )
+        )
+        sections.append(
+            GenesisSection(
+                "balances",
+                lambda conn: BalanceManager(
+                    conn, binary_copy, shadow_load, partitioned
+                ).process_genesis(genesis_data),
+                depends_on=("accounts",),
+            )
+        )
+    sections.append(
+        GenesisSection(
+            "contracts",
+            lambda conn: ContractsManager(
+                conn, binary_copy, shadow_load, partitioned
+            ).process_genesis(genesis_data),
+        )
+    )
+
+    def record_baseline(conn: Connection):
+        if export_height is not None:
+            GenesisBaselines(conn).record(chain_id, export_height)
+
+    sections.append(
+        get_indexes_section(sections, select_processors(fused), record_baseline)
+    )
+    return run_sections(db_conn, sections, concurrent)
+
+
+def process_genesis_source(
+    db_conn: Connection,
+    source: GenesisSource,
+    fused: bool = False,
+    concurrent: bool = False,
+    binary_copy: bool = False,
+    shadow_load: bool = False,
+    chunk_size: Optional[int] = None,
+    restart: bool = False,
+    decode_workers: Optional[int] = None,
+    copy_shards: int = 1,
+    shard: Optional[Shard] = None,
+    spool_cache: Optional[str] = None,
+    only: Optional[Collection[str]] = None,
+    skip: Collection[str] = (),
+    export_height: Optional[int] = None,
+    partitioned: bool = False,
+    reload_chain: bool = False,
+    schema: str = DEFAULT_SCHEMA,
+    shadow_schema: Optional[str] = None,
+) -> Dict[str, float]:
+    """
+    Sections whose inputs have the same digest as a completed run are skipped, as is
+    the whole source when it is local (or cached) and was completely processed before
+
+    :param chunk_size: commit every chunk_size items of a section and checkpoint the
+        progress, a run which is started again resumes after the last committed chunk
+    :param restart: discard the checkpoints and completed sections of previous runs
+    :param decode_workers: processes decoding the spooled items and building their
+        rows, in parallel with the sections writing them (text COPY only)
+    :param copy_shards: parallel COPY streams of the balances section, each on its
+        own connection (not fused)
+    :param shard: only process the items of shard (by address hash), e.g. as one pod
+        of an indexed Job; runs of the same section hold an advisory lock and the last
+        shard to complete builds the indexes. Every pod of a Job uses the same count.
+    :param spool_cache: directory keeping the parsed sections by digest of the source,
+        later runs of the same source (e.g. seeding another database) don't parse it
+    :param only: processor or module names (e.g. contracts, bank) to process, see
+        select_processors
+    :param skip: processor or module names not to process
+    :param export_height: height of the state export (e.g. `fetchd export`) source
+        is, by default the one before its initial_height; recorded in
+        genesis_baselines once the indexes are built, the indexer starts after it
+    :param partitioned: create the tables which don't exist yet partitioned by
+        chain_id (PARTITION BY LIST), see TableManager
+    :param reload_chain: drop the partitions of the source's chain (in partitioned
+        tables) and load them again, rather than reconciling with their rows
+    :param schema: schema of the tables, e.g. the indexer's, and of their runs,
+        checkpoints and baseline
+    :param shadow_schema: load (and index) the tables into this schema, created
+        empty, then swap them in place of the ones of schema at once: queries carry on
+        over the previous tables meanwhile. Shared tables (see SHARED_TABLES) are
+        merged rather than replaced.
+    """
+    processors = select_processors(fused, only, skip)
+    if reload_chain or shadow_schema is not None:
+        # NB: every section of the chain is loaded again
+        restart = True
+
+    def get_run_name(name: str) -> str:
+        # NB: every shard records its own share of the data sections
+        if shard is None or name == INDEXES_SECTION:
+            return name
+        return shard.get_section_name(name)
+
+    section_names = [get_run_name(processor.name) for processor in processors]
+    section_names += [INDEXES_SECTION]
+
+    if decode_workers and binary_copy:
+        raise ValueError("decode workers send their rows as text COPY data")
+    if copy_shards > 1 and fused:
+        raise ValueError("only the balances section is sharded, not the fused bank")
+    if shard is not None and shadow_load:
+        raise ValueError("shards share the tables, they can't be swapped in")
+    if shard is not None and reload_chain:
+        raise ValueError("shards share the partitions, they can't be reloaded")
+    if shadow_schema is not None and (shard is not None or shadow_load):
+        raise ValueError("a shadow schema is loaded by one run, then swapped in")
+    if shadow_schema is not None and (partitioned or reload_chain):
+        raise ValueError("a shadow schema replaces whole tables, not partitions")
+    if shadow_schema == schema:
+        raise ValueError("the shadow schema has to differ from the live one")
+
+    runs = GenesisRuns(db_conn, schema)
+    if restart:
+        runs.reset(section_names)
+    elif source.is_local():
+        # NB: hashing a local file takes seconds, parsing and loading it takes minutes
+        source_digest = source.digest()
+        if runs.is_source_completed(source_digest, section_names):
+            _logger.info(f"{source.location} ({source_digest}) already processed")
+            return {}
+
+    # NB: bookkeeping (runs, checkpoints, baselines) stays in the live schema
+    load_schema = schema
+    if shadow_schema is not None:
+        load_schema = shadow_schema
+        create_schema(db_conn, shadow_schema)
+        # NB: NOT NULL columns, defaults and comments of the live tables are kept, as
+        # are their indexes (see get_indexes_section)
+        for live in get_processor_tables(db_conn, processors, schema):
+            TableManager(db_conn, live.table, schema=shadow_schema).create_shadow_table(
+                live.get_qualified_table(), unlogged=False
+            )
+        db_conn.commit()
+
+    # NB: the source (possibly a multi-GB download) is read once for every processor,
+    # which then stream their items from the local spool; chain_id follows app_state
+    # in the document
+    with ExitStack() as stack:
+        spool = stack.enter_context(
+            GenesisSpool(
+                source,
+                CHAIN_ID_PATH,
+                INITIAL_HEIGHT_PATH,
+                *(
+                    path
+                    for processor in processors
+                    for path in (processor.path,) + processor.inputs
+                ),
+                cache_dir=spool_cache,
+                blob_paths=tuple(
+                    blob_path
+                    for processor in processors
+                    for blob_path in processor.blob_paths
+                ),
+                skip_paths=tuple(
+                    skip_path
+                    for processor in processors
+                    for skip_path in processor.skip_paths
+                ),
+            )
+        )
+        encoder = None
+        if decode_workers:
+            encoder = stack.enter_context(ParallelCopyEncoder(decode_workers))
+
+        def section(
+            name: str,
+            inputs: Tuple[str, ...],
+            process: Callable[[Connection, Optional[Checkpoint]], None],
+            depends_on: Tuple[str, ...],
+            wait_for: Tuple[str, ...] = (),
+        ) -> GenesisSection:
+            run_name = get_run_name(name)
+            # NB: sources (e.g. of other chains) load their sections independently,
+            # the indexes of the tables they share are built by one at a time
+            location = None if name == INDEXES_SECTION else source.location
+
+            def run_once(conn: Connection):
+                # NB: an overlapping run of the section waits, then finds it completed
+                with ExitStack() as locks:
+                    if run_name != name:
+                        locks.enter_context(
+                            advisory_lock(
+                                conn, get_lock_name(name, location), shared=True
+                            )
+                        )
+                    locks.enter_context(
+                        advisory_lock(conn, get_lock_name(run_name, location))
+                    )
+                    run_locked(conn)
+
+            def run_locked(conn: Connection):
+                assert spool.source_digest is not None
+                section_digest = spool.digest(*inputs)
+                section_runs = GenesisRuns(conn, schema)
+
+                if not section_runs.is_source_completed(spool.source_digest, wait_for):
+                    _logger.info(f"{run_name}: waiting for other shards, skipped")
+                    return
+
+                start = time.perf_counter()
+                if section_runs.is_section_completed(run_name, section_digest):
+                    _logger.info(
+                        f"{run_name}: unchanged since a completed run, skipped"
+                    )
+                else:
+                    checkpoint = None
+                    if chunk_size is not None:
+                        checkpoint = Checkpoint(
+                            conn, section_digest, run_name, chunk_size, schema
+                        )
+                        if restart:
+                            checkpoint.reset()
+                    process(conn, checkpoint)
+
+                section_runs.record(
+                    spool.source_digest,
+                    run_name,
+                    section_digest,
+                    source.location,
+                    time.perf_counter() - start,
+                )
+
+            return GenesisSection(
+                name, run_once, tuple(dict.fromkeys((SOURCE_SECTION,) + depends_on))
+            )
+
+        def iter_inputs(processor: GenesisProcessor) -> Iterator[Any]:
+            # NB: the encoder's processes decode the lines themselves
+            if encoder is not None:
+                items: Iterator[Any] = spool.iter_lines(processor.path)
+            else:
+                items = spool.iter_items(processor.path)
+            if shard is None:
+                return items
+
+            def in_shard(item: Any) -> bool:
+                assert shard is not None
+                return shard.contains(
+                    processor.get_key(json.loads(item) if encoder else item)
+                )
+
+            return filter(in_shard, items)
+
+        def get_process(
+            processor: GenesisProcessor,
+        ) -> Callable[[Connection, Optional[Checkpoint]], None]:
+            def process(conn: Connection, checkpoint: Optional[Checkpoint]):
+                chain_id = spool.read_value(CHAIN_ID_PATH)
+                if reload_chain:
+                    for table_manager in processor.get_tables(conn, schema):
+                        table_manager.drop_partition(chain_id)
+
+                run = ProcessorRun(
+                    iter_inputs(processor),
+                    chain_id,
+                    checkpoint,
+                    encoder,
+                    binary_copy,
+                    shadow_load,
+                    copy_shards,
+                    spool,
+                    partitioned,
+                    load_schema,
+                )
+                processor.process(conn, run)
+
+            return process
+
+        names = {processor.name for processor in processors}
+        sections = [GenesisSection(SOURCE_SECTION, lambda _: spool.load())]
+        for processor in processors:
+            sections.append(
+                section(
+                    processor.name,
+                    (processor.path,) + processor.inputs,
+                    get_process(processor),
+                    # NB: dependencies which aren't selected were processed before
+                    tuple(name for name in processor.depends_on if name in names),
+                )
+            )
+
+        def complete(conn: Connection):
+            if shadow_schema is not None:
+                swap_in_schema(
+                    conn,
+                    list(
+                        zip(
+                            get_processor_tables(conn, processors, schema),
+                            get_processor_tables(conn, processors, shadow_schema),
+                        )
+                    ),
+                    SHARED_TABLES,
+                )
+                drop_schema(conn, shadow_schema)
+            record_spool_baseline(conn, spool, export_height, schema)
+
+        # NB: indexes only need building (and tables analyzing) after inputs changed,
+        # and once every shard completed its sections
+        indexes_section = get_indexes_section(
+            sections,
+            processors,
+            complete,
+            load_schema,
+            None if shadow_schema is None else schema,
+        )
+        wait_for: Tuple[str, ...] = ()
+        if shard is not None:
+            wait_for = tuple(
+                name
+                for processor in processors
+                for name in shard.get_all_section_names(processor.name)
+            )
+        sections.append(
+            section(
+                INDEXES_SECTION,
+                spool.paths,
+                lambda conn, _: indexes_section.process(conn),
+                indexes_section.depends_on,
+                wait_for,
+            )
+        )
+        try:
+            return run_sections(db_conn, sections, concurrent)
+        except BaseException:
+            if shadow_schema is not None:
+                # NB: the sections completed into the shadow schema were never
+                # swapped in, a later run mustn't skip them
+                db_conn.rollback()
+                runs.reset(section_names)
+            raise
+
+
+def process_genesis_sources(
+    db_conn: Connection, sources: List[GenesisSource], **kwargs: Any
+) -> Dict[str, Dict[str, float]]:
+    """
+    Process several sources (e.g. the genesis of several chains) concurrently, each
+    over its own connection(s) with the options of process_genesis_source
+
+    NB: several sources require partitioned tables, see check_partitioned
+
+    :return: timings of each source, by location
+    """
+    if len(sources) == 1:
+        return {
+            sources[0].location: process_genesis_source(db_conn, sources[0], **kwargs)
+        }
+
+    if kwargs.get("shadow_load", False):
+        # NB: each would load (and swap in) its own shadow of the same empty table
+        raise ValueError("several sources share the tables, they can't be swapped in")
+
+    schema = kwargs.get("schema", DEFAULT_SCHEMA)
+    check_partitioned(
+        db_conn,
+        select_processors(
+            kwargs.get("fused", False), kwargs.get("only"), kwargs.get("skip", ())
+        ),
+        schema,
+        kwargs.get("partitioned", False),
+    )
+    # NB: the chains share their accounts, which they insert concurrently: only the
+    # primary key keeps an address of two chains from being inserted twice
+    AccountsManager(db_conn, schema=schema).table_manager.build_primary_key()
+
+    def process_source(source: GenesisSource) -> Dict[str, float]:
+        with clone_connection(db_conn) as source_conn:
+            return process_genesis_source(source_conn, source, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        timings = list(executor.map(process_source, sources))
+    return {source.location: timing for source, timing in zip(sources, timings)}
+
+
+def record_spool_baseline(
+    db_conn: Connection,
+    spool: GenesisSpool,
+    export_height: Optional[int] = None,
+    schema: str = DEFAULT_SCHEMA,
+):
+    """
+    Record the height of the state export spool was read from, by default the one
+    before its initial_height (nothing for the genesis of a chain)
+
+    NB: the spool has to include CHAIN_ID_PATH and INITIAL_HEIGHT_PATH
+    """
+    if export_height is None:
+        try:
+            export_height = get_export_height(spool.read_value(INITIAL_HEIGHT_PATH))
+        except KeyError:
+            # NB: e.g. the genesis of a chain from before initial_height
+            return
+    if export_height is not None:
+        GenesisBaselines(db_conn, schema).record(
+            spool.read_value(CHAIN_ID_PATH),
+            export_height,
+            spool.source_digest,
+            spool.source.location,
+        )
+
+
+def get_lock_name(section: str, location: Optional[str] = None) -> str:
+    if location is None:
+        return f"genesis/{section}"
+    return f"genesis/{location}/{section}"
+
+
+def get_processor_tables(
+    db_conn: Connection, processors: List[GenesisProcessor], schema: str
+) -> List[TableManager]:
+    """Managers of the tables processors write in schema, each table once."""
+    tables: Dict[str, TableManager] = {}
+    for processor in processors:
+        for table_manager in processor.get_tables(db_conn, schema):
+            tables.setdefault(table_manager.get_qualified_table(), table_manager)
+    return list(tables.values())
+
+
+def get_indexes_section(
+    sections: List[GenesisSection],
+    processors: List[GenesisProcessor],
+    complete: Optional[Callable[[Connection], None]] = None,
+    schema: str = DEFAULT_SCHEMA,
+    like_schema: Optional[str] = None,
+) -> GenesisSection:
+    """
+    :param complete: runs once the tables are complete and indexed, e.g. records the
+        height they were loaded from
+    :param like_schema: indexes are built like those of the tables in this schema,
+        see build_indexes
+    """
+
+    def process(conn: Connection):
+        build_indexes(
+            conn,
+            get_processor_tables(conn, processors, schema),
+            like_schema=like_schema,
+        )
+        if complete is not None:
+            complete(conn)
+
+    return GenesisSection(
+        INDEXES_SECTION,
+        process,
+        depends_on=tuple(section.name for section in sections),
+    )
+
+
+def run_sections(
+    db_conn: Connection, sections: List[GenesisSection], concurrent: bool = False
+) -> Dict[str, float]:
+    """
+    Process sections in order on db_conn or, when concurrent, each on its own
+    connection in a thread pool (dependencies still complete first)
+
+    :return: seconds spent processing each section, by name
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
 
     print("processing...")
-    accounts_manager.process_genesis(genesis_data, chain_id)
-    balances_manager.process_genesis(genesis_data)
-    contracts_manager.process_genesis(genesis_data)
+    if concurrent:
+        futures: Dict[str, Future] = {}
+        with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+            for section in sections:
+                dependencies = [futures[name] for name in section.depends_on]
+                futures[section.name] = executor.submit(
+                    _run_concurrent_section, db_conn, section, dependencies
+                )
+            for name, future in futures.items():
+                timings[name] = future.result()
+    else:
+        for section in sections:
+            timings[section.name] = _run_section(db_conn, section)
+
+    for name, elapsed in timings.items():
+        _logger.info(f"{name:<12} {elapsed:8.2f}s")
+    _logger.info(f"{'total':<12} {time.perf_counter() - start:8.2f}s")
+
+    return timings
+
+
+def _run_section(db_conn: Connection, section: GenesisSection) -> float:
+    start = time.perf_counter()
+    section.process(db_conn)
+    return time.perf_counter() - start
+
+
+def _run_concurrent_section(
+    db_conn: Connection, section: GenesisSection, dependencies: List[Future]
+) -> float:
+    for dependency in dependencies:
+        dependency.result()
+
+    with clone_connection(db_conn) as section_conn:
+        return _run_section(section_conn, section)
+
+
+def check_partitioned(
+    db_conn: Connection,
+    processors: List[GenesisProcessor],
+    schema: str = DEFAULT_SCHEMA,
+    partitioned: bool = False,
+):
+    """
+    Refuse to load several chains into tables their rows would collide in: the ids of
+    CHAIN_TABLES (e.g. a balance's address and denom) are only unique within a chain,
+    the rows of each chain are only kept apart in partitions of chain_id (see
+    TableManager.get_key_columns)
+
+    :param partitioned: tables which don't exist yet are created partitioned
+    """
+    for processor in processors:
+        if processor.name in SINGLE_CHAIN_PROCESSORS:
+            raise ValueError(f"{processor.name} only loads a single chain")
+        if processor.name not in CHAIN_TABLES:
+            continue
+
+        table_manager = TableManager(
+            db_conn, CHAIN_TABLES[processor.name], schema=schema
+        )
+        # NB: existing tables are used as they are
+        if table_manager.table_exists(str(table_manager.table)):
+            is_partitioned = table_manager.is_partitioned()
+        else:
+            is_partitioned = partitioned
+        if not is_partitioned:
+            raise ValueError(
+                f"{table_manager.get_qualified_table()} isn't partitioned by chain_id, "
+                "its rows of several chains would collide"
+            )
@@ -0,0 +1,39 @@
+import hashlib
+from typing import IO, Any, Iterable
+
+DIGEST_CHUNK_SIZE = 1 << 20
+
+
+class DigestReader:
+    """Read-only stream wrapper which hashes (SHA-256) everything read through it."""
+
+    def __init__(self, stream: IO[bytes]):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._hash.update(data)
+        return data
+
+    def drain(self):
+        """Read (and hash) whatever remains of the stream."""
+        while self.read(DIGEST_CHUNK_SIZE):
+            pass
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def stream_digest(stream: IO[bytes]) -> str:
+    """SHA-256 of the remaining content of stream."""
+    reader = DigestReader(stream)
+    reader.drain()
+    return reader.hexdigest()
+
+
+def combine_digests(digests: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(digests).encode()).hexdigest()
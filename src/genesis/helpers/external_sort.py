@@ -0,0 +1,64 @@
+import heapq
+import json
+import os
+import tempfile
+from contextlib import ExitStack
+from itertools import groupby
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_RUN_SIZE = 100_000
+
+
+def _write_run(run: List[Tuple[str, str]], directory: str) -> str:
+    run.sort()
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(fd, "w") as file:
+        for key, line in run:
+            # NB: JSON strings never contain a raw tab
+            file.write(f"{json.dumps(key)}\t{line}")
+    return path
+
+
+def _iter_run(file: IO[str]) -> Iterator[Tuple[str, str]]:
+    for record in file:
+        key, line = record.split("\t", 1)
+        yield json.loads(key), line
+
+
+def sort_lines(
+    lines: Iterable[str],
+    get_key: Callable[[str], str],
+    run_size: int = DEFAULT_RUN_SIZE,
+    directory: Optional[str] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Lines in order of their key, only run_size of them are held in memory: beyond
+    that, sorted runs are spilled to files in directory and merged
+
+    :param lines: newline terminated, e.g. the values of a spooled path
+    :return: (key, line) pairs, sorted by key then line
+    """
+    run: List[Tuple[str, str]] = []
+    with tempfile.TemporaryDirectory(dir=directory) as runs_dir, ExitStack() as stack:
+        run_paths: List[str] = []
+        for line in lines:
+            run.append((get_key(line), line))
+            if len(run) == run_size:
+                run_paths.append(_write_run(run, runs_dir))
+                run = []
+
+        if not run_paths:
+            run.sort()
+            yield from run
+            return
+
+        run_paths.append(_write_run(run, runs_dir))
+        run = []
+        runs = [_iter_run(stack.enter_context(open(path))) for path in run_paths]
+        yield from heapq.merge(*runs)
+
+
+def group_sorted(pairs: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, List[str]]]:
+    """Lines of each key of sorted (key, line) pairs, e.g. from sort_lines."""
+    for key, group in groupby(pairs, key=lambda pair: pair[0]):
+        yield key, [line for _, line in group]
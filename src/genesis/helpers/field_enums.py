@@ -120,6 +120,7 @@ class Contracts(NamedFields):
     interface = 1
     store_message_id = 2
     instantiate_message_id = 3
+    chain_id = 4
 
 
 class Cw20Transfers(NamedFields):
@@ -211,6 +212,7 @@ class GenesisBalances(NamedFields):
     account_id = 1
     amount = 2
     denom = 3
+    chain_id = 4
 
 
 class IBCTransfers(NamedFields):
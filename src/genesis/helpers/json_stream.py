@@ -0,0 +1,438 @@
+import codecs
+import json
+import re
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+WILDCARD = "[*]"
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_LEAF = None
+# marks a string value streamed in chunks, below a selected path
+_BLOB = object()
+# marks a value left out of the selected value it's within
+_SKIP = object()
+# marks the nodes leading to a selected path, e.g. one within another selected value
+_SELECTS = object()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+# everything up to the next bracket, including whole strings which may contain brackets
+_SKIP_RUN = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+_SCALAR_END = re.compile(r"[,\]}\s]")
+_STRING_RUN = re.compile(r'[^"\\]*')
+_MAX_ESCAPE_SIZE = len("\\u0000")
+
+PathTrie = Dict[Any, Any]
+# consumes the chunks of a blob (path, chunks), returns the value standing for it
+BlobReader = Callable[[str, Iterator[str]], Any]
+# yields (path, value) of the selected paths within a value, returns the value
+SelectedValues = Generator[Tuple[str, Any], None, Any]
+
+
+class JSONStreamError(Exception):
+    def __init__(self, message: str, offset: int):
+        super().__init__(f"{message} (at character {offset})")
+        self.offset = offset
+
+
+def parse_path(path: str) -> Tuple[str, ...]:
+    """
+    Split a path like "app_state.bank.balances[*]" into its keys
+
+    :param path: dot separated object keys, "[*]" suffixes select every array element
+    :return: keys and WILDCARD markers in document order
+    """
+    keys = []
+    for part in path.split("."):
+        wildcards = 0
+        while part.endswith(WILDCARD):
+            part = part[: -len(WILDCARD)]
+            wildcards += 1
+        if part:
+            keys.append(part)
+        keys.extend([WILDCARD] * wildcards)
+    return tuple(keys)
+
+
+def build_path_trie(
+    paths: Tuple[str, ...],
+    blob_paths: Tuple[str, ...] = (),
+    skip_paths: Tuple[str, ...] = (),
+) -> PathTrie:
+    trie: PathTrie = {}
+    for path in paths:
+        node = trie
+        for key in parse_path(path):
+            node = node.setdefault(key, {})
+            node[_SELECTS] = True
+        node[_LEAF] = path
+    for marker, marked_paths in ((_BLOB, blob_paths), (_SKIP, skip_paths)):
+        for marked_path in marked_paths:
+            node = trie
+            for key in parse_path(marked_path):
+                node = node.setdefault(key, {})
+            node[marker] = marked_path
+    return trie
+
+
+class JSONStreamReader:
+    """
+    Incremental reader which only decodes the values selected by a set of paths,
+    everything else is skipped without being materialized.
+    """
+
+    def __init__(
+        self,
+        stream: IO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        read_blob: Optional[BlobReader] = None,
+    ):
+        """
+        :param read_blob: consumes the strings of blob paths chunk by chunk, within
+            selected values they're replaced by what it returns
+        """
+        self._stream = stream
+        self._read_blob = read_blob
+        self._chunk_size = chunk_size
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._discarded = 0
+        self._eof = False
+
+    @property
+    def offset(self) -> int:
+        return self._discarded + self._pos
+
+    def iter_values(
+        self,
+        *paths: str,
+        blob_paths: Tuple[str, ...] = (),
+        skip_paths: Tuple[str, ...] = (),
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield (path, value) for every value matching one of paths, in document order.
+        Values of a path within the value of another (e.g. the state entries of a
+        contract) are left out of it and yielded on their own, before it.
+
+        :param blob_paths: paths of strings within the values (e.g. base64 encoded
+            code) which are handed to read_blob as they're read, never whole
+        :param skip_paths: paths within the values which are left out of them
+        """
+        assert not blob_paths or self._read_blob is not None
+        yield from self._walk(build_path_trie(paths, blob_paths, skip_paths))
+
+    def _error(self, message: str) -> JSONStreamError:
+        return JSONStreamError(message, self.offset)
+
+    def _fill(self, min_size: int = 0) -> bool:
+        if self._eof:
+            return False
+
+        # drop everything which has already been consumed
+        self._discarded += self._pos
+        self._buf = self._buf[self._pos :]
+        self._pos = 0
+
+        data: Union[bytes, str] = self._stream.read(max(self._chunk_size, min_size))
+        if not data:
+            self._eof = True
+            tail = self._text_decoder.decode(b"", final=True)
+            self._buf += tail
+            return bool(tail)
+
+        if isinstance(data, bytes):
+            data = self._text_decoder.decode(data)
+        self._buf += data
+        return True
+
+    def _grow(self):
+        # read at least as much again as is buffered so retries stay linear overall
+        if not self._fill(len(self._buf) - self._pos):
+            raise self._error("unexpected end of document")
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()  # type: ignore
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise self._error("unexpected end of document")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise self._error(f"expected '{char}'")
+        self._pos += 1
+
+    def _read_key(self) -> str:
+        if self._peek() != '"':
+            raise self._error("expected object key")
+
+        while True:
+            match = _STRING.match(self._buf, self._pos)
+            if match is not None:
+                break
+            self._grow()
+
+        self._pos = match.end()
+        key = match.group()
+        if "\\" in key:
+            return json.loads(key)
+        return key[1:-1]
+
+    def _decode_value(self) -> Any:
+        if self._peek() not in '{["':
+            # a number or literal cut off by the end of the buffer may still decode,
+            # e.g. "-0.0025" split after "-0." reads as -0, buffer up to its delimiter
+            while _SCALAR_END.search(self._buf, self._pos) is None:
+                if not self._fill(len(self._buf) - self._pos):
+                    break
+
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise self._error("invalid JSON value") from None
+                self._grow()
+                continue
+
+            self._pos = end
+            return value
+
+    def _skip_string(self):
+        while True:
+            match = _STRING.match(self._buf, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                return
+            self._grow()
+
+    def _skip_scalar(self):
+        while True:
+            match = _SCALAR_END.search(self._buf, self._pos)
+            if match is not None:
+                self._pos = match.start()
+                return
+            if not self._fill(len(self._buf) - self._pos):
+                self._pos = len(self._buf)
+                return
+
+    def _skip_value(self):
+        char = self._peek()
+        if char == '"':
+            self._skip_string()
+            return
+        if char not in "[{":
+            self._skip_scalar()
+            return
+
+        depth = 0
+        while True:
+            self._pos = _SKIP_RUN.match(self._buf, self._pos).end()  # type: ignore
+            if self._pos == len(self._buf):
+                if not self._fill():
+                    raise self._error("unexpected end of document")
+                continue
+
+            char = self._buf[self._pos]
+            if char == '"':
+                # string cut off by the end of the buffer
+                self._grow()
+                continue
+
+            self._pos += 1
+            if char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _iter_string(self) -> Iterator[str]:
+        """Content of the next string, unescaped, in chunks of at most what's buffered."""
+        self._expect('"')
+        while True:
+            end = _STRING_RUN.match(self._buf, self._pos).end()  # type: ignore
+            if end > self._pos:
+                yield self._buf[self._pos : end]
+                self._pos = end
+            if self._pos == len(self._buf):
+                if not self._fill():
+                    raise self._error("unexpected end of document")
+                continue
+
+            if self._buf[self._pos] == '"':
+                self._pos += 1
+                return
+
+            if len(self._buf) - self._pos < _MAX_ESCAPE_SIZE:
+                self._fill(_MAX_ESCAPE_SIZE)
+            size = (
+                _MAX_ESCAPE_SIZE
+                if self._buf[self._pos + 1 : self._pos + 2] == "u"
+                else 2
+            )
+            escape = self._buf[self._pos : self._pos + size]
+            try:
+                yield json.loads(f'"{escape}"')
+            except json.JSONDecodeError:
+                raise self._error("invalid string escape") from None
+            self._pos += size
+
+    def _decode_selected(self, node: PathTrie) -> SelectedValues:
+        """
+        Value of a selected path, any blobs within it read as they're streamed and
+        the selected paths within it yielded
+        """
+        char = self._peek()
+        if _BLOB in node and char == '"':
+            assert self._read_blob is not None
+            chunks = self._iter_string()
+            value = self._read_blob(node[_BLOB], chunks)
+            # NB: the blob ends where the string does, whatever read_blob consumed
+            for _ in chunks:
+                pass
+            return value
+
+        if char == "{" and any(isinstance(key, str) for key in node):
+            return (yield from self._decode_object(node))
+        if char == "[" and WILDCARD in node:
+            return (yield from self._decode_array(node[WILDCARD]))
+        return self._decode_value()
+
+    def _decode_object(self, node: PathTrie) -> SelectedValues:
+        value: Dict[str, Any] = {}
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return value
+
+        while True:
+            key = self._read_key()
+            self._expect(":")
+
+            child = node.get(key)
+            if child is None:
+                value[key] = self._decode_value()
+            elif _SELECTS in child:
+                # NB: never held within the value, however many there are
+                yield from self._walk(child)
+            elif _SKIP in child:
+                self._skip_value()
+            else:
+                value[key] = yield from self._decode_selected(child)
+
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return value
+            if char != ",":
+                raise self._error("expected ',' or '}'")
+
+    def _decode_array(self, node: PathTrie) -> SelectedValues:
+        value: List[Any] = []
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return value
+
+        while True:
+            if _SELECTS in node:
+                yield from self._walk(node)
+            else:
+                value.append((yield from self._decode_selected(node)))
+
+            char = self._peek()
+            self._pos += 1
+            if char == "]":
+                return value
+            if char != ",":
+                raise self._error("expected ',' or ']'")
+
+    def _walk(self, node: PathTrie) -> Iterator[Tuple[str, Any]]:
+        if _LEAF in node:
+            # NB: values without blobs, skipped or selected paths are decoded in one go
+            if node.keys() <= {_LEAF, _SELECTS}:
+                yield node[_LEAF], self._decode_value()
+            else:
+                value = yield from self._decode_selected(node)
+                yield node[_LEAF], value
+            return
+
+        char = self._peek()
+        if char == "{":
+            yield from self._walk_object(node)
+        elif char == "[" and WILDCARD in node:
+            yield from self._walk_array(node[WILDCARD])
+        else:
+            self._skip_value()
+
+    def _walk_object(self, node: PathTrie) -> Iterator[Tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._read_key()
+            self._expect(":")
+
+            child = node.get(key)
+            if child is None:
+                self._skip_value()
+            else:
+                yield from self._walk(child)
+
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise self._error("expected ',' or '}'")
+
+    def _walk_array(self, node: PathTrie) -> Iterator[Tuple[str, Any]]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            yield from self._walk(node)
+
+            char = self._peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise self._error("expected ',' or ']'")
+
+
+def iter_values(
+    stream: IO,
+    *paths: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    blob_paths: Tuple[str, ...] = (),
+    read_blob: Optional[BlobReader] = None,
+    skip_paths: Tuple[str, ...] = (),
+) -> Iterator[Tuple[str, Any]]:
+    return JSONStreamReader(stream, chunk_size, read_blob).iter_values(
+        *paths, blob_paths=blob_paths, skip_paths=skip_paths
+    )
+
+
+def iter_items(
+    stream: IO, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Any]:
+    return (value for _, value in iter_values(stream, path, chunk_size=chunk_size))
@@ -0,0 +1,242 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Tuple
+
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+DEFAULT_BATCH_SIZE = 1_000
+# batches buffered between two stages, a full queue blocks the stage feeding it
+DEFAULT_QUEUE_SIZE = 16
+_POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+Transform = Callable[[Any], Iterable[Any]]
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+def put_until_stopped(out: queue.Queue, item: Any, stopped: threading.Event) -> float:
+    """
+    Put item in a bounded queue, blocking while it's full unless stopped is set
+
+    :return: seconds spent waiting
+    """
+    start = time.perf_counter()
+    while not stopped.is_set():
+        try:
+            out.put(item, timeout=_POLL_INTERVAL)
+            return time.perf_counter() - start
+        except queue.Full:
+            continue
+    raise PipelineStopped()
+
+
+def get_until_stopped(in_: queue.Queue, stopped: threading.Event) -> Tuple[Any, float]:
+    """
+    Get an item from a queue, blocking while it's empty unless stopped is set
+
+    :return: the item and seconds spent waiting
+    """
+    start = time.perf_counter()
+    while not stopped.is_set():
+        try:
+            return in_.get(timeout=_POLL_INTERVAL), time.perf_counter() - start
+        except queue.Empty:
+            continue
+    raise PipelineStopped()
+
+
+class StageCounter:
+    """Items handled by a stage, time spent on them and time spent on its neighbours."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        # seconds spent producing / handling items
+        self.busy = 0.0
+        # seconds spent waiting for the previous stage or on the next stage
+        self.waiting = 0.0
+
+    def throughput(self) -> float:
+        """Items per busy second, what the stage could sustain on its own."""
+        return self.items / self.busy if self.busy else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.items} items, {self.throughput():.0f}/s, "
+            f"busy {self.busy:.2f}s, waiting {self.waiting:.2f}s"
+        )
+
+
+class Pipeline:
+    """
+    Staged producer/consumer pipeline: iterating the items (e.g. decoding them), every
+    transform (e.g. building rows) and the sink (e.g. writing a COPY) each run on their
+    own thread, connected by bounded queues of batches so a slow stage back-pressures
+    the ones feeding it rather than buffering without limit.
+
+    The sink runs on the calling thread, which usually owns the DB connection.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        self.name = name
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.counters: List[StageCounter] = []
+        self._stopped = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def run(
+        self,
+        items: Iterable[Any],
+        transforms: Sequence[Tuple[str, Transform]],
+        sink: Tuple[str, Callable[[Any], None]],
+        source_name: str = "parse",
+    ) -> List[StageCounter]:
+        """
+        Feed items through every (name, transform) in turn, each transform yields any
+        number of outputs per input, and hand the outputs of the last one to the sink
+
+        :return: one counter per stage, from the source to the sink
+        """
+        self.counters = [StageCounter(source_name)]
+        self.counters += [StageCounter(name) for name, _ in transforms]
+        self.counters.append(StageCounter(sink[0]))
+        self._stopped.clear()
+        self._errors = []
+
+        queues: List[queue.Queue] = [
+            queue.Queue(self.queue_size) for _ in range(len(transforms) + 1)
+        ]
+        threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(self._read_source, (items,), queues[0], self.counters[0]),
+                name=f"{self.name}-{source_name}",
+                daemon=True,
+            )
+        ]
+        for i, (name, transform) in enumerate(transforms):
+            threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(
+                        self._transform,
+                        (transform, queues[i], self.counters[i + 1]),
+                        queues[i + 1],
+                        self.counters[i + 1],
+                    ),
+                    name=f"{self.name}-{name}",
+                    daemon=True,
+                )
+            )
+
+        for thread in threads:
+            thread.start()
+        try:
+            self._sink(sink[1], queues[-1], self.counters[-1])
+        except PipelineStopped as e:
+            self._stop_on(e)
+        finally:
+            # NB: stops the other stages if the sink failed
+            self._stopped.set()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        for counter in self.counters:
+            _logger.info(f"{self.name} {counter}")
+        return self.counters
+
+    def _put(self, out: queue.Queue, batch: Any, counter: StageCounter):
+        counter.waiting += put_until_stopped(out, batch, self._stopped)
+
+    def _get(self, in_: queue.Queue, counter: StageCounter) -> Any:
+        batch, waiting = get_until_stopped(in_, self._stopped)
+        counter.waiting += waiting
+        return batch
+
+    def _run_stage(
+        self,
+        produce: Callable[..., Iterator[Any]],
+        args: Tuple[Any, ...],
+        out: queue.Queue,
+        counter: StageCounter,
+    ):
+        try:
+            batch: List[Any] = []
+            start = time.perf_counter()
+            for output in produce(*args):
+                batch.append(output)
+                if len(batch) == self.batch_size:
+                    counter.busy += time.perf_counter() - start
+                    self._put(out, batch, counter)
+                    batch = []
+                    start = time.perf_counter()
+            counter.busy += time.perf_counter() - start
+
+            if batch:
+                self._put(out, batch, counter)
+            self._put(out, _DONE, counter)
+        except PipelineStopped as e:
+            self._stop_on(e)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stopped.set()
+
+    def _stop_on(self, e: PipelineStopped):
+        """
+        Stages raise PipelineStopped once this pipeline stopped, unless it comes from
+        another one (e.g. items routed by run_sharded) which failed: this pipeline
+        then fails as well rather than waiting on the stages still running.
+        """
+        if not self._stopped.is_set():
+            self._errors.append(e)
+            self._stopped.set()
+
+    def _read_source(self, items: Iterable[Any]) -> Iterator[Any]:
+        counter = self.counters[0]
+        for item in items:
+            counter.items += 1
+            yield item
+
+    def _transform(
+        self, transform: Transform, in_: queue.Queue, counter: StageCounter
+    ) -> Iterator[Any]:
+        while True:
+            waiting = counter.waiting
+            batch = self._get(in_, counter)
+            # NB: runs within the stage's busy time, minus waiting for the batch
+            counter.busy -= counter.waiting - waiting
+            if batch is _DONE:
+                return
+            for item in batch:
+                counter.items += 1
+                yield from transform(item)
+
+    def _sink(
+        self, sink: Callable[[Any], None], in_: queue.Queue, counter: StageCounter
+    ):
+        while True:
+            batch = self._get(in_, counter)
+            if batch is _DONE:
+                return
+
+            start = time.perf_counter()
+            for item in batch:
+                sink(item)
+            counter.items += len(batch)
+            counter.busy += time.perf_counter() - start
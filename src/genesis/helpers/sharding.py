@@ -0,0 +1,106 @@
+import queue
+import threading
+import zlib
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Sequence
+
+from src.genesis.helpers.pipeline import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    PipelineStopped,
+    get_until_stopped,
+    put_until_stopped,
+)
+
+_DONE = object()
+
+
+def get_shard(key: str, shards: int) -> int:
+    """Shard of key, stable across processes and runs (unlike hash())."""
+    return zlib.crc32(key.encode()) % shards
+
+
+class Shard(NamedTuple):
+    """One of count disjoint shares of the genesis items, by hash of their address."""
+
+    # NB: not index and count, those are tuple methods
+    number: int
+    shards: int
+
+    def contains(self, key: str) -> bool:
+        return get_shard(key, self.shards) == self.number
+
+    def get_section_name(self, section: str) -> str:
+        return f"{section}[{self.number}/{self.shards}]"
+
+    def get_all_section_names(self, section: str) -> List[str]:
+        """Names of section in every shard, this one included."""
+        return [
+            Shard(number, self.shards).get_section_name(section)
+            for number in range(self.shards)
+        ]
+
+
+def run_sharded(
+    items: Iterable[Any],
+    get_key: Callable[[Any], str],
+    consumers: Sequence[Callable[[Iterable[Any]], None]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+):
+    """
+    Route every item to the consumer of its key's shard, each consumer runs on its own
+    thread and iterates its share of the items as they're routed (through a bounded
+    queue, a slow consumer holds the routing back). Returns once every consumer is
+    done, the first failure stops the others and is re-raised.
+    """
+    stopped = threading.Event()
+    errors: List[BaseException] = []
+    queues: List[queue.Queue] = [queue.Queue(queue_size) for _ in consumers]
+
+    def iter_shard(in_: queue.Queue) -> Iterator[Any]:
+        while True:
+            batch, _ = get_until_stopped(in_, stopped)
+            if batch is _DONE:
+                return
+            yield from batch
+
+    def consume(consumer: Callable[[Iterable[Any]], None], in_: queue.Queue):
+        try:
+            consumer(iter_shard(in_))
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stopped.set()
+
+    threads = [
+        threading.Thread(target=consume, args=(consumer, in_), daemon=True)
+        for consumer, in_ in zip(consumers, queues)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        batches: List[List[Any]] = [[] for _ in consumers]
+        for item in items:
+            shard = get_shard(get_key(item), len(consumers))
+            batches[shard].append(item)
+            if len(batches[shard]) == batch_size:
+                put_until_stopped(queues[shard], batches[shard], stopped)
+                batches[shard] = []
+
+        for batch, out in zip(batches, queues):
+            if batch:
+                put_until_stopped(out, batch, stopped)
+            put_until_stopped(out, _DONE, stopped)
+    except PipelineStopped:
+        pass
+    except BaseException:
+        stopped.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
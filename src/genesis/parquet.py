@@ -0,0 +1,146 @@
+import os
+import time
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.genesis.db.table_manager import DBTypes
+from src.genesis.processing.processor import CHAIN_ID_PATH, GenesisProcessor
+from src.genesis.processing.registry import select_processors
+from src.genesis.sources.genesis_source import GenesisSource
+from src.genesis.sources.genesis_spool import GenesisSpool
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+# tables of the distribution analyses, by processor
+PARQUET_PROCESSORS = ("accounts", "balances", "contracts")
+# rows held in memory, one record batch (and row group) at a time
+DEFAULT_BATCH_SIZE = 65_536
+# NB: balances exceed the 38 digits of decimal128
+NUMERIC_PRECISION = 76
+
+
+def get_arrow_type(db_type: DBTypes) -> Any:
+    import pyarrow as pa
+
+    return {
+        DBTypes.text: pa.string(),
+        DBTypes.numeric: pa.decimal256(NUMERIC_PRECISION, 0),
+        DBTypes.bigint: pa.int64(),
+        DBTypes.bytea: pa.binary(),
+        DBTypes.timestamptz: pa.timestamp("us", tz="UTC"),
+        DBTypes.interface: pa.string(),
+    }[db_type]
+
+
+def iter_batches(
+    rows: Iterable[Tuple[Any, ...]], batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[List[Tuple[Any, ...]]]:
+    batch: List[Tuple[Any, ...]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_rows(
+    spool: GenesisSpool, processor: GenesisProcessor, chain_id: str
+) -> Iterator[Tuple[Any, ...]]:
+    assert processor.get_rows is not None
+    for item in spool.iter_items(processor.path):
+        yield from processor.get_rows(item, chain_id)
+
+
+def export_parquet(
+    source: GenesisSource,
+    directory: str,
+    only: Optional[Collection[str]] = None,
+    skip: Collection[str] = (),
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    spill_dir: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Write the rows of source as one Parquet file per table in directory (e.g.
+    genesis_balances.parquet), without a database connection. Rows are built as
+    they're loaded (see GenesisProcessor.get_rows) and written batch_size at a time,
+    memory doesn't grow with the source.
+
+    NB: requires pyarrow; numeric columns are decimal256, the source's chain_id and
+    digest are in the files' metadata
+
+    :param only: processor or module names to export, by default PARQUET_PROCESSORS
+        (processors without rows, e.g. wasm codes, can't be exported)
+    :param skip: processor or module names not to export
+    :return: rows written, by table
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required to export Parquet files (pip install pyarrow)"
+        ) from None
+
+    processors = select_processors(False, only or PARQUET_PROCESSORS, skip)
+    for processor in processors:
+        if processor.get_rows is None:
+            raise ValueError(f"{processor.name} doesn't declare its rows")
+    os.makedirs(directory, exist_ok=True)
+
+    counts: Dict[str, int] = {}
+    with GenesisSpool(
+        source,
+        CHAIN_ID_PATH,
+        *(processor.path for processor in processors),
+        directory=spill_dir,
+        blob_paths=tuple(
+            blob_path for processor in processors for blob_path in processor.blob_paths
+        ),
+        skip_paths=tuple(
+            skip_path for processor in processors for skip_path in processor.skip_paths
+        ),
+    ) as spool:
+        spool.load()
+        chain_id = spool.read_value(CHAIN_ID_PATH)
+        metadata = {
+            "chain_id": chain_id,
+            "source": source.location,
+            "source_digest": spool.source_digest or "",
+        }
+
+        for processor in processors:
+            start = time.perf_counter()
+            assert processor.table is not None
+            schema = pa.schema(
+                [
+                    (name, get_arrow_type(db_type))
+                    for name, db_type in processor.columns
+                ],
+                metadata=metadata,
+            )
+            counts[processor.table] = 0
+            path = os.path.join(directory, f"{processor.table}.parquet")
+            with pq.ParquetWriter(path, schema) as writer:
+                for batch in iter_batches(
+                    iter_rows(spool, processor, chain_id), batch_size
+                ):
+                    columns = list(zip(*batch))
+                    writer.write_batch(
+                        pa.record_batch(
+                            [
+                                pa.array(column, type=field.type)
+                                for column, field in zip(columns, schema)
+                            ],
+                            schema=schema,
+                        )
+                    )
+                    counts[processor.table] += len(batch)
+
+            _logger.info(
+                f"{processor.table:<24} {counts[processor.table]:>10} rows "
+                f"{time.perf_counter() - start:8.2f}s"
+            )
+
+    return counts
@@ -1,8 +1,18 @@
-from typing import List
+from functools import partial
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 
 from psycopg import Connection
 
-from src.genesis.db.table_manager import DBTypes, TableManager
+from src.genesis.db.checkpoint import Checkpoint, iter_chunks
+from src.genesis.db.copy_encoder import ParallelCopyEncoder
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.helpers.pipeline import Pipeline
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    GenesisProcessor,
+    ProcessorRun,
+)
+from src.genesis.state import GenesisLike, GenesisState
 from src.genesis.utils.loggers import get_logger
 
 _logger = get_logger(__name__)
@@ -10,36 +20,92 @@ _logger = get_logger(__name__)
 ID = "id"
 CHAIN_ID = "chain_id"
 TABLE_ID = "accounts"
+GENESIS_PATH = "app_state.bank.balances[*]"
+COLUMNS = (
+    (ID, DBTypes.text),
+    (CHAIN_ID, DBTypes.text),
+)
 
 
 class AccountsManager:
-    def __init__(self, db_conn: Connection):
-        columns = (
-            (ID, DBTypes.text),
-            (CHAIN_ID, DBTypes.text),
-        )
+    def __init__(
+        self,
+        db_conn: Connection,
+        binary_copy: bool = False,
+        shadow_load: bool = False,
+        schema: str = DEFAULT_SCHEMA,
+    ):
         indexes = (
             ID,
             CHAIN_ID,
         )
 
-        self.table_manager = TableManager(db_conn, TABLE_ID, columns, indexes)
+        self.table_manager = TableManager(
+            db_conn,
+            TABLE_ID,
+            COLUMNS,
+            indexes,
+            schema=schema,
+            binary_copy=binary_copy,
+            primary_key=ID,
+            shadow_load=shadow_load,
+        )
         self.table_manager.ensure_table()
 
-    def process_genesis(self, genesis_data: dict, chain_id: str):
-        accounts_data = self._get_account_data(genesis_data)
-        db_accounts = set(self.table_manager.select_query([ID]))
+    def process_genesis(self, genesis_data: GenesisLike, chain_id: str):
+        self.process_accounts(self._get_account_data(genesis_data), chain_id)
 
-        with self.table_manager.db_copy() as copy:
-            for account in accounts_data:
-                account_address = self._get_account_address(account)
-                if account_address not in db_accounts:
-                    copy.write_row((account_address, chain_id))
+    def process_accounts(
+        self,
+        accounts_data: Iterable[Any],
+        chain_id: str,
+        checkpoint: Optional[Checkpoint] = None,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        """
+        :param encoder: accounts_data are JSON lines, decoded into rows by its processes
+        """
+        # NB: accounts which already exist are skipped server-side
+        for chunk in iter_chunks(accounts_data, checkpoint, [self.table_manager]):
+            with self.table_manager.db_copy_reconcile(
+                ID, commit=checkpoint is None
+            ) as copy:
+                get_rows = partial(self.get_rows, chain_id=chain_id)
+                if encoder is not None:
+                    for block in encoder.iter_blocks(get_rows, chunk):
+                        copy.write(block)
+                else:
+                    Pipeline(TABLE_ID).run(
+                        chunk, [("rows", get_rows)], ("copy", copy.write_row)
+                    )
+
+    @classmethod
+    def get_rows(cls, account: dict, chain_id: str) -> Iterator[Tuple[str, str]]:
+        yield cls._get_account_address(account), chain_id
 
     @classmethod
-    def _get_account_data(cls, genesis_data: dict) -> List[dict]:
-        return genesis_data["app_state"]["bank"]["balances"]
+    def _get_account_data(cls, genesis_data: GenesisLike) -> List[dict]:
+        return GenesisState.of(genesis_data).app_state.bank.balances
 
     @classmethod
     def _get_account_address(cls, account: dict) -> str:
         return str(account["address"])
+
+
+def process(db_conn: Connection, run: ProcessorRun):
+    AccountsManager(
+        db_conn, run.binary_copy, run.shadow_load, run.schema
+    ).process_accounts(run.items, run.chain_id, run.checkpoint, run.encoder)
+
+
+PROCESSOR = GenesisProcessor(
+    "accounts",
+    GENESIS_PATH,
+    process,
+    lambda db_conn, schema: [AccountsManager(db_conn, schema=schema).table_manager],
+    AccountsManager._get_account_address,
+    inputs=(CHAIN_ID_PATH,),
+    get_rows=AccountsManager.get_rows,
+    table=TABLE_ID,
+    columns=COLUMNS,
+)
@@ -1,8 +1,22 @@
-from typing import List
+import json
+from contextlib import ExitStack
+from functools import partial
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 
 from psycopg import Connection
 
-from src.genesis.db.table_manager import DBTypes, TableManager
+from src.genesis.db.checkpoint import Checkpoint, iter_chunks
+from src.genesis.db.connection import clone_connection
+from src.genesis.db.copy_encoder import ParallelCopyEncoder
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.helpers.pipeline import Pipeline
+from src.genesis.helpers.sharding import run_sharded
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    GenesisProcessor,
+    ProcessorRun,
+)
+from src.genesis.state import GenesisLike, GenesisState
 from src.genesis.utils.loggers import get_logger
 
 _logger = get_logger(__name__)
@@ -11,50 +25,189 @@ ID = "id"
 ACCOUNT_ID = "account_id"
 AMOUNT = "amount"
 DENOM = "denom"
+CHAIN_ID = "chain_id"
 
 TABLE_ID = "genesis_balances"
+GENESIS_PATH = "app_state.bank.balances[*]"
+COLUMNS = (
+    (ID, DBTypes.text),
+    (ACCOUNT_ID, DBTypes.text),
+    (AMOUNT, DBTypes.numeric),
+    (DENOM, DBTypes.text),
+    (CHAIN_ID, DBTypes.text),
+)
 
 
 class BalanceManager:
-    def __init__(self, db_conn: Connection):
-        columns = (
-            (ID, DBTypes.text),
-            (ACCOUNT_ID, DBTypes.text),
-            (AMOUNT, DBTypes.numeric),
-            (DENOM, DBTypes.text),
-        )
+    def __init__(
+        self,
+        db_conn: Connection,
+        binary_copy: bool = False,
+        shadow_load: bool = False,
+        partitioned: bool = False,
+        schema: str = DEFAULT_SCHEMA,
+    ):
+        """
+        :param partitioned: create the table partitioned by chain_id, see TableManager
+        """
         indexes = (
             ID,
             ACCOUNT_ID,
             DENOM,
+            CHAIN_ID,
         )
 
-        self.table_manager = TableManager(db_conn, TABLE_ID, columns, indexes)
+        self.table_manager = TableManager(
+            db_conn,
+            TABLE_ID,
+            COLUMNS,
+            indexes,
+            schema=schema,
+            binary_copy=binary_copy,
+            primary_key=ID,
+            shadow_load=shadow_load,
+            partition_by=CHAIN_ID,
+            partitioned=partitioned,
+        )
         self.table_manager.ensure_table()
 
-    def process_genesis(self, genesis_data: dict):
-        balances_data = self._get_balances_data(genesis_data)
-        db_accounts = set(self.table_manager.select_query([ID]))
-
-        with self.table_manager.db_copy() as copy:
-            for balance in balances_data:
-                for coin in balance["coins"]:
-                    db_id = self._get_db_id(balance["address"], coin["denom"])
-
-                    if db_id not in db_accounts:
-                        copy.write_row(
-                            (
-                                str(db_id),
-                                str(balance["address"]),
-                                str(coin["amount"]),
-                                str(coin["denom"]),
-                            )
+    def process_genesis(self, genesis_data: GenesisLike):
+        genesis_state = GenesisState.of(genesis_data)
+        self.process_balances(
+            self._get_balances_data(genesis_state), genesis_state.chain_id
+        )
+
+    def process_balances(
+        self,
+        balances_data: Iterable[Any],
+        chain_id: str,
+        checkpoint: Optional[Checkpoint] = None,
+        encoder: Optional[ParallelCopyEncoder] = None,
+        shards: int = 1,
+    ):
+        """
+        :param encoder: balances_data are JSON lines, decoded into rows by its processes
+        :param shards: parallel COPY streams, see process_sharded
+        """
+        self.table_manager.ensure_partition(chain_id)
+        if shards > 1:
+            self.process_sharded(balances_data, chain_id, shards, checkpoint, encoder)
+            return
+
+        for chunk in iter_chunks(balances_data, checkpoint, [self.table_manager]):
+            self.copy_balances(chunk, chain_id, checkpoint is None, encoder)
+
+    def process_sharded(
+        self,
+        balances_data: Iterable[Any],
+        chain_id: str,
+        shards: int,
+        checkpoint: Optional[Checkpoint] = None,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        """
+        Split the balances by a hash of their account_id over shards COPY streams, each
+        on its own connection, which commit their share of every chunk independently.
+        Once all of them committed, the chunk is checkpointed and, after the last one,
+        the table analyzed.
+
+        NB: shards reconcile with the rows already committed (by any shard), a chunk
+        started again after a failure only inserts what's missing; there's no shadow
+        load, the table is shared by the shards
+        """
+        db_conn = self.table_manager.db_conn
+
+        def get_key(balance: Any) -> str:
+            if encoder is not None:
+                balance = json.loads(balance)
+            return self._get_balance_address(balance)
+
+        with ExitStack() as stack:
+            shard_managers = [
+                BalanceManager(
+                    stack.enter_context(clone_connection(db_conn)),
+                    self.table_manager.binary_copy,
+                    schema=self.table_manager.schema,
+                )
+                for _ in range(shards)
+            ]
+            for chunk in iter_chunks(balances_data, checkpoint, [self.table_manager]):
+                run_sharded(
+                    chunk,
+                    get_key,
+                    [
+                        partial(
+                            manager.copy_balances, chain_id=chain_id, encoder=encoder
                         )
+                        for manager in shard_managers
+                    ],
+                )
+
+        self.table_manager.analyze()
+        db_conn.commit()
+
+    def copy_balances(
+        self,
+        balances_data: Iterable[Any],
+        chain_id: str,
+        commit: bool = True,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        # NB: balances which already exist are skipped server-side
+        with self.table_manager.db_copy_reconcile(ID, commit=commit) as copy:
+            get_rows = partial(self.get_rows, chain_id=chain_id)
+            if encoder is not None:
+                for block in encoder.iter_blocks(get_rows, balances_data):
+                    copy.write(block)
+            else:
+                Pipeline(TABLE_ID).run(
+                    balances_data, [("rows", get_rows)], ("copy", copy.write_row)
+                )
+
+    @classmethod
+    def get_rows(
+        cls, balance: dict, chain_id: str
+    ) -> Iterator[Tuple[str, str, int, str, str]]:
+        for coin in balance["coins"]:
+            db_id = cls._get_db_id(balance["address"], coin["denom"])
+            yield (
+                str(db_id),
+                str(balance["address"]),
+                int(coin["amount"]),
+                str(coin["denom"]),
+                chain_id,
+            )
+
+    @classmethod
+    def _get_balance_address(cls, balance: dict) -> str:
+        return str(balance["address"])
 
     @classmethod
-    def _get_balances_data(cls, genesis_data: dict) -> List[dict]:
-        return genesis_data["app_state"]["bank"]["balances"]
+    def _get_balances_data(cls, genesis_data: GenesisLike) -> List[dict]:
+        return GenesisState.of(genesis_data).app_state.bank.balances
 
     @classmethod
     def _get_db_id(cls, address: str, denom: str):
         return f"{address}-{denom}"
+
+
+def process(db_conn: Connection, run: ProcessorRun):
+    BalanceManager(
+        db_conn, run.binary_copy, run.shadow_load, run.partitioned, run.schema
+    ).process_balances(
+        run.items, run.chain_id, run.checkpoint, run.encoder, run.copy_shards
+    )
+
+
+PROCESSOR = GenesisProcessor(
+    "balances",
+    GENESIS_PATH,
+    process,
+    lambda db_conn, schema: [BalanceManager(db_conn, schema=schema).table_manager],
+    BalanceManager._get_balance_address,
+    inputs=(CHAIN_ID_PATH,),
+    depends_on=("accounts",),
+    get_rows=BalanceManager.get_rows,
+    table=TABLE_ID,
+    columns=COLUMNS,
+)
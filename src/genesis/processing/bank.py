@@ -0,0 +1,162 @@
+from functools import partial
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+from psycopg import Connection
+
+from src.genesis.db.checkpoint import Checkpoint, iter_chunks
+from src.genesis.db.copy_encoder import ParallelCopyEncoder
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, TableManager
+from src.genesis.helpers.pipeline import Pipeline
+from src.genesis.processing import accounts, balances
+from src.genesis.processing.accounts import AccountsManager
+from src.genesis.processing.balances import BalanceManager
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    GenesisProcessor,
+    ProcessorRun,
+)
+from src.genesis.state import GenesisLike
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+STAGING_TABLE_ID = "genesis_bank_staging"
+GENESIS_PATH = balances.GENESIS_PATH
+
+
+class FusedBankManager:
+    """
+    Populates both accounts and genesis_balances from a single traversal of
+    app_state.bank.balances, committed together.
+
+    Postgres only allows one COPY per connection and genesis_balances.account_id
+    references accounts, so the rows of both tables are copied as one stream
+    into a temporary staging table and split server-side in the same transaction.
+    """
+
+    def __init__(
+        self,
+        db_conn: Connection,
+        binary_copy: bool = False,
+        partitioned: bool = False,
+        schema: str = DEFAULT_SCHEMA,
+    ):
+        """
+        :param partitioned: create genesis_balances partitioned by chain_id
+        """
+        self.db_conn = db_conn
+        self.accounts_manager = AccountsManager(db_conn, binary_copy, schema=schema)
+        self.balances_manager = BalanceManager(
+            db_conn, binary_copy, partitioned=partitioned, schema=schema
+        )
+
+        # NB: same columns as genesis_balances, rows without an id only carry an account
+        self.staging_manager = TableManager(
+            db_conn,
+            STAGING_TABLE_ID,
+            self.balances_manager.table_manager.columns,
+            binary_copy=binary_copy,
+        )
+
+    def process_genesis(self, genesis_data: GenesisLike, chain_id: str):
+        self.process_balances(
+            self.balances_manager._get_balances_data(genesis_data), chain_id
+        )
+
+    def process_balances(
+        self,
+        balances_data: Iterable[Any],
+        chain_id: str,
+        checkpoint: Optional[Checkpoint] = None,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        """
+        :param encoder: balances_data are JSON lines, decoded into rows by its processes
+        """
+        self.balances_manager.table_manager.ensure_partition(chain_id)
+        for chunk in iter_chunks(
+            balances_data,
+            checkpoint,
+            [
+                self.accounts_manager.table_manager,
+                self.balances_manager.table_manager,
+            ],
+        ):
+            self.stage_balances(chunk, chain_id, encoder)
+            self.merge(chain_id, commit=checkpoint is None)
+
+    def stage_balances(
+        self,
+        balances_data: Iterable[Any],
+        chain_id: str,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        self.staging_manager.create_temp_table()
+
+        get_rows = partial(self.get_staging_rows, chain_id=chain_id)
+        with self.staging_manager.db_copy(commit=False) as copy:
+            if encoder is not None:
+                for block in encoder.iter_blocks(get_rows, balances_data):
+                    copy.write(block)
+            else:
+                Pipeline(STAGING_TABLE_ID).run(
+                    balances_data,
+                    [("rows", get_rows)],
+                    ("copy", copy.write_row),
+                )
+
+        self.staging_manager.analyze()
+
+    @classmethod
+    def get_staging_rows(
+        cls, balance: dict, chain_id: str
+    ) -> Iterator[Tuple[Optional[str], str, Optional[int], Optional[str], str]]:
+        coin_rows = 0
+        for row in BalanceManager.get_rows(balance, chain_id):
+            yield row
+            coin_rows += 1
+
+        if not coin_rows:
+            yield None, AccountsManager._get_account_address(
+                balance
+            ), None, None, chain_id
+
+    def merge(self, chain_id: str, commit: bool = True):
+        inserted_accounts = self.accounts_manager.table_manager.insert_missing(
+            f"""(
+                SELECT DISTINCT {balances.ACCOUNT_ID} AS {accounts.ID}, %s::text AS {accounts.CHAIN_ID}
+                FROM {STAGING_TABLE_ID}
+            )""",
+            accounts.ID,
+            (chain_id,),
+        )
+        _logger.info(f"inserted {inserted_accounts} accounts")
+
+        inserted_balances = self.balances_manager.table_manager.insert_missing(
+            f"(SELECT * FROM {STAGING_TABLE_ID} WHERE {balances.ID} IS NOT NULL)",
+            balances.ID,
+        )
+        _logger.info(f"inserted {inserted_balances} genesis balances")
+
+        # single commit for both tables, also drops the staging table
+        if commit:
+            self.db_conn.commit()
+
+
+def process(db_conn: Connection, run: ProcessorRun):
+    FusedBankManager(
+        db_conn, run.binary_copy, run.partitioned, run.schema
+    ).process_balances(run.items, run.chain_id, run.checkpoint, run.encoder)
+
+
+PROCESSOR = GenesisProcessor(
+    "bank",
+    GENESIS_PATH,
+    process,
+    lambda db_conn, schema: [
+        AccountsManager(db_conn, schema=schema).table_manager,
+        BalanceManager(db_conn, schema=schema).table_manager,
+    ],
+    BalanceManager._get_balance_address,
+    inputs=(CHAIN_ID_PATH,),
+)
@@ -1,8 +1,18 @@
-from typing import List
+from functools import partial
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 
 from psycopg import Connection
 
-from src.genesis.db.table_manager import DBTypes, TableManager
+from src.genesis.db.checkpoint import Checkpoint, iter_chunks
+from src.genesis.db.copy_encoder import ParallelCopyEncoder
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.helpers.pipeline import Pipeline
+from src.genesis.processing.processor import (
+    CHAIN_ID_PATH,
+    GenesisProcessor,
+    ProcessorRun,
+)
+from src.genesis.state import GenesisLike, GenesisState
 from src.genesis.utils.loggers import get_logger
 
 _logger = get_logger(__name__)
@@ -11,58 +21,110 @@ ID = "id"
 INTERFACE = "interface"
 STORE_MESSAGE_ID = "store_message_id"
 INSTANTIATE_MESSAGE_ID = "instantiate_message_id"
+CHAIN_ID = "chain_id"
 TABLE_ID = "contracts"
+GENESIS_PATH = "app_state.wasm.contracts[*]"
+# NB: possibly millions of entries, spooled as items of their own (see
+# wasm.STATES_PROCESSOR) rather than within the contracts
+STATE_PATH = f"{GENESIS_PATH}.contract_state"
+COLUMNS = (
+    (ID, DBTypes.text),
+    (INTERFACE, DBTypes.interface),
+    (STORE_MESSAGE_ID, DBTypes.text),
+    (INSTANTIATE_MESSAGE_ID, DBTypes.text),
+    (CHAIN_ID, DBTypes.text),
+)
 
 
 class ContractsManager:
-    def __init__(self, db_conn: Connection):
-        columns = (
-            (ID, DBTypes.text),
-            (INTERFACE, DBTypes.interface),
-            (STORE_MESSAGE_ID, DBTypes.text),
-            (INSTANTIATE_MESSAGE_ID, DBTypes.text),
-        )
-        indexes = (ID,)
+    def __init__(
+        self,
+        db_conn: Connection,
+        binary_copy: bool = False,
+        shadow_load: bool = False,
+        partitioned: bool = False,
+        schema: str = DEFAULT_SCHEMA,
+    ):
+        """
+        :param partitioned: create the table partitioned by chain_id, see TableManager
+        """
+        indexes = (ID, CHAIN_ID)
 
-        self.table_manager = TableManager(db_conn, TABLE_ID, columns, indexes)
+        self.table_manager = TableManager(
+            db_conn,
+            TABLE_ID,
+            COLUMNS,
+            indexes,
+            schema=schema,
+            binary_copy=binary_copy,
+            primary_key=ID,
+            shadow_load=shadow_load,
+            partition_by=CHAIN_ID,
+            partitioned=partitioned,
+        )
         self.table_manager.ensure_table()
 
-    def process_genesis(self, genesis_data: dict):
-        contracts_data = self._get_contract_data(genesis_data)
-        db_contracts = self.table_manager.select_query([ID])
-
-        genesis_accounts_filtered = self._filter_genesis_contracts(
-            contracts_data, db_contracts
+    def process_genesis(self, genesis_data: GenesisLike):
+        genesis_state = GenesisState.of(genesis_data)
+        self.process_contracts(
+            self._get_contract_data(genesis_state), genesis_state.chain_id
         )
-        with self.table_manager.db_copy() as copy:
-            for contract in genesis_accounts_filtered:
-                copy.write_row(
-                    (self._get_contract_address(contract), "Uncertain", None, None)
-                )
 
-    def _get_contract_data(self, genesis_data: dict) -> List[dict]:
-        return genesis_data["app_state"]["wasm"]["contracts"]
+    def process_contracts(
+        self,
+        contracts_data: Iterable[Any],
+        chain_id: str,
+        checkpoint: Optional[Checkpoint] = None,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        """
+        :param encoder: contracts_data are JSON lines, decoded into rows by its processes
+        """
+        self.table_manager.ensure_partition(chain_id)
+        get_rows = partial(self.get_rows, chain_id=chain_id)
+
+        # NB: contracts which already exist are skipped server-side
+        for chunk in iter_chunks(contracts_data, checkpoint, [self.table_manager]):
+            with self.table_manager.db_copy_reconcile(
+                ID, commit=checkpoint is None
+            ) as copy:
+                if encoder is not None:
+                    for block in encoder.iter_blocks(get_rows, chunk):
+                        copy.write(block)
+                else:
+                    Pipeline(TABLE_ID).run(
+                        chunk, [("rows", get_rows)], ("copy", copy.write_row)
+                    )
 
-    def _get_contract_address(self, contract: dict) -> str:
+    @classmethod
+    def get_rows(
+        cls, contract: dict, chain_id: str
+    ) -> Iterator[Tuple[str, str, None, None, str]]:
+        yield cls._get_contract_address(contract), "Uncertain", None, None, chain_id
+
+    def _get_contract_data(self, genesis_data: GenesisLike) -> List[dict]:
+        return GenesisState.of(genesis_data).app_state.wasm.contracts
+
+    @classmethod
+    def _get_contract_address(cls, contract: dict) -> str:
         return str(contract["contract_address"])
 
-    def _filter_genesis_contracts(
-        self, contracts_data: List[dict], db_contracts: List[str]
-    ) -> List[dict]:
-        """
-        Filter out genesis_contracts IDs from contracts_data
 
-        :param contracts_data: Contract data to be filtered
-        :param db_contracts: IDs as a filter
-        :return: Copy of contracts_data with removed contracts from db_contracts filter
-        """
-        genesis_accounts = [self._get_contract_address(x) for x in contracts_data]
-
-        matches = [
-            match for match in set(db_contracts) & set(genesis_accounts)
-        ]  # list already indexed accounts
-        genesis_contracts_filtered = filter(
-            lambda account: self._get_contract_address(account) not in matches,
-            contracts_data,
-        )
-        return list(genesis_contracts_filtered)
+def process(db_conn: Connection, run: ProcessorRun):
+    ContractsManager(
+        db_conn, run.binary_copy, run.shadow_load, run.partitioned, run.schema
+    ).process_contracts(run.items, run.chain_id, run.checkpoint, run.encoder)
+
+
+PROCESSOR = GenesisProcessor(
+    "contracts",
+    GENESIS_PATH,
+    process,
+    lambda db_conn, schema: [ContractsManager(db_conn, schema=schema).table_manager],
+    ContractsManager._get_contract_address,
+    inputs=(CHAIN_ID_PATH,),
+    skip_paths=(STATE_PATH,),
+    get_rows=ContractsManager.get_rows,
+    table=TABLE_ID,
+    columns=COLUMNS,
+)
@@ -0,0 +1,72 @@
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from psycopg import Connection
+
+from src.genesis.db.checkpoint import Checkpoint
+from src.genesis.db.copy_encoder import ParallelCopyEncoder
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.sources.genesis_spool import GenesisSpool
+
+CHAIN_ID_PATH = "chain_id"
+# H + 1 of a state export at height H, see db.baselines
+INITIAL_HEIGHT_PATH = "initial_height"
+
+
+class ProcessorRun(NamedTuple):
+    """Inputs and options of one run of a processor."""
+
+    # values of the processor's path, or their JSON lines with an encoder
+    items: Iterator[Any]
+    chain_id: str
+    checkpoint: Optional[Checkpoint] = None
+    encoder: Optional[ParallelCopyEncoder] = None
+    binary_copy: bool = False
+    shadow_load: bool = False
+    copy_shards: int = 1
+    # blobs referenced by the items, see GenesisSpool.open_blobs
+    spool: Optional[GenesisSpool] = None
+    # tables which don't exist yet are created partitioned by chain_id
+    partitioned: bool = False
+    # e.g. a shadow schema, swapped in once loaded
+    schema: str = DEFAULT_SCHEMA
+
+
+class GenesisProcessor(NamedTuple):
+    """
+    Declaration of a genesis section: the JSON path of the items it consumes and the
+    tables it writes them to. Every registered path is read in the same single pass
+    over the source, whatever the number of processors.
+    """
+
+    name: str
+    # e.g. app_state.bank.balances[*]
+    path: str
+    process: Callable[[Connection, ProcessorRun], None]
+    # managers of the tables written (in a schema), their indexes are built once every
+    # section is done
+    get_tables: Callable[[Connection, str], List[TableManager]]
+    # key of an item, the shard it belongs to
+    get_key: Callable[[Any], str]
+    # other paths the rows depend on, e.g. chain_id
+    inputs: Tuple[str, ...] = ()
+    # processors which must be committed first, e.g. genesis_balances references accounts
+    depends_on: Tuple[str, ...] = ()
+    # base64 strings within the items which are spooled as blobs, never held whole
+    blob_paths: Tuple[str, ...] = ()
+    # parts of the items which are never spooled with them, e.g. the state of a contract
+    skip_paths: Tuple[str, ...] = ()
+    # rows of an item (given the chain_id) in the first table, keyed by their first
+    # column; processors declaring them can apply the difference of two sources
+    get_rows: Optional[Callable[[Any, str], Iterable[Tuple[Any, ...]]]] = None
+    # table and columns of those rows, e.g. to write them without a connection
+    table: Optional[str] = None
+    columns: Tuple[Tuple[str, DBTypes], ...] = ()
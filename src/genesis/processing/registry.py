@@ -0,0 +1,77 @@
+from typing import Collection, Dict, List, Optional
+
+from src.genesis.processing import accounts, balances, bank, contracts, wasm
+from src.genesis.processing.processor import GenesisProcessor
+
+PROCESSORS: Dict[str, GenesisProcessor] = {
+    processor.name: processor
+    for processor in (
+        accounts.PROCESSOR,
+        balances.PROCESSOR,
+        bank.PROCESSOR,
+        contracts.PROCESSOR,
+        wasm.CODES_PROCESSOR,
+        wasm.CONTRACTS_PROCESSOR,
+        wasm.STATES_PROCESSOR,
+    )
+}
+
+# bank populates accounts and genesis_balances from the same items
+DEFAULT_PROCESSORS = ("accounts", "balances", "contracts")
+FUSED_PROCESSORS = ("bank", "contracts")
+# only processed when selected (e.g. --only wasm), after the default ones
+OPT_IN_PROCESSORS = ("wasm_codes", "wasm_contracts", "contract_states")
+# also written by the indexer (e.g. the interface of a contract), and referenced by
+# the indexed history: a diff only inserts the rows they don't have yet, a shadow
+# load merges its rows into them (see db.schemas.swap_in_schema) rather than
+# replacing them
+SHARED_TABLES = (accounts.TABLE_ID, contracts.TABLE_ID)
+# tables of rows identified within their chain only (e.g. a balance by address and
+# denom), by processor: several chains only share them partitioned by chain_id
+CHAIN_TABLES = {
+    "balances": balances.TABLE_ID,
+    "bank": balances.TABLE_ID,
+    "contracts": contracts.TABLE_ID,
+}
+# their tables have no chain_id, they hold a single chain
+SINGLE_CHAIN_PROCESSORS = ("wasm_codes", "wasm_contracts", "contract_states")
+
+
+def matches(processor: GenesisProcessor, selector: str) -> bool:
+    """Whether selector names the processor, or the module it reads (e.g. bank, wasm)."""
+    return selector == processor.name or processor.path.startswith(
+        f"app_state.{selector}."
+    )
+
+
+def select_processors(
+    fused: bool = False,
+    only: Optional[Collection[str]] = None,
+    skip: Collection[str] = (),
+) -> List[GenesisProcessor]:
+    """
+    Processors of a run, in order
+
+    :param only: processor or module names, the others aren't processed; the only way
+        to select the processors of OPT_IN_PROCESSORS
+    :param skip: processor or module names which aren't processed
+    """
+    processors = [
+        PROCESSORS[name]
+        for name in (FUSED_PROCESSORS if fused else DEFAULT_PROCESSORS)
+        + OPT_IN_PROCESSORS
+    ]
+    for selector in [*(only or ()), *skip]:
+        if not any(matches(processor, selector) for processor in PROCESSORS.values()):
+            raise ValueError(f"no genesis processor matches {selector}")
+
+    def is_selected(processor: GenesisProcessor) -> bool:
+        if only is None:
+            return processor.name not in OPT_IN_PROCESSORS
+        return any(matches(processor, s) for s in only)
+
+    return [
+        processor
+        for processor in processors
+        if is_selected(processor) and not any(matches(processor, s) for s in skip)
+    ]
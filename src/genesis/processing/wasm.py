@@ -0,0 +1,310 @@
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from psycopg import Connection
+
+from src.genesis.db.checkpoint import Checkpoint, iter_chunks
+from src.genesis.db.copy_encoder import ParallelCopyEncoder, write_copy_row
+from src.genesis.db.table_manager import DEFAULT_SCHEMA, DBTypes, TableManager
+from src.genesis.helpers.pipeline import Pipeline
+from src.genesis.processing import contracts
+from src.genesis.processing.processor import GenesisProcessor, ProcessorRun
+from src.genesis.sources.genesis_spool import SpoolBlobs
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+ID = "id"
+SIZE = "size"
+CODE = "code"
+CODE_CHECKSUM = "code_checksum"
+CREATOR = "creator"
+CODE_ID = "code_id"
+ADMIN = "admin"
+LABEL = "label"
+CONTRACT_ID = "contract_id"
+KEY = "key"
+VALUE = "value"
+
+CODE_BLOBS_TABLE_ID = "genesis_wasm_code_blobs"
+CODES_TABLE_ID = "genesis_wasm_codes"
+CONTRACTS_TABLE_ID = "genesis_wasm_contracts"
+CONTRACT_STATES_TABLE_ID = "genesis_contract_states"
+
+CODES_PATH = "app_state.wasm.codes[*]"
+CODE_BYTES_PATH = f"{CODES_PATH}.code_bytes"
+CONTRACTS_PATH = contracts.GENESIS_PATH
+# NB: spooled as [contract, model] items, see GenesisSpool.iter_lines
+STATES_PATH = f"{contracts.STATE_PATH}[*]"
+# NB: base64 encoded, spooled as blobs rather than within the models
+STATE_VALUE_PATH = f"{STATES_PATH}.value"
+CONTRACTS_COLUMNS = (
+    (ID, DBTypes.text),
+    (CODE_ID, DBTypes.text),
+    (CREATOR, DBTypes.text),
+    (ADMIN, DBTypes.text),
+    (LABEL, DBTypes.text),
+)
+
+
+def iter_decoded(run: ProcessorRun) -> Iterator[Any]:
+    # NB: blobs are read by the section itself, not by the encoder's processes
+    if run.encoder is not None:
+        return (json.loads(line) for line in run.items)
+    return run.items
+
+
+class WasmCodesManager:
+    """
+    Populates genesis_wasm_codes and the content addressed genesis_wasm_code_blobs:
+    the code bytes are stored once per SHA-256, whatever the number of code ids
+    storing the same code.
+
+    NB: always text COPY, code bytes are streamed from the spool as hex bytea
+    """
+
+    def __init__(self, db_conn: Connection, schema: str = DEFAULT_SCHEMA):
+        self.blobs_manager = TableManager(
+            db_conn,
+            CODE_BLOBS_TABLE_ID,
+            ((ID, DBTypes.text), (SIZE, DBTypes.bigint), (CODE, DBTypes.bytea)),
+            (ID,),
+            schema=schema,
+            primary_key=ID,
+        )
+        self.codes_manager = TableManager(
+            db_conn,
+            CODES_TABLE_ID,
+            (
+                (ID, DBTypes.text),
+                (CODE_CHECKSUM, DBTypes.text),
+                (CREATOR, DBTypes.text),
+            ),
+            (ID, CODE_CHECKSUM),
+            schema=schema,
+            primary_key=ID,
+        )
+        self.blobs_manager.ensure_table()
+        self.codes_manager.ensure_table()
+
+    def process_codes(
+        self,
+        codes_data: Iterable[dict],
+        blobs: SpoolBlobs,
+        checkpoint: Optional[Checkpoint] = None,
+    ):
+        """
+        :param codes_data: codes whose code_bytes are references to blobs
+        """
+        for chunk in iter_chunks(
+            codes_data, checkpoint, [self.blobs_manager, self.codes_manager]
+        ):
+            # NB: only references to the code bytes, read once per COPY
+            codes = list(chunk)
+
+            # NB: code bytes which already exist are skipped server-side
+            with self.blobs_manager.db_copy_reconcile(ID, commit=False) as copy:
+                for row in self.get_blob_rows(codes, blobs):
+                    write_copy_row(copy.write, row)
+
+            with self.codes_manager.db_copy_reconcile(
+                ID, commit=checkpoint is None
+            ) as copy:
+                for code in codes:
+                    copy.write_row(self.get_row(code))
+
+    @classmethod
+    def get_blob_rows(
+        cls, codes: List[dict], blobs: SpoolBlobs
+    ) -> Iterator[Tuple[str, int, Iterator[bytes]]]:
+        checksums: Set[str] = set()
+        for code in codes:
+            blob = code["code_bytes"]
+            if blob["sha256"] in checksums:
+                continue
+            checksums.add(blob["sha256"])
+            yield blob["sha256"], blob["size"], blobs.iter_chunks(blob)
+
+    @classmethod
+    def get_row(cls, code: dict) -> Tuple[str, str, Optional[str]]:
+        code_info = code.get("code_info") or {}
+        return (
+            cls._get_code_id(code),
+            code["code_bytes"]["sha256"],
+            code_info.get("creator"),
+        )
+
+    @classmethod
+    def _get_code_id(cls, code: dict) -> str:
+        return str(code["code_id"])
+
+
+class WasmContractsManager:
+    """Populates genesis_wasm_contracts, which code each contract instantiates."""
+
+    def __init__(
+        self,
+        db_conn: Connection,
+        binary_copy: bool = False,
+        schema: str = DEFAULT_SCHEMA,
+    ):
+        self.table_manager = TableManager(
+            db_conn,
+            CONTRACTS_TABLE_ID,
+            CONTRACTS_COLUMNS,
+            (ID, CODE_ID),
+            schema=schema,
+            binary_copy=binary_copy,
+            primary_key=ID,
+        )
+        self.table_manager.ensure_table()
+
+    def process_contracts(
+        self,
+        contracts_data: Iterable[Any],
+        checkpoint: Optional[Checkpoint] = None,
+        encoder: Optional[ParallelCopyEncoder] = None,
+    ):
+        """
+        :param encoder: contracts_data are JSON lines, decoded into rows by its processes
+        """
+        for chunk in iter_chunks(contracts_data, checkpoint, [self.table_manager]):
+            with self.table_manager.db_copy_reconcile(
+                ID, commit=checkpoint is None
+            ) as copy:
+                if encoder is not None:
+                    for block in encoder.iter_blocks(self.get_rows, chunk):
+                        copy.write(block)
+                else:
+                    Pipeline(CONTRACTS_TABLE_ID).run(
+                        chunk, [("rows", self.get_rows)], ("copy", copy.write_row)
+                    )
+
+    @classmethod
+    def get_rows(
+        cls, contract: dict
+    ) -> Iterator[Tuple[str, str, Optional[str], Optional[str], Optional[str]]]:
+        contract_info: Dict[str, Any] = contract.get("contract_info") or {}
+        yield (
+            contracts.ContractsManager._get_contract_address(contract),
+            str(contract_info["code_id"]),
+            contract_info.get("creator"),
+            contract_info.get("admin") or None,
+            contract_info.get("label"),
+        )
+
+
+class ContractStatesManager:
+    """
+    Populates genesis_contract_states, the raw key/value store of every contract
+    (e.g. the balances of a CW20 token)
+
+    NB: always text COPY, values are streamed from the spool as hex bytea
+    """
+
+    def __init__(self, db_conn: Connection, schema: str = DEFAULT_SCHEMA):
+        self.table_manager = TableManager(
+            db_conn,
+            CONTRACT_STATES_TABLE_ID,
+            (
+                (ID, DBTypes.text),
+                (CONTRACT_ID, DBTypes.text),
+                (KEY, DBTypes.text),
+                (VALUE, DBTypes.bytea),
+            ),
+            (ID, CONTRACT_ID),
+            schema=schema,
+            primary_key=ID,
+        )
+        self.table_manager.ensure_table()
+
+    def process_states(
+        self,
+        states_data: Iterable[List[dict]],
+        blobs: SpoolBlobs,
+        checkpoint: Optional[Checkpoint] = None,
+    ):
+        """
+        :param states_data: [contract, model] of every model, whose value is a
+            reference to a blob
+        """
+        for chunk in iter_chunks(states_data, checkpoint, [self.table_manager]):
+            # NB: states which already exist are skipped server-side
+            with self.table_manager.db_copy_reconcile(
+                ID, commit=checkpoint is None
+            ) as copy:
+                for state in chunk:
+                    write_copy_row(copy.write, self.get_row(state, blobs))
+
+    @classmethod
+    def get_row(
+        cls, state: List[dict], blobs: SpoolBlobs
+    ) -> Tuple[str, str, str, Iterator[bytes]]:
+        _, model = state
+        address = cls._get_contract_address(state)
+        key = str(model["key"])
+        return f"{address}/{key}", address, key, blobs.iter_chunks(model["value"])
+
+    @classmethod
+    def _get_contract_address(cls, state: List[dict]) -> str:
+        return contracts.ContractsManager._get_contract_address(state[0])
+
+
+def process_codes(db_conn: Connection, run: ProcessorRun):
+    assert run.spool is not None
+    with run.spool.open_blobs(CODES_PATH) as blobs:
+        WasmCodesManager(db_conn, run.schema).process_codes(
+            iter_decoded(run), blobs, run.checkpoint
+        )
+
+
+def process_contracts(db_conn: Connection, run: ProcessorRun):
+    WasmContractsManager(db_conn, run.binary_copy, run.schema).process_contracts(
+        run.items, run.checkpoint, run.encoder
+    )
+
+
+def process_states(db_conn: Connection, run: ProcessorRun):
+    assert run.spool is not None
+    with run.spool.open_blobs(STATES_PATH) as blobs:
+        ContractStatesManager(db_conn, run.schema).process_states(
+            iter_decoded(run), blobs, run.checkpoint
+        )
+
+
+CODES_PROCESSOR = GenesisProcessor(
+    "wasm_codes",
+    CODES_PATH,
+    process_codes,
+    lambda db_conn, schema: [
+        WasmCodesManager(db_conn, schema).blobs_manager,
+        WasmCodesManager(db_conn, schema).codes_manager,
+    ],
+    WasmCodesManager._get_code_id,
+    blob_paths=(CODE_BYTES_PATH,),
+)
+
+CONTRACTS_PROCESSOR = GenesisProcessor(
+    "wasm_contracts",
+    CONTRACTS_PATH,
+    process_contracts,
+    lambda db_conn, schema: [
+        WasmContractsManager(db_conn, schema=schema).table_manager
+    ],
+    contracts.ContractsManager._get_contract_address,
+    skip_paths=(contracts.STATE_PATH,),
+    get_rows=lambda contract, _: WasmContractsManager.get_rows(contract),
+    table=CONTRACTS_TABLE_ID,
+    columns=CONTRACTS_COLUMNS,
+)
+
+STATES_PROCESSOR = GenesisProcessor(
+    "contract_states",
+    STATES_PATH,
+    process_states,
+    lambda db_conn, schema: [ContractStatesManager(db_conn, schema).table_manager],
+    ContractStatesManager._get_contract_address,
+    # NB: the models are spooled with the contract they belong to
+    inputs=(CONTRACTS_PATH,),
+    blob_paths=(STATE_VALUE_PATH,),
+)
@@ -0,0 +1,276 @@
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from email.message import Message
+from typing import IO, Iterator, NamedTuple, Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+DEFAULT_TIMEOUT = 60.0
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+GZIP = "gzip"
+ZSTD = "zstd"
+SUFFIX_ENCODINGS = {".gz": GZIP, ".zst": ZSTD}
+
+# NB: reading a response can fail in any of these ways when the connection drops
+_TRANSIENT_ERRORS = (URLError, http.client.HTTPException, socket.timeout, OSError)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ResourceInfo(NamedTuple):
+    # ETag or Last-Modified, whichever the server provides
+    validator: Optional[str]
+    content_encoding: Optional[str]
+
+
+def get_suffix_encoding(location: str) -> Optional[str]:
+    """Compression implied by the file name, e.g. genesis.json.gz"""
+    return SUFFIX_ENCODINGS.get(os.path.splitext(location.split("?")[0])[1])
+
+
+def get_validator(headers: Message) -> Optional[str]:
+    return headers.get("ETag") or headers.get("Last-Modified")
+
+
+def decompress(stream: IO[bytes], encoding: Optional[str]) -> IO[bytes]:
+    if encoding is None or encoding == "identity":
+        return stream
+    if encoding == GZIP:
+        return gzip.GzipFile(fileobj=stream)  # type: ignore
+    if encoding == ZSTD:
+        try:
+            import zstandard
+        except ImportError:
+            raise DownloadError(
+                "zstandard is required for zstd compressed sources (pip install zstandard)"
+            ) from None
+        return zstandard.ZstdDecompressor().stream_reader(stream)  # type: ignore
+    raise DownloadError(f"unsupported content encoding {encoding}")
+
+
+class ResumableHTTPReader:
+    """
+    Binary stream over a URL which reconnects with a Range request (If-Range the
+    resource's validator) from the current offset whenever the connection drops.
+    Without a validator, the one of the initial response is used.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        offset: int = 0,
+        validator: Optional[str] = None,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        self.url = url
+        self.offset = offset
+        self.validator = validator
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.content_encoding: Optional[str] = None
+        # NB: set when the server ignored the initial range, the content starts over
+        self.restarted = False
+        self._response: Optional[http.client.HTTPResponse] = None
+        self._connect(initial=True)
+
+    def _request(self) -> Request:
+        # NB: only gzip is negotiated, zstd sources are recognized by their name
+        headers = {"Accept-Encoding": GZIP}
+        if self.offset:
+            headers["Range"] = f"bytes={self.offset}-"
+            if self.validator is not None:
+                headers["If-Range"] = self.validator
+        return Request(self.url, headers=headers)
+
+    def _connect(self, initial: bool = False):
+        for attempt in range(self.retries + 1):
+            try:
+                response = urlopen(self._request(), timeout=self.timeout)
+                break
+            except HTTPError as e:
+                # NB: client errors (e.g. 404) won't go away by retrying
+                if e.code < 500 or attempt == self.retries:
+                    raise DownloadError(f"failed to fetch {self.url}: {e}") from e
+                self._wait(attempt, e)
+            except _TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"failed to connect to {self.url}: {e}") from e
+                self._wait(attempt, e)
+
+        if self.offset and response.status != http.client.PARTIAL_CONTENT:
+            if not initial:
+                response.close()
+                raise DownloadError(f"{self.url} changed while it was being downloaded")
+            # NB: the partial download is stale (or ranges aren't supported), start over
+            self.offset = 0
+            self.restarted = True
+
+        if self.validator is None:
+            self.validator = get_validator(response.headers)
+        self.content_encoding = response.headers.get("Content-Encoding")
+        self._response = response
+
+    def _wait(self, attempt: int, error: Exception):
+        delay = self.backoff * 2**attempt
+        _logger.warning(
+            f"{self.url} at byte {self.offset}: {error}, retrying in {delay}s"
+        )
+        time.sleep(delay)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            return b"".join(iter(lambda: self.read(DOWNLOAD_CHUNK_SIZE), b""))
+
+        for attempt in range(self.retries + 1):
+            try:
+                assert self._response is not None
+                data = self._response.read(size)
+                if not data and size and self._response.length:
+                    # NB: bounded reads return nothing rather than raise when cut short
+                    raise http.client.IncompleteRead(data, self._response.length)
+                self.offset += len(data)
+                return data
+            except _TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"failed to read {self.url}: {e}") from e
+                self._wait(attempt, e)
+                self.close()
+                self._connect()
+        raise AssertionError("unreachable")
+
+    def close(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def __enter__(self) -> "ResumableHTTPReader":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def head(url: str, timeout: float = DEFAULT_TIMEOUT) -> ResourceInfo:
+    request = Request(url, method="HEAD", headers={"Accept-Encoding": GZIP})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return ResourceInfo(
+                get_validator(response.headers),
+                response.headers.get("Content-Encoding"),
+            )
+    except HTTPError as e:
+        if e.code not in (
+            http.client.METHOD_NOT_ALLOWED,
+            http.client.NOT_IMPLEMENTED,
+        ):
+            raise DownloadError(f"failed to fetch {url}: {e}") from e
+        # NB: nothing is known about the resource until it's downloaded
+        return ResourceInfo(None, None)
+
+
+class DownloadCache:
+    """
+    On-disk cache of downloaded sources, keyed by URL and validator (ETag or
+    Last-Modified) so a changed resource is downloaded again. Partial downloads are
+    resumed, also by a later process (e.g. a restarted pod sharing the directory).
+
+    Files are kept as served (possibly gzip encoded) next to a metadata file.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+    ):
+        self.directory = directory
+        self.retries = retries
+        self.backoff = backoff
+        os.makedirs(directory, exist_ok=True)
+
+    def get_key(self, url: str, validator: Optional[str]) -> str:
+        return hashlib.sha256(f"{url}\n{validator}".encode()).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Path of the complete cached download of url's current version, if any."""
+        info = head(url)
+        if info.validator is None:
+            # NB: without a validator, a cached copy can't be told apart from a new version
+            return None
+
+        path = self.get_path(self.get_key(url, info.validator))
+        return path if os.path.exists(path) else None
+
+    def fetch(self, url: str) -> str:
+        """Download url unless it's cached, return the path of the cached file."""
+        info = head(url)
+        key = self.get_key(url, info.validator)
+        path = self.get_path(key)
+        if info.validator is not None and os.path.exists(path):
+            _logger.info(f"{url} ({info.validator}) is cached at {path}")
+            return path
+
+        partial_path = f"{path}.part"
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        if info.validator is None:
+            offset = 0
+
+        with ResumableHTTPReader(
+            url, offset, info.validator, self.retries, self.backoff
+        ) as reader:
+            if offset and not reader.restarted:
+                _logger.info(f"resuming download of {url} at byte {offset}")
+
+            with open(partial_path, "r+b" if reader.offset else "wb") as file:
+                file.seek(reader.offset)
+                file.truncate()
+                while True:
+                    data = reader.read(DOWNLOAD_CHUNK_SIZE)
+                    if not data:
+                        break
+                    file.write(data)
+
+            with open(f"{path}.json", "w") as metadata:
+                json.dump(
+                    {
+                        "url": url,
+                        "validator": info.validator,
+                        "content_encoding": reader.content_encoding,
+                    },
+                    metadata,
+                )
+
+        os.replace(partial_path, path)
+        return path
+
+    def get_content_encoding(self, path: str) -> Optional[str]:
+        with open(f"{path}.json") as metadata:
+            return json.load(metadata)["content_encoding"]
+
+
+@contextmanager
+def open_url(url: str) -> Iterator[IO[bytes]]:
+    """Stream url (content decoded), resuming after dropped connections."""
+    with ResumableHTTPReader(url) as reader:
+        yield decompress(reader, reader.content_encoding)  # type: ignore
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from typing import IO, Any, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from src.genesis.helpers.digest import stream_digest
+from src.genesis.helpers.json_stream import iter_items, iter_values
+from src.genesis.sources.download import (
+    DownloadCache,
+    decompress,
+    get_suffix_encoding,
+    open_url,
+)
+
+URL_SCHEMES = frozenset({"http", "https", "file"})
+
+
+class GenesisSource:
+    """
+    Genesis document location (local path or URL) which can be streamed any number of times.
+    Nothing is kept in memory between passes. Sources named *.gz or *.zst are decompressed.
+    """
+
+    def __init__(self, location: str, cache: Optional[DownloadCache] = None):
+        """
+        :param location: local path, file:// or http(s):// URL
+        :param cache: download cache for http(s) URLs, they're streamed without one
+        """
+        self.location = location
+        self.cache = cache
+
+    def is_url(self) -> bool:
+        return urlparse(self.location).scheme in URL_SCHEMES
+
+    def get_local_path(self) -> Optional[str]:
+        url = urlparse(self.location)
+        if url.scheme == "file":
+            return url2pathname(url.path)
+        if not self.is_url():
+            return self.location
+        return None
+
+    def is_local(self) -> bool:
+        """Whether reading the source is cheap: a local file or a cached download."""
+        if self.get_local_path() is not None:
+            return True
+        return self.cache is not None and self.cache.lookup(self.location) is not None
+
+    def digest(self) -> str:
+        """SHA-256 of the whole source, only worth it where reading it is cheap."""
+        with self.open() as stream:
+            return stream_digest(stream)
+
+    @contextmanager
+    def open(self) -> Iterator[IO[bytes]]:
+        encoding = get_suffix_encoding(self.location)
+
+        local_path = self.get_local_path()
+        if local_path is not None:
+            with open(local_path, "rb") as file:
+                yield decompress(file, encoding)
+        elif self.cache is not None:
+            path = self.cache.fetch(self.location)
+            with open(path, "rb") as file:
+                content = decompress(file, self.cache.get_content_encoding(path))
+                yield decompress(content, encoding)
+        else:
+            with open_url(self.location) as stream:
+                yield decompress(stream, encoding)
+
+    def iter_values(self, *paths: str) -> Iterator[Tuple[str, Any]]:
+        with self.open() as stream:
+            yield from iter_values(stream, *paths)
+
+    def iter_items(self, path: str) -> Iterator[Any]:
+        with self.open() as stream:
+            yield from iter_items(stream, path)
+
+    def read_value(self, path: str) -> Any:
+        for value in self.iter_items(path):
+            return value
+        raise KeyError(f"{path} not found in {self.location}")
@@ -0,0 +1,309 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+
+from src.genesis.helpers.digest import DigestReader, combine_digests
+from src.genesis.helpers.json_stream import iter_values
+from src.genesis.sources.genesis_source import GenesisSource
+from src.genesis.utils.loggers import get_logger
+
+_logger = get_logger(__name__)
+
+# counts and digests of a cached spool, written last
+MANIFEST = "manifest.json"
+BLOB_CHUNK_SIZE = 1 << 20
+
+
+def write_blob(file: IO[bytes], chunks: Iterator[str]) -> Dict[str, Any]:
+    """
+    Decode base64 text chunks into file as they come
+
+    :return: reference to the blob in file, with the SHA-256 of its content
+    """
+    offset = file.tell()
+    hash_ = hashlib.sha256()
+    size = 0
+    rest = ""
+    for chunk in chunks:
+        text = rest + chunk
+        # NB: only whole 4 character groups decode on their own
+        end = len(text) - len(text) % 4
+        data = base64.b64decode(text[:end], validate=True)
+        rest = text[end:]
+        file.write(data)
+        hash_.update(data)
+        size += len(data)
+    if rest:
+        raise ValueError(f"truncated base64 blob at offset {offset}")
+    return {"offset": offset, "size": size, "sha256": hash_.hexdigest()}
+
+
+class SpoolBlobs:
+    """Blobs spooled with the values of a path, read back in chunks."""
+
+    def __init__(self, path: str):
+        self._fd = os.open(path, os.O_RDONLY)
+
+    def __enter__(self) -> "SpoolBlobs":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        os.close(self._fd)
+
+    def iter_chunks(
+        self, blob: Dict[str, Any], chunk_size: int = BLOB_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        # NB: positioned reads, blobs may be read in any order
+        offset, end = blob["offset"], blob["offset"] + blob["size"]
+        while offset < end:
+            data = os.pread(self._fd, min(chunk_size, end - offset), offset)
+            if not data:
+                raise EOFError(f"blob at offset {blob['offset']} is truncated")
+            offset += len(data)
+            yield data
+
+    def read(self, blob: Dict[str, Any]) -> bytes:
+        return b"".join(self.iter_chunks(blob))
+
+
+class GenesisSpool:
+    """
+    Values of several paths, read from a GenesisSource in a single pass and spooled to
+    local JSON lines files which can then be streamed any number of times, concurrently
+    and in any order (e.g. chain_id follows app_state in the document).
+
+    Strings of blob paths (base64 encoded, e.g. wasm code) within the values are never
+    held whole: they're decoded into a blob file as they're read and replaced by a
+    reference to it ({"offset", "size", "sha256"}), see open_blobs.
+
+    Values of a path within those of another (e.g. the state entries of every
+    contract) are spooled on their own, never within them, see iter_lines.
+
+    With a cache directory, spooled files are kept there by digest of the source, a
+    later spool of the same (local or cached) source skips parsing it altogether.
+    """
+
+    def __init__(
+        self,
+        source: GenesisSource,
+        *paths: str,
+        directory: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        blob_paths: Tuple[str, ...] = (),
+        skip_paths: Tuple[str, ...] = (),
+    ):
+        """
+        :param blob_paths: paths of base64 strings within the values of paths, e.g.
+            app_state.wasm.codes[*].code_bytes
+        :param skip_paths: paths within the values of paths which aren't spooled, e.g.
+            app_state.wasm.contracts[*].contract_state
+        """
+        self.source = source
+        self.paths = tuple(dict.fromkeys(paths))
+        self.blob_paths = tuple(dict.fromkeys(blob_paths))
+        self.skip_paths = tuple(dict.fromkeys(skip_paths))
+        self.cache_dir = cache_dir
+        # NB: blobs are spooled next to the values of the path they're within
+        self._blob_owners = {
+            blob_path: self._get_blob_owner(blob_path) for blob_path in self.blob_paths
+        }
+        # NB: see iter_lines
+        self._parents: Dict[str, str] = {}
+        for path in self.paths:
+            parent = self._get_parent(path)
+            if parent is not None:
+                self._parents[path] = parent
+        self._tmp_dir = tempfile.TemporaryDirectory(dir=directory)
+        self._files = self._get_files(self._tmp_dir.name)
+        self._counts: Dict[str, int] = {}
+        self._digests: Dict[str, str] = {}
+        self.source_digest: Optional[str] = None
+
+    def __enter__(self) -> "GenesisSpool":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._tmp_dir.cleanup()
+
+    @property
+    def loaded(self) -> bool:
+        return len(self._counts) == len(self.paths)
+
+    def _get_blob_owner(self, blob_path: str) -> str:
+        owner = self._get_parent(blob_path)
+        if owner is None:
+            raise ValueError(f"{blob_path} isn't within any spooled path")
+        return owner
+
+    def _get_parent(self, path: str) -> Optional[str]:
+        """Innermost spooled path path is within, if any."""
+        parents = [parent for parent in self.paths if path.startswith(f"{parent}.")]
+        return max(parents, key=len, default=None)
+
+    def get_blob_file(self, path: str, files: Optional[Dict[str, str]] = None) -> str:
+        return f"{os.path.splitext((files or self._files)[path])[0]}.blobs"
+
+    def _get_files(self, directory: str) -> Dict[str, str]:
+        return {
+            path: os.path.join(directory, f"{i}.jsonl")
+            for i, path in enumerate(self.paths)
+        }
+
+    def get_cache_path(self, source_digest: str) -> str:
+        assert self.cache_dir is not None
+        key = combine_digests(
+            [source_digest, *self.paths, *self.blob_paths, *self.skip_paths]
+        )
+        return os.path.join(self.cache_dir, key)
+
+    def load(self):
+        """Read every path from the source in one pass, may be called once."""
+        assert not self.loaded, "spool already loaded"
+        if self.cache_dir is None:
+            self._spool(self._files)
+            return
+
+        # NB: hashing a local file takes seconds, parsing it takes minutes
+        if self.source.is_local() and self._load_cached(self.source.digest()):
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir, suffix=".part")
+        try:
+            self._spool(self._get_files(staging_dir))
+            self._store_cached(staging_dir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _load_cached(self, source_digest: str) -> bool:
+        cache_path = self.get_cache_path(source_digest)
+        try:
+            with open(os.path.join(cache_path, MANIFEST)) as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return False
+
+        self._files = self._get_files(cache_path)
+        self._counts = manifest["counts"]
+        self._digests = manifest["digests"]
+        self.source_digest = source_digest
+        _logger.info(
+            f"{self.source.location} ({source_digest}) spooled at {cache_path}"
+        )
+        return True
+
+    def _store_cached(self, staging_dir: str):
+        assert self.source_digest is not None
+        with open(os.path.join(staging_dir, MANIFEST), "w") as file:
+            json.dump({"counts": self._counts, "digests": self._digests}, file)
+
+        cache_path = self.get_cache_path(self.source_digest)
+        try:
+            # NB: atomic, a spool which isn't complete is never found
+            os.rename(staging_dir, cache_path)
+        except OSError:
+            # NB: spooled by another run in the meantime, both are the same
+            if not os.path.exists(os.path.join(cache_path, MANIFEST)):
+                raise
+        self._files = self._get_files(cache_path)
+
+    def _spool(self, spool_files: Dict[str, str]):
+        files = {path: open(file, "w") for path, file in spool_files.items()}
+        blob_files = {
+            path: open(self.get_blob_file(path, spool_files), "wb")
+            for path in set(self._blob_owners.values())
+        }
+        counts = dict.fromkeys(self.paths, 0)
+        hashes = {path: hashlib.sha256() for path in self.paths}
+
+        def read_blob(blob_path: str, chunks: Iterator[str]) -> Dict[str, Any]:
+            return write_blob(blob_files[self._blob_owners[blob_path]], chunks)
+
+        try:
+            with self.source.open() as stream:
+                reader = DigestReader(stream)
+                for path, value in iter_values(
+                    reader,  # type: ignore
+                    *self.paths,
+                    blob_paths=self.blob_paths,
+                    read_blob=read_blob,
+                    skip_paths=self.skip_paths,
+                ):
+                    parent = self._parents.get(path)
+                    if parent is None:
+                        line = json.dumps(value) + "\n"
+                    else:
+                        # NB: parsed before the value they're within, the next one
+                        # of parent
+                        line = json.dumps([counts[parent], value]) + "\n"
+                    files[path].write(line)
+                    hashes[path].update(line.encode())
+                    counts[path] += 1
+                # NB: the source digest covers the whole document
+                reader.drain()
+        finally:
+            for file in [*files.values(), *blob_files.values()]:
+                file.close()
+
+        for path, count in counts.items():
+            _logger.info(f"spooled {count} values of {path}")
+        self.source_digest = reader.hexdigest()
+        self._digests = {path: hash_.hexdigest() for path, hash_ in hashes.items()}
+        self._counts = counts
+        self._files = spool_files
+
+    def count(self, path: str) -> int:
+        assert self.loaded, "spool not loaded"
+        return self._counts[path]
+
+    def digest(self, *paths: str) -> str:
+        """SHA-256 of the values of paths, independent of the rest of the source."""
+        assert self.loaded, "spool not loaded"
+        return combine_digests(f"{path}={self._digests[path]}" for path in paths)
+
+    def iter_items(self, path: str) -> Iterator[Any]:
+        for line in self.iter_lines(path):
+            yield json.loads(line)
+
+    def iter_lines(self, path: str) -> Iterator[str]:
+        """
+        Values of path as they're spooled, one JSON document per line; values within
+        those of another path as [parent value, value]
+        """
+        assert self.loaded, "spool not loaded"
+        parent = self._parents.get(path)
+        if parent is None:
+            with open(self._files[path]) as file:
+                yield from file
+            return
+
+        with open(self._files[parent]) as parent_file, open(self._files[path]) as file:
+            index, parent_line = -1, ""
+            for line in file:
+                # NB: spooled as "[index, value]", neither value is decoded
+                separator = line.index(", ")
+                parent_index = int(line[1:separator])
+                while index < parent_index:
+                    parent_line = next(parent_file)
+                    index += 1
+                yield f"[{parent_line.rstrip()}, {line[separator + 2 :]}"
+
+    def open_blobs(self, path: str) -> SpoolBlobs:
+        """Blobs within the values of path, referenced by their spooled values."""
+        assert self.loaded, "spool not loaded"
+        return SpoolBlobs(self.get_blob_file(path))
+
+    def read_value(self, path: str) -> Any:
+        for value in self.iter_items(path):
+            return value
+        raise KeyError(f"{path} not found in {self.source.location}")
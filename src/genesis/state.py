@@ -0,0 +1,160 @@
+import io
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from src.genesis.helpers.json_stream import iter_values
+
+# a decoded genesis document, or its (UTF-8 JSON) content
+GenesisData = Union[dict, bytes]
+
+T = TypeVar("T")
+
+
+class Section(Generic[T]):
+    """
+    Attribute of a state object, decoded from the document when first accessed and
+    kept in the owner's slot of the same name with a leading underscore
+    """
+
+    def __init__(
+        self,
+        default_factory: Optional[Callable[[], T]] = None,
+        state_type: Optional[Type[T]] = None,
+    ):
+        """
+        :param default_factory: value of a key missing from the document, else None
+        :param state_type: state of a nested object, itself decoded attribute by attribute
+        """
+        self.default_factory = default_factory
+        self.state_type = state_type
+        self.name = ""
+
+    def __set_name__(self, owner: type, name: str):
+        self.name = name
+
+    def __get__(self, instance: Any, owner: type) -> T:
+        if instance is None:
+            return self  # type: ignore
+
+        slot = f"_{self.name}"
+        try:
+            return getattr(instance, slot)
+        except AttributeError:
+            pass
+
+        # NB: concurrent sections may both decode it, either value is kept
+        value = instance._decode(self.name, self.state_type, self.default_factory)
+        setattr(instance, slot, value)
+        return value
+
+
+class OwnAttrsMixin:
+    """
+    Typed view of an object of the genesis document: only the attributes declared as
+    Sections (attrs) are exposed, each decoded on first access. Over the document's
+    bytes, nested states don't decode anything until one of their own attributes is
+    accessed, reading app_state.bank.balances never builds wasm, staking or gov.
+    """
+
+    __slots__ = ("_source", "_key_path")
+    attrs: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.attrs = tuple(
+            name for name, value in vars(cls).items() if isinstance(value, Section)
+        )
+
+    def __init__(self, source: GenesisData, key_path: str = ""):
+        """
+        :param source: this object's decoded dict, or the content of the whole document
+        :param key_path: dot separated path of this object in the document
+        """
+        self._source = source
+        self._key_path = key_path
+
+    def get_key_path(self, attr: str) -> str:
+        return f"{self._key_path}.{attr}" if self._key_path else attr
+
+    def _decode(
+        self,
+        attr: str,
+        state_type: Optional[Type[Any]],
+        default_factory: Optional[Callable[[], Any]],
+    ) -> Any:
+        key_path = self.get_key_path(attr)
+        if state_type is not None:
+            if isinstance(self._source, dict):
+                return state_type(self._source.get(attr) or {}, key_path)
+            return state_type(self._source, key_path)
+
+        if isinstance(self._source, dict):
+            value = self._source.get(attr)
+        else:
+            # NB: everything but the value of key_path is skipped without being decoded
+            value = next(
+                (v for _, v in iter_values(io.BytesIO(self._source), key_path)), None
+            )
+        if value is None and default_factory is not None:
+            return default_factory()
+        return value
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        """(key path, value) of every leaf, nested states are iterated in turn."""
+        for attr in self.attrs:
+            value = getattr(self, attr)
+            if isinstance(value, OwnAttrsMixin):
+                yield from value
+            else:
+                yield self.get_key_path(attr), value
+
+
+class BankState(OwnAttrsMixin):
+    __slots__ = ("_balances", "_supply", "_denom_metadata", "_params")
+
+    balances: Section[List[dict]] = Section(list)
+    supply: Section[List[dict]] = Section(list)
+    denom_metadata: Section[List[dict]] = Section(list)
+    params: Section[Optional[dict]] = Section()
+
+
+class WasmState(OwnAttrsMixin):
+    __slots__ = ("_codes", "_contracts")
+
+    codes: Section[List[dict]] = Section(list)
+    contracts: Section[List[dict]] = Section(list)
+
+
+class AppState(OwnAttrsMixin):
+    __slots__ = ("_bank", "_wasm")
+
+    bank: Section[BankState] = Section(state_type=BankState)
+    wasm: Section[WasmState] = Section(state_type=WasmState)
+
+
+class GenesisState(OwnAttrsMixin):
+    __slots__ = ("_genesis_time", "_chain_id", "_initial_height", "_app_state")
+
+    genesis_time: Section[Optional[str]] = Section()
+    chain_id: Section[str] = Section()
+    initial_height: Section[Optional[str]] = Section()
+    app_state: Section[AppState] = Section(state_type=AppState)
+
+    @classmethod
+    def of(cls, genesis: "GenesisLike") -> "GenesisState":
+        """State of a decoded (or still encoded) document, states are kept as is."""
+        return genesis if isinstance(genesis, GenesisState) else cls(genesis)
+
+
+# what processors accept as the genesis document
+GenesisLike = Union[GenesisState, GenesisData]
@@ -139,7 +139,8 @@ async function saveContractEvent(instantiateMsg: InstantiateContractMessage, con
     id: contract_address,
     interface: getJaccardResult(JSON.parse(instantiateMsg.payload)),
     storeMessageId: storeCodeMsg.id,
-    instantiateMessageId: instantiateMsg.id
+    instantiateMessageId: instantiateMsg.id,
+    chainId: event.block.block.header.chainId,
   });
   await contract.save();
 }
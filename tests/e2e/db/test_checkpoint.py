@@ -0,0 +1,69 @@
+import unittest
+
+from src.genesis.db.checkpoint import Checkpoint
+from src.genesis.db.table_manager import DBTypes, TableManager
+from tests.helpers.clients import TestWithDBConn
+
+
+class TestCheckpoint(TestWithDBConn):
+    test_table = "checkpoint_testing"
+    items = [(str(i), i) for i in range(7)]
+
+    def setUp(self):
+        columns = (
+            ("text_column", DBTypes.text),
+            ("numeric_column", DBTypes.numeric),
+        )
+        self.table_manager = TableManager(
+            self.db_conn, self.test_table, columns, ("text_column",)
+        )
+        self.table_manager.drop_table()
+        self.table_manager.ensure_table()
+
+        self.checkpoint = Checkpoint(self.db_conn, "test-run", "test", chunk_size=2)
+        self.checkpoint.reset()
+
+    def process(self, fail_at=None):
+        processed = []
+        for chunk in self.checkpoint.iter_chunks(self.items):
+            with self.table_manager.db_copy_reconcile(
+                "text_column", commit=False
+            ) as copy:
+                for item in chunk:
+                    if item[1] == fail_at:
+                        raise RuntimeError("crash")
+                    copy.write_row(item)
+                    processed.append(item)
+        return processed
+
+    def test_resume(self):
+        with self.assertRaises(RuntimeError):
+            self.process(fail_at=5)
+        self.db_conn.rollback()
+
+        # only whole chunks are committed, along with their offset
+        self.assertEqual(4, self.checkpoint.get_offset())
+        rows = self.db_conn.execute(
+            f"SELECT text_column, numeric_column FROM {self.test_table} ORDER BY text_column"
+        ).fetchall()
+        self.assertListEqual(self.items[:4], rows)
+
+        self.assertListEqual(self.items[4:], self.process())
+        self.assertEqual(len(self.items), self.checkpoint.get_offset())
+        rows = self.db_conn.execute(
+            f"SELECT text_column, numeric_column FROM {self.test_table} ORDER BY text_column"
+        ).fetchall()
+        self.assertListEqual(self.items, rows)
+
+        # completed, nothing left to process
+        self.assertListEqual([], self.process())
+
+    def test_reset(self):
+        self.process()
+        self.checkpoint.reset()
+        self.assertEqual(0, self.checkpoint.get_offset())
+        self.assertListEqual(self.items, self.process())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@ import sys
 import unittest
 from pathlib import Path
 
+from src.genesis.db.indexes import build_indexes
+from src.genesis.db.schemas import create_schema, drop_schema
 from src.genesis.db.table_manager import DBTypes, TableManager
 from tests.helpers.clients import TestWithDBConn
 
@@ -52,6 +54,294 @@ class TestTableManager(TestWithDBConn):
         exists = self.table_manager.table_exists(self.test_table)
         self.assertFalse(exists)
 
+    def test__db_copy_reconcile(self) -> None:
+        self.table_manager.ensure_table()
+        with self.table_manager.db_copy() as copy:
+            copy.write_row(("existing", 1))
+
+        with self.table_manager.db_copy_reconcile("text_column") as copy:
+            copy.write_row(("existing", 2))
+            copy.write_row(("new", 3))
+
+        rows = self.db_conn.execute(
+            f"SELECT text_column, numeric_column FROM {self.test_table} ORDER BY text_column"
+        ).fetchall()
+        self.assertListEqual([("existing", 1), ("new", 3)], rows)
+        # NB: temporary staging table is dropped by the commit
+        staging_table = self.db_conn.execute(
+            "SELECT to_regclass(%s)", (f"pg_temp.{self.test_table}_staging",)
+        ).fetchone()
+        self.assertEqual((None,), staging_table)
+
+    def test__build_indexes(self) -> None:
+        table_manager = TableManager(
+            self.db_conn,
+            self.test_table,
+            self.table_manager.columns,
+            ("text_column", "numeric_column"),
+            primary_key="text_column",
+        )
+        table_manager.ensure_table()
+        with table_manager.db_copy() as copy:
+            copy.write_row(("a", 1))
+            copy.write_row(("b", 2))
+
+        # NB: idempotent, existing indexes and primary key are left alone
+        for _ in range(2):
+            build_indexes(self.db_conn, [table_manager])
+
+        indexes = self.db_conn.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'app' AND tablename = %s ORDER BY indexname",
+            (self.test_table,),
+        ).fetchall()
+        self.assertListEqual(
+            [
+                (f"{self.test_table}_numeric_column",),
+                (f"{self.test_table}_pkey",),
+            ],
+            indexes,
+        )
+        self.assertTrue(table_manager.has_primary_key())
+
+        analyzed = self.db_conn.execute(
+            "SELECT last_analyze IS NOT NULL FROM pg_stat_user_tables WHERE relname = %s",
+            (self.test_table,),
+        ).fetchone()
+        self.assertEqual((True,), analyzed)
+
+    def test__build_primary_key(self) -> None:
+        table_manager = TableManager(
+            self.db_conn,
+            self.test_table,
+            self.table_manager.columns,
+            ("text_column", "numeric_column"),
+            primary_key="text_column",
+        )
+        table_manager.ensure_table()
+        self.assertFalse(table_manager.has_primary_key())
+
+        # NB: ahead of the other indexes, then left alone by build_indexes
+        for _ in range(2):
+            table_manager.build_primary_key()
+        self.assertTrue(table_manager.has_primary_key())
+        indexes = self.db_conn.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'app' AND tablename = %s",
+            (self.test_table,),
+        ).fetchall()
+        self.assertListEqual([(f"{self.test_table}_pkey",)], indexes)
+
+        build_indexes(self.db_conn, [table_manager])
+        self.assertTrue(table_manager.has_primary_key())
+
+    def test__db_copy_shadow(self) -> None:
+        referencing_table = f"{self.test_table}_referencing"
+        table_manager = TableManager(
+            self.db_conn,
+            self.test_table,
+            self.table_manager.columns,
+            ("text_column", "numeric_column"),
+            primary_key="text_column",
+            shadow_load=True,
+        )
+        table_manager.ensure_table()
+        build_indexes(self.db_conn, [table_manager])
+        # NB: as subquery creates some, and PostGraphile reads foreign key comments
+        self.db_conn.execute(
+            f"""
+            DROP TABLE IF EXISTS {referencing_table};
+            CREATE TABLE {referencing_table} (
+                id text CONSTRAINT {referencing_table}_fkey
+                    REFERENCES {self.test_table} (text_column)
+            );
+            COMMENT ON CONSTRAINT {referencing_table}_fkey ON {referencing_table}
+                IS '@foreignFieldName referencing';
+            DROP INDEX {self.test_table}_numeric_column;
+            CREATE INDEX {self.test_table}_numeric_column ON {self.test_table}
+                USING hash (numeric_column);
+            ALTER TABLE {self.test_table} ALTER COLUMN numeric_column SET NOT NULL;
+        """
+        )
+        self.db_conn.commit()
+
+        # NB: table is empty, loaded through the shadow table
+        with table_manager.db_copy_reconcile("text_column") as copy:
+            copy.write_row(("a", 1))
+            copy.write_row(("b", 2))
+        self.db_conn.execute(f"INSERT INTO {referencing_table} VALUES ('a')")
+        self.db_conn.commit()
+
+        # NB: not empty anymore, reconciled
+        with table_manager.db_copy_reconcile("text_column") as copy:
+            copy.write_row(("a", 3))
+            copy.write_row(("c", 4))
+
+        rows = self.db_conn.execute(
+            f"SELECT text_column, numeric_column FROM {self.test_table} ORDER BY text_column"
+        ).fetchall()
+        self.assertListEqual([("a", 1), ("b", 2), ("c", 4)], rows)
+
+        persistence = self.db_conn.execute(
+            "SELECT relpersistence FROM pg_class WHERE oid = to_regclass(%s)",
+            (self.test_table,),
+        ).fetchone()
+        self.assertEqual(("p",), persistence)
+
+        # the live table's index definitions and NOT NULL columns are kept
+        indexes = self.db_conn.execute(
+            "SELECT indexname, indexdef LIKE '%%USING hash%%' FROM pg_indexes WHERE schemaname = 'app' AND tablename = %s ORDER BY indexname",
+            (self.test_table,),
+        ).fetchall()
+        self.assertListEqual(
+            [
+                (f"{self.test_table}_numeric_column", True),
+                (f"{self.test_table}_pkey", False),
+            ],
+            indexes,
+        )
+        self.assertTrue(table_manager.has_primary_key())
+        self.assertFalse(table_manager.table_exists(f"{self.test_table}_shadow"))
+        nullable = self.db_conn.execute(
+            "SELECT is_nullable FROM information_schema.columns WHERE table_name = %s AND column_name = 'numeric_column'",
+            (self.test_table,),
+        ).fetchone()
+        self.assertEqual(("NO",), nullable)
+
+        # foreign key re-created against the swapped in table with its comment, and
+        # validated
+        foreign_keys = self.db_conn.execute(
+            """
+            SELECT
+                confrelid = to_regclass(%s), convalidated,
+                obj_description(oid, 'pg_constraint')
+            FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = to_regclass(%s)
+            """,
+            (self.test_table, referencing_table),
+        ).fetchall()
+        self.assertListEqual(
+            [(True, True, "@foreignFieldName referencing")], foreign_keys
+        )
+
+        self.db_conn.execute(f"DROP TABLE {referencing_table}")
+        self.db_conn.commit()
+
+    def test__ensure_table_columns(self) -> None:
+        self.table_manager.ensure_table()
+        assert self.table_manager.columns is not None
+        columns = self.table_manager.columns + (("chain_id", DBTypes.text),)
+        TableManager(self.db_conn, self.test_table, columns).ensure_table()
+
+        # NB: existing tables get the columns they don't have yet
+        names = self.db_conn.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = %s ORDER BY ordinal_position",
+            (self.test_table,),
+        ).fetchall()
+        self.assertListEqual(
+            [("text_column",), ("numeric_column",), ("chain_id",)], names
+        )
+
+    def test__replace_from_schema(self) -> None:
+        self.table_manager.ensure_table()
+        create_schema(self.db_conn, "table_manager_shadow")
+        shadow_manager = TableManager(
+            self.db_conn,
+            self.test_table,
+            self.table_manager.columns,
+            self.table_manager.indexes,
+            schema="table_manager_shadow",
+        )
+        self.assertFalse(shadow_manager.table_exists(self.test_table))
+        shadow_manager.ensure_table()
+        self.assertTrue(shadow_manager.table_exists(self.test_table))
+        with shadow_manager.db_copy() as copy:
+            copy.write_row(("shadow", 1))
+        build_indexes(self.db_conn, [shadow_manager])
+
+        self.table_manager.replace(shadow_manager)
+        self.db_conn.commit()
+        drop_schema(self.db_conn, "table_manager_shadow")
+
+        rows = self.db_conn.execute(
+            f"SELECT text_column FROM {self.test_table}"
+        ).fetchall()
+        self.assertListEqual([("shadow",)], rows)
+        # NB: the index moved along with the table
+        indexes = self.db_conn.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'app' AND tablename = %s",
+            (self.test_table,),
+        ).fetchall()
+        self.assertListEqual([(f"{self.test_table}_numeric_column",)], indexes)
+
+    def test__partitioned(self) -> None:
+        columns = (
+            ("text_column", DBTypes.text),
+            ("numeric_column", DBTypes.numeric),
+            ("chain_id", DBTypes.text),
+        )
+        table_manager = TableManager(
+            self.db_conn,
+            self.test_table,
+            columns,
+            ("text_column", "chain_id"),
+            primary_key="text_column",
+            partition_by="chain_id",
+            partitioned=True,
+        )
+        table_manager.ensure_table()
+        self.assertTrue(table_manager.is_partitioned())
+
+        # NB: the same key in two chains, each in its own partition
+        for chain_id in ("chain-1", "chain-2"):
+            table_manager.ensure_partition(chain_id)
+            for _ in range(2):
+                with table_manager.db_copy_reconcile("text_column") as copy:
+                    copy.write_row(("a", 1, chain_id))
+        build_indexes(self.db_conn, [table_manager])
+        self.assertTrue(table_manager.has_primary_key())
+
+        partitions = self.db_conn.execute(
+            "SELECT tableoid::regclass::text, chain_id FROM "
+            f"{self.test_table} ORDER BY chain_id"
+        ).fetchall()
+        self.assertListEqual(
+            [
+                (f"{self.test_table}_chain_1", "chain-1"),
+                (f"{self.test_table}_chain_2", "chain-2"),
+            ],
+            partitions,
+        )
+
+        table_manager.drop_partition("chain-1")
+        rows = self.db_conn.execute(
+            f"SELECT text_column, chain_id FROM {self.test_table}"
+        ).fetchall()
+        self.assertListEqual([("a", "chain-2")], rows)
+        self.assertFalse(table_manager.table_exists(f"{self.test_table}_chain_1"))
+
+    def test__db_copy_binary(self) -> None:
+        columns = (
+            ("text_column", DBTypes.text),
+            ("numeric_column", DBTypes.numeric),
+            ("interface_column", DBTypes.interface),
+        )
+        indexes = ("text_column",)
+        table_manager = TableManager(
+            self.db_conn, self.test_table, columns, indexes, binary_copy=True
+        )
+        table_manager.ensure_table()
+
+        amount = 123456789012345678901234567890
+        with table_manager.db_copy() as copy:
+            copy.write_row(("binary", amount, "Uncertain"))
+            copy.write_row(("nulls", None, None))
+
+        rows = self.db_conn.execute(
+            f"SELECT text_column, numeric_column, interface_column FROM {self.test_table} ORDER BY text_column"
+        ).fetchall()
+        self.assertListEqual(
+            [("binary", amount, "Uncertain"), ("nulls", None, None)], rows
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
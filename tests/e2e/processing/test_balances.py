@@ -32,6 +32,23 @@ class TestBalanceManager(TestWithDBConn):
         actual_balances: [dict] = self.collect_actual_balances()
         self.check_balances(test_bank_state_balances, actual_balances)
 
+    def test_sharded(self):
+        self.reinit_db()
+
+        test_manager = BalanceManager(self.db_conn)
+        for shards in (2, 3):
+            # NB: existing balances are skipped, whichever shard they land in
+            test_manager.process_balances(
+                test_bank_state_balances, "test", shards=shards
+            )
+
+        actual_balances: [dict] = self.collect_actual_balances()
+        self.check_balances(test_bank_state_balances, actual_balances)
+        self.assertEqual(
+            sum(len(b["coins"]) for b in test_bank_state_balances),
+            sum(len(b["coins"]) for b in actual_balances),
+        )
+
     def collect_actual_balances(self):
         actual_balances = []
 
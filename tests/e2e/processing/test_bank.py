@@ -0,0 +1,79 @@
+import unittest
+
+from src.genesis.genesis import get_chain_id
+from src.genesis.helpers.field_enums import Accounts, GenesisBalances
+from src.genesis.processing.bank import FusedBankManager
+from tests.helpers.clients import TestWithDBConn
+from tests.helpers.genesis_data import test_bank_state_balances, test_genesis_data
+
+
+class TestFusedBankManager(TestWithDBConn):
+    expected_accounts = [
+        (b["address"], get_chain_id(test_genesis_data))
+        for b in test_bank_state_balances
+    ]
+    expected_balances = sorted(
+        (f'{b["address"]}-{c["denom"]}', b["address"], c["amount"], c["denom"])
+        for b in test_bank_state_balances
+        for c in b["coins"]
+    )
+
+    def setUp(self):
+        self.truncate_tables(["genesis_balances", "accounts"], cascade=True)
+
+    def collect_actual(self):
+        actual_accounts = sorted(
+            (row[Accounts.id.value], row[Accounts.chain_id.value])
+            for row in self.db_cursor.execute(Accounts.select_query())
+        )
+        actual_balances = sorted(
+            (
+                row[GenesisBalances.id.value],
+                row[GenesisBalances.account_id.value],
+                int(row[GenesisBalances.amount.value]),
+                row[GenesisBalances.denom.value],
+            )
+            for row in self.db_cursor.execute(GenesisBalances.select_query())
+        )
+        return actual_accounts, actual_balances
+
+    def test_process_genesis(self):
+        test_manager = FusedBankManager(self.db_conn)
+        test_manager.process_genesis(test_genesis_data, get_chain_id(test_genesis_data))
+
+        actual_accounts, actual_balances = self.collect_actual()
+        self.assertListEqual(self.expected_accounts, actual_accounts)
+        self.assertListEqual(self.expected_balances, actual_balances)
+
+    def test_process_genesis_binary_copy(self):
+        test_manager = FusedBankManager(self.db_conn, binary_copy=True)
+        test_manager.process_genesis(test_genesis_data, get_chain_id(test_genesis_data))
+
+        actual_accounts, actual_balances = self.collect_actual()
+        self.assertListEqual(self.expected_accounts, actual_accounts)
+        self.assertListEqual(self.expected_balances, actual_balances)
+
+    def test_rerun_skips_existing(self):
+        test_manager = FusedBankManager(self.db_conn)
+        for _ in range(2):
+            test_manager.process_genesis(
+                test_genesis_data, get_chain_id(test_genesis_data)
+            )
+
+        actual_accounts, actual_balances = self.collect_actual()
+        self.assertListEqual(self.expected_accounts, actual_accounts)
+        self.assertListEqual(self.expected_balances, actual_balances)
+
+    def test_accounts_without_coins(self):
+        genesis_data = {
+            "app_state": {"bank": {"balances": [{"address": "addr789", "coins": []}]}}
+        }
+        FusedBankManager(self.db_conn).process_genesis(genesis_data, "test")
+
+        actual_accounts, actual_balances = self.collect_actual()
+        self.assertListEqual([("addr789", "test")], actual_accounts)
+        self.assertListEqual([], actual_balances)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.genesis.compiled import MANIFEST, compile_genesis, load_compiled
+from src.genesis.db.baselines import GenesisBaselines
+from src.genesis.helpers.field_enums import Accounts, GenesisBalances
+from src.genesis.processing.contracts import ContractsManager
+from src.genesis.processing.wasm import WasmContractsManager
+from src.genesis.sources.genesis_source import GenesisSource
+from tests.e2e.processing.test_diff import get_genesis_data
+from tests.helpers.clients import TestWithDBConn
+
+balances = {f"addr{i}": {"a-token": i, "b-token": 2 * i} for i in range(1, 10)}
+contracts = ["contract1", "contract2"]
+
+
+class TestCompiled(TestWithDBConn):
+    def setUp(self):
+        ContractsManager(self.db_conn)
+        WasmContractsManager(self.db_conn)
+        GenesisBaselines(self.db_conn)
+        self.truncate_tables(
+            [
+                "genesis_balances",
+                "accounts",
+                "contracts",
+                "genesis_wasm_contracts",
+                "genesis_baselines",
+            ],
+            cascade=True,
+        )
+
+    def test_compile_and_load(self):
+        genesis_data = get_genesis_data(balances, contracts)
+        genesis_data["initial_height"] = "101"
+
+        with tempfile.TemporaryDirectory() as directory:
+            genesis_path = os.path.join(directory, "genesis.json")
+            with open(genesis_path, "w") as file:
+                json.dump(genesis_data, file)
+            compiled_dir = os.path.join(directory, "compiled")
+
+            manifest = compile_genesis(
+                GenesisSource(genesis_path),
+                compiled_dir,
+                parts=2,
+                sort=True,
+                only=["bank", "contracts", "wasm_contracts"],
+            )
+            with open(os.path.join(compiled_dir, MANIFEST)) as file:
+                self.assertDictEqual(manifest, json.load(file))
+            self.assertEqual(100, manifest["export_height"])
+            self.assertListEqual(
+                ["accounts", "genesis_balances", "contracts", "genesis_wasm_contracts"],
+                [table["table"] for table in manifest["tables"]],
+            )
+
+            # rows are split over the parts, each in order of its primary key
+            balance_parts = manifest["tables"][1]["parts"]
+            self.assertEqual(2, len(balance_parts))
+            self.assertEqual(18, sum(part["rows"] for part in balance_parts))
+            for part in balance_parts:
+                with open(os.path.join(compiled_dir, part["path"])) as file:
+                    ids = [line.split("\t", 1)[0] for line in file]
+                self.assertEqual(part["rows"], len(ids))
+                self.assertListEqual(sorted(ids), ids)
+                # NB: the order of the "C" collation
+                ordered = self.db_cursor.execute(
+                    'SELECT array_agg(id ORDER BY id COLLATE "C") FROM unnest(%s::text[]) id',
+                    (ids,),
+                ).fetchone()
+                self.assertEqual((ids,), ordered)
+
+            load_compiled(self.db_conn, compiled_dir)
+
+        chain_id = genesis_data["chain_id"]
+        accounts = self.db_cursor.execute(Accounts.select_query()).fetchall()
+        self.assertSetEqual(
+            {(address, chain_id) for address in balances}, set(accounts)
+        )
+        actual_balances = {
+            (
+                row[GenesisBalances.account_id.value],
+                row[GenesisBalances.denom.value],
+                int(row[GenesisBalances.amount.value]),
+            )
+            for row in self.db_cursor.execute(GenesisBalances.select_query())
+        }
+        self.assertSetEqual(
+            {
+                (address, denom, amount)
+                for address, coins in balances.items()
+                for denom, amount in coins.items()
+            },
+            actual_balances,
+        )
+        loaded_contracts = self.db_cursor.execute(
+            "SELECT id FROM genesis_wasm_contracts ORDER BY id"
+        ).fetchall()
+        self.assertListEqual([(address,) for address in contracts], loaded_contracts)
+        self.assertEqual(101, GenesisBaselines(self.db_conn).get_start_block(chain_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import json
+import tempfile
+import unittest
+from typing import Dict
+
+from src.genesis.db.schemas import create_schema, drop_schema
+from src.genesis.db.table_manager import DEFAULT_SCHEMA
+from src.genesis.diff import DiffCounts, process_genesis_diff
+from src.genesis.genesis import process_genesis_source
+from src.genesis.helpers.field_enums import Accounts, GenesisBalances
+from src.genesis.processing.contracts import ContractsManager
+from src.genesis.sources.genesis_source import GenesisSource
+from tests.helpers.clients import TestWithDBConn
+from tests.helpers.genesis_data import test_genesis_data
+
+
+def get_genesis_data(balances: Dict[str, Dict[str, int]], contracts) -> dict:
+    genesis_data = json.loads(json.dumps(test_genesis_data))
+    genesis_data["app_state"]["bank"]["balances"] = [
+        {
+            "address": address,
+            "coins": [{"amount": amount, "denom": d} for d, amount in coins.items()],
+        }
+        for address, coins in balances.items()
+    ]
+    genesis_data["app_state"]["wasm"] = {
+        "contracts": [
+            {"contract_address": address, "contract_info": {"code_id": "1"}}
+            for address in contracts
+        ]
+    }
+    return genesis_data
+
+
+old_balances = {
+    "addr1": {"a-token": 1, "b-token": 2},
+    "addr2": {"a-token": 3},
+    "addr3": {"a-token": 4},
+}
+new_balances = {
+    # changed, removed and unchanged balances
+    "addr1": {"a-token": 10, "c-token": 5},
+    "addr2": {"a-token": 3},
+    # addr3 removed, addr4 new
+    "addr4": {"b-token": 6},
+}
+
+
+class TestDiff(TestWithDBConn):
+    def setUp(self):
+        ContractsManager(self.db_conn)
+        self.truncate_tables(
+            ["genesis_balances", "accounts", "contracts"], cascade=True
+        )
+
+    def test_process_genesis_diff(self):
+        counts = self.check_process_genesis_diff()
+        self.assertDictEqual(
+            {
+                "accounts": DiffCounts(1, 0, 0),
+                "balances": DiffCounts(2, 1, 2),
+                "contracts": DiffCounts(1, 0, 0),
+            },
+            counts,
+        )
+
+        # NB: accounts and contracts are never removed
+        accounts = self.db_cursor.execute(Accounts.select_query()).fetchall()
+        self.assertSetEqual(
+            {"addr1", "addr2", "addr3", "addr4"}, {address for address, _ in accounts}
+        )
+
+    def test_process_genesis_diff_legacy_rows(self):
+        def clear_chain_id():
+            # rows loaded before the chain_id column was added
+            for table in ("genesis_balances", "contracts"):
+                self.db_cursor.execute(f"UPDATE {table} SET chain_id = NULL")
+            self.db_conn.commit()
+
+        self.check_process_genesis_diff(before_diff=clear_chain_id)
+
+    def test_process_genesis_diff_chain_id(self):
+        schema = "genesis_diff_testing"
+        create_schema(self.db_conn, schema)
+        self.check_process_genesis_diff(
+            new_chain_id="test-2", schema=schema, partitioned=True
+        )
+
+        # the balances of the old chain_id moved to the partition of the new one
+        chain_ids = self.db_cursor.execute(
+            f"SELECT DISTINCT chain_id FROM {schema}.genesis_balances"
+        ).fetchall()
+        self.assertListEqual([("test-2",)], chain_ids)
+        # NB: contracts are shared, the old chain_id's are kept
+        old_chain_id = test_genesis_data["chain_id"]
+        contracts = self.db_cursor.execute(
+            f"SELECT chain_id, id FROM {schema}.contracts"
+        ).fetchall()
+        self.assertSetEqual(
+            {
+                (old_chain_id, "contract1"),
+                (old_chain_id, "contract2"),
+                ("test-2", "contract2"),
+                ("test-2", "contract3"),
+            },
+            set(contracts),
+        )
+        drop_schema(self.db_conn, schema)
+
+    def check_process_genesis_diff(
+        self,
+        new_chain_id=None,
+        schema: str = DEFAULT_SCHEMA,
+        partitioned: bool = False,
+        before_diff=None,
+    ) -> Dict[str, DiffCounts]:
+        old_data = get_genesis_data(old_balances, ["contract1", "contract2"])
+        new_data = get_genesis_data(new_balances, ["contract2", "contract3"])
+        if new_chain_id is not None:
+            new_data["chain_id"] = new_chain_id
+
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".json"
+        ) as old_file, tempfile.NamedTemporaryFile("w", suffix=".json") as new_file:
+            for data, file in ((old_data, old_file), (new_data, new_file)):
+                json.dump(data, file)
+                file.flush()
+
+            process_genesis_source(
+                self.db_conn,
+                GenesisSource(old_file.name),
+                restart=True,
+                only=["bank"],
+                schema=schema,
+                partitioned=partitioned,
+            )
+            # NB: restarted, the tables were truncated since a previous run
+            process_genesis_source(
+                self.db_conn,
+                GenesisSource(old_file.name),
+                restart=True,
+                only=["contracts"],
+                schema=schema,
+                partitioned=partitioned,
+            )
+            if before_diff is not None:
+                before_diff()
+            # NB: every source is sorted over runs of (at most) one item
+            counts = process_genesis_diff(
+                self.db_conn,
+                GenesisSource(old_file.name),
+                GenesisSource(new_file.name),
+                only=["accounts", "balances", "contracts"],
+                run_size=1,
+                schema=schema,
+            )
+
+        balances = {
+            (
+                row[GenesisBalances.account_id.value],
+                row[GenesisBalances.denom.value],
+            ): int(row[GenesisBalances.amount.value])
+            for row in self.db_cursor.execute(
+                GenesisBalances.select_query([f"{schema}.genesis_balances"])
+            )
+        }
+        expected_balances = {
+            (address, denom): amount
+            for address, coins in new_balances.items()
+            for denom, amount in coins.items()
+        }
+        self.assertDictEqual(expected_balances, balances)
+
+        contracts = self.db_cursor.execute(
+            f"SELECT id FROM {schema}.contracts"
+        ).fetchall()
+        self.assertSetEqual(
+            {"contract1", "contract2", "contract3"}, {id_ for id_, in contracts}
+        )
+        return counts
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,385 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from src.genesis.db.baselines import GenesisBaselines
+from src.genesis.db.connection import clone_connection
+from src.genesis.db.runs import GenesisRuns
+from src.genesis.db.schemas import create_schema, drop_schema
+from src.genesis.genesis import (
+    get_chain_id,
+    process_genesis_source,
+    process_genesis_sources,
+)
+from src.genesis.helpers.field_enums import Accounts, GenesisBalances
+from src.genesis.helpers.sharding import Shard
+from src.genesis.processing.registry import DEFAULT_PROCESSORS, FUSED_PROCESSORS
+from src.genesis.sources.genesis_source import GenesisSource
+from tests.helpers.clients import TestWithDBConn
+from tests.helpers.genesis_data import test_bank_state_balances, test_genesis_data
+from tests.helpers.http_server import CountingHTTPServer, serve_test_data
+
+
+class TestGenesisSource(TestWithDBConn):
+    test_port = 8765
+    server: CountingHTTPServer
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        threading.Thread(target=serve_test_data, args=(cls,), daemon=True).start()
+        time.sleep(0.5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        super().tearDownClass()
+
+    def test_process_genesis_source(self):
+        self.check_process_genesis_source(fused=False)
+
+    def test_process_genesis_source_fused(self):
+        self.check_process_genesis_source(fused=True)
+
+    def test_process_genesis_source_concurrent(self):
+        timings = self.check_process_genesis_source(fused=False, concurrent=True)
+        self.assertSetEqual({"source", *DEFAULT_PROCESSORS, "indexes"}, set(timings))
+
+        timings = self.check_process_genesis_source(fused=True, concurrent=True)
+        self.assertSetEqual({"source", *FUSED_PROCESSORS, "indexes"}, set(timings))
+
+    def test_process_genesis_source_shadow_load(self):
+        self.truncate_tables("contracts", cascade=True)
+        self.check_process_genesis_source(fused=False, shadow_load=True)
+
+        # genesis_balances references the swapped in accounts table
+        foreign_keys = self.db_cursor.execute(
+            """
+            SELECT confrelid = 'accounts'::regclass, convalidated FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = 'genesis_balances'::regclass
+            """
+        ).fetchall()
+        self.assertListEqual([(True, True)], foreign_keys)
+
+    def test_process_genesis_source_shadow_schema(self):
+        self.check_process_genesis_source(fused=False)
+        # rows of a previous load, and an account the indexer wrote since
+        self.db_cursor.execute(
+            "INSERT INTO accounts (id, chain_id) VALUES ('fetch1stale', 'test')"
+        )
+        self.db_cursor.execute(
+            """
+            INSERT INTO genesis_balances (id, account_id, amount, denom, chain_id)
+            VALUES ('fetch1stale-atestfet', 'fetch1stale', 1, 'atestfet', 'test')
+            """
+        )
+        # NB: as subquery creates them, and PostGraphile reads foreign key comments
+        self.db_cursor.execute(
+            """
+            ALTER TABLE genesis_balances ALTER COLUMN denom SET NOT NULL;
+            DROP INDEX IF EXISTS genesis_balances_account_id;
+            CREATE INDEX genesis_balances_account_id ON genesis_balances
+                USING hash (account_id);
+            COMMENT ON CONSTRAINT genesis_balances_account_id_fkey ON genesis_balances
+                IS '@foreignFieldName genesisBalances';
+            """
+        )
+        self.db_conn.commit()
+
+        source = GenesisSource(f"http://localhost:{self.test_port}/genesis.json")
+        process_genesis_source(self.db_conn, source, shadow_schema="genesis_shadow")
+
+        # genesis_balances is replaced, accounts merged
+        balances = self.db_cursor.execute(
+            "SELECT id FROM genesis_balances WHERE account_id = 'fetch1stale'"
+        ).fetchall()
+        self.assertListEqual([], balances)
+        stale_account = self.db_cursor.execute(
+            "SELECT id FROM accounts WHERE id = 'fetch1stale'"
+        ).fetchall()
+        self.assertListEqual([("fetch1stale",)], stale_account)
+        self.db_cursor.execute("DELETE FROM accounts WHERE id = 'fetch1stale'")
+        self.db_conn.commit()
+        self.check_genesis_tables()
+
+        # the swapped in table is indexed and defined like the live one, still
+        # referencing accounts
+        indexes = dict(
+            self.db_cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = 'app' AND tablename = 'genesis_balances'"
+            ).fetchall()
+        )
+        self.assertIn("genesis_balances_pkey", indexes)
+        self.assertIn("USING hash", indexes["genesis_balances_account_id"])
+        nullable = self.db_cursor.execute(
+            """
+            SELECT is_nullable FROM information_schema.columns
+            WHERE table_schema = 'app' AND table_name = 'genesis_balances'
+                AND column_name = 'denom'
+            """
+        ).fetchone()
+        self.assertEqual(("NO",), nullable)
+        foreign_keys = self.db_cursor.execute(
+            """
+            SELECT
+                confrelid = 'accounts'::regclass, convalidated,
+                obj_description(oid, 'pg_constraint')
+            FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = 'genesis_balances'::regclass
+            """
+        ).fetchall()
+        self.assertListEqual(
+            [(True, True, "@foreignFieldName genesisBalances")], foreign_keys
+        )
+        schema = self.db_cursor.execute(
+            "SELECT to_regnamespace('genesis_shadow')"
+        ).fetchone()
+        self.assertEqual((None,), schema)
+
+    def test_process_genesis_source_chunked(self):
+        for fused in (False, True):
+            self.check_process_genesis_source(fused=fused, chunk_size=1)
+
+    def test_process_genesis_source_decode_workers(self):
+        for fused in (False, True):
+            self.check_process_genesis_source(
+                fused=fused, concurrent=True, chunk_size=1, decode_workers=2
+            )
+
+    def test_process_genesis_source_copy_shards(self):
+        self.check_process_genesis_source(fused=False, chunk_size=1, copy_shards=3)
+
+    def test_process_genesis_source_sharded(self):
+        self.truncate_tables(["genesis_balances", "accounts"], cascade=True)
+        shards = [Shard(index, 2) for index in range(2)]
+        section_names = [
+            name
+            for section in DEFAULT_PROCESSORS
+            for name in shards[0].get_all_section_names(section)
+        ]
+        GenesisRuns(self.db_conn).reset(section_names + ["indexes"])
+
+        def process_shard(shard: Shard) -> Dict[str, float]:
+            with clone_connection(self.db_conn) as shard_conn:
+                source = GenesisSource(
+                    f"http://localhost:{self.test_port}/genesis.json"
+                )
+                return process_genesis_source(shard_conn, source, shard=shard)
+
+        # NB: the same sections of both shards run at the same time, like pods of a Job
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            list(executor.map(process_shard, shards))
+
+        self.check_genesis_tables()
+        # every shard completed its sections, the last one the indexes
+        completed = self.db_cursor.execute(
+            "SELECT section FROM genesis_runs WHERE section = ANY(%s)",
+            (section_names + ["indexes"],),
+        ).fetchall()
+        self.assertSetEqual(
+            set(section_names + ["indexes"]), {section for section, in completed}
+        )
+
+    def test_process_genesis_source_only(self):
+        self.check_process_genesis_source(fused=False)
+        self.truncate_tables("genesis_balances")
+
+        # NB: selective re-run, accounts were processed before
+        source = GenesisSource(f"http://localhost:{self.test_port}/genesis.json")
+        timings = process_genesis_source(
+            self.db_conn, source, restart=True, only=["bank"], skip=["accounts"]
+        )
+        self.assertSetEqual({"source", "balances", "indexes"}, set(timings))
+        self.check_genesis_tables()
+
+    def test_process_genesis_source_unchanged(self):
+        for fused in (False, True):
+            self.check_process_genesis_source(fused=fused)
+            # NB: sections with the same digest as a completed run are skipped
+            self.truncate_tables(["genesis_balances", "accounts"], cascade=True)
+            timings = self.check_process_genesis_source(
+                fused=fused, restart=False, truncate=False, expect_empty=True
+            )
+            self.assertIn("contracts", timings)
+
+    def test_process_genesis_local_unchanged(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as genesis_file:
+            json.dump(test_genesis_data, genesis_file)
+            genesis_file.flush()
+            source = GenesisSource(genesis_file.name)
+
+            timings = process_genesis_source(self.db_conn, source, restart=True)
+            self.assertIn("accounts", timings)
+            # NB: whole source already processed, exits before reading it
+            self.assertDictEqual({}, process_genesis_source(self.db_conn, source))
+
+    def test_process_genesis_export(self):
+        baselines = GenesisBaselines(self.db_conn)
+        self.truncate_tables(["genesis_balances", "accounts", "genesis_baselines"])
+        export_data = {**test_genesis_data, "initial_height": "1000001"}
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as export_file:
+            json.dump(export_data, export_file)
+            export_file.flush()
+            process_genesis_source(
+                self.db_conn, GenesisSource(export_file.name), restart=True
+            )
+
+        self.check_genesis_tables()
+        chain_id = get_chain_id(test_genesis_data)
+        self.assertEqual(1000000, baselines.get_height(chain_id))
+        self.assertEqual(1000001, baselines.get_start_block(chain_id))
+
+        # NB: the genesis of a chain isn't a baseline, unless its height is given
+        self.check_process_genesis_source(fused=False)
+        self.assertEqual(1000000, baselines.get_height(chain_id))
+        source = GenesisSource(f"http://localhost:{self.test_port}/genesis.json")
+        process_genesis_source(self.db_conn, source, restart=True, export_height=42)
+        self.assertEqual(43, baselines.get_start_block(chain_id))
+
+    def test_process_genesis_export_schema(self):
+        schema = "genesis_schema_testing"
+        create_schema(self.db_conn, schema)
+        baselines = GenesisBaselines(self.db_conn)
+        self.truncate_tables("genesis_baselines")
+        chain_id = get_chain_id(test_genesis_data)
+
+        # NB: the baseline is recorded next to the tables, where the node reads it
+        source = GenesisSource(f"http://localhost:{self.test_port}/genesis.json")
+        process_genesis_source(
+            self.db_conn, source, restart=True, export_height=42, schema=schema
+        )
+        self.assertEqual(
+            43, GenesisBaselines(self.db_conn, schema).get_start_block(chain_id)
+        )
+        self.assertIsNone(baselines.get_start_block(chain_id))
+        # as are the runs of its sections, apart from those of other schemas
+        runs = self.db_cursor.execute(
+            f"SELECT section FROM {schema}.genesis_runs WHERE section = 'indexes'"
+        ).fetchall()
+        self.assertListEqual([("indexes",)], runs)
+        drop_schema(self.db_conn, schema)
+
+    def test_process_genesis_sources(self):
+        schema = "genesis_chains_testing"
+        create_schema(self.db_conn, schema)
+        # NB: the same addresses in both chains, hence the same balance ids
+        chain_ids = ("chain-a", "chain-b")
+
+        with tempfile.TemporaryDirectory() as directory:
+            sources = []
+            for chain_id in chain_ids:
+                location = f"{directory}/{chain_id}.json"
+                with open(location, "w") as file:
+                    json.dump({**test_genesis_data, "chain_id": chain_id}, file)
+                sources.append(GenesisSource(location))
+
+            # the rows of one chain would be dropped as existing in the default tables
+            with self.assertRaisesRegex(
+                ValueError, "genesis_balances isn't partitioned"
+            ):
+                process_genesis_sources(self.db_conn, sources, restart=True)
+            # each source would swap its own shadow in place of the shared tables
+            with self.assertRaisesRegex(ValueError, "can't be swapped in"):
+                process_genesis_sources(
+                    self.db_conn,
+                    sources,
+                    restart=True,
+                    schema=schema,
+                    partitioned=True,
+                    shadow_load=True,
+                )
+
+            timings = process_genesis_sources(
+                self.db_conn, sources, restart=True, schema=schema, partitioned=True
+            )
+            self.assertSetEqual({source.location for source in sources}, set(timings))
+
+        balances = self.db_cursor.execute(
+            f"SELECT id, account_id, chain_id FROM {schema}.genesis_balances"
+        ).fetchall()
+        self.assertSetEqual(
+            {
+                (f'{b["address"]}-{c["denom"]}', b["address"], chain_id)
+                for chain_id in chain_ids
+                for b in test_bank_state_balances
+                for c in b["coins"]
+            },
+            set(balances),
+        )
+        accounts = self.db_cursor.execute(
+            f"SELECT id FROM {schema}.accounts"
+        ).fetchall()
+        self.assertSetEqual(
+            {(b["address"],) for b in test_bank_state_balances}, set(accounts)
+        )
+        drop_schema(self.db_conn, schema)
+
+    def check_process_genesis_source(
+        self,
+        fused: bool,
+        concurrent: bool = False,
+        shadow_load: bool = False,
+        chunk_size=None,
+        restart: bool = True,
+        truncate: bool = True,
+        expect_empty: bool = False,
+        decode_workers=None,
+        copy_shards: int = 1,
+    ):
+        if truncate:
+            self.truncate_tables(["genesis_balances", "accounts"], cascade=True)
+        source = GenesisSource(f"http://localhost:{self.test_port}/genesis.json")
+
+        request_count = self.server.request_count
+        timings = process_genesis_source(
+            self.db_conn,
+            source,
+            fused=fused,
+            concurrent=concurrent,
+            shadow_load=shadow_load,
+            chunk_size=chunk_size,
+            restart=restart,
+            decode_workers=decode_workers,
+            copy_shards=copy_shards,
+        )
+        # every section is processed from a single download
+        self.assertEqual(request_count + 1, self.server.request_count)
+
+        self.check_genesis_tables(expect_empty)
+        return timings
+
+    def check_genesis_tables(self, expect_empty: bool = False):
+        expected_accounts = [
+            (b["address"], get_chain_id(test_genesis_data))
+            for b in test_bank_state_balances
+        ]
+        expected_balances = [
+            (f'{b["address"]}-{c["denom"]}', b["address"], c["amount"], c["denom"])
+            for b in test_bank_state_balances
+            for c in b["coins"]
+        ]
+
+        actual_accounts = self.db_cursor.execute(Accounts.select_query()).fetchall()
+        actual_balances = [
+            (
+                row[GenesisBalances.id.value],
+                row[GenesisBalances.account_id.value],
+                int(row[GenesisBalances.amount.value]),
+                row[GenesisBalances.denom.value],
+            )
+            for row in self.db_cursor.execute(GenesisBalances.select_query())
+        ]
+
+        if expect_empty:
+            expected_accounts, expected_balances = [], []
+        self.assertListEqual(sorted(expected_accounts), sorted(actual_accounts))
+        self.assertListEqual(sorted(expected_balances), sorted(actual_balances))
+
+
+if __name__ == "__main__":
+    unittest.main()
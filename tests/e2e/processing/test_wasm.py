@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from src.genesis.genesis import process_genesis_source
+from src.genesis.processing.wasm import (
+    ContractStatesManager,
+    WasmCodesManager,
+    WasmContractsManager,
+)
+from src.genesis.sources.genesis_source import GenesisSource
+from tests.helpers.clients import TestWithDBConn
+from tests.helpers.genesis_data import test_genesis_data
+
+code_bytes = os.urandom(3 * 1024 * 1024)
+contract_address = "fetch1contract"
+state = {b"balance/fetch1abc".hex(): b"1000", b"config".hex(): os.urandom(100)}
+
+test_wasm_state = {
+    # NB: both codes store the same bytes
+    "codes": [
+        {
+            "code_id": str(code_id),
+            "code_info": {"creator": "fetch1creator"},
+            "code_bytes": base64.b64encode(code_bytes).decode(),
+        }
+        for code_id in (1, 2)
+    ],
+    "contracts": [
+        {
+            "contract_address": contract_address,
+            "contract_info": {"code_id": "2", "creator": "fetch1creator", "admin": ""},
+            "contract_state": [
+                {"key": key, "value": base64.b64encode(value).decode()}
+                for key, value in state.items()
+            ],
+        }
+    ],
+}
+
+
+class TestWasm(TestWithDBConn):
+    def setUp(self):
+        # NB: creates the tables on a fresh database
+        WasmCodesManager(self.db_conn)
+        WasmContractsManager(self.db_conn)
+        ContractStatesManager(self.db_conn)
+        self.truncate_tables(
+            [
+                "genesis_wasm_code_blobs",
+                "genesis_wasm_codes",
+                "genesis_wasm_contracts",
+                "genesis_contract_states",
+            ]
+        )
+
+    def test_process_wasm(self):
+        genesis_data = json.loads(json.dumps(test_genesis_data))
+        genesis_data["app_state"]["wasm"] = test_wasm_state
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as genesis_file:
+            json.dump(genesis_data, genesis_file)
+            genesis_file.flush()
+            process_genesis_source(
+                self.db_conn,
+                GenesisSource(genesis_file.name),
+                restart=True,
+                chunk_size=1,
+                only=["wasm"],
+            )
+
+        # code bytes are stored once, by checksum
+        checksum = hashlib.sha256(code_bytes).hexdigest()
+        blobs = self.db_cursor.execute(
+            "SELECT id, size, code FROM genesis_wasm_code_blobs"
+        ).fetchall()
+        self.assertListEqual([(checksum, len(code_bytes), code_bytes)], blobs)
+        codes = self.db_cursor.execute(
+            "SELECT id, code_checksum, creator FROM genesis_wasm_codes ORDER BY id"
+        ).fetchall()
+        self.assertListEqual(
+            [("1", checksum, "fetch1creator"), ("2", checksum, "fetch1creator")],
+            codes,
+        )
+
+        contracts = self.db_cursor.execute(
+            "SELECT id, code_id, admin FROM genesis_wasm_contracts"
+        ).fetchall()
+        self.assertListEqual([(contract_address, "2", None)], contracts)
+        states = self.db_cursor.execute(
+            "SELECT contract_id, key, value FROM genesis_contract_states"
+        ).fetchall()
+        self.assertDictEqual(state, {key: value for address, key, value in states})
+        self.assertSetEqual({contract_address}, {address for address, *_ in states})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,19 @@
 import json
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, Optional
 
 from .genesis_data import test_genesis_data
 
 
+class CountingHTTPServer(HTTPServer):
+    request_count = 0
+
+
 class _TestHTTPRequestHandler(BaseHTTPRequestHandler):
+    server: CountingHTTPServer
+
     def do_GET(self):
+        self.server.request_count += 1
         self.send_response(200)
         self.send_header("content-type", "application/json")
         self.end_headers()
@@ -13,5 +21,72 @@ class _TestHTTPRequestHandler(BaseHTTPRequestHandler):
 
 
 def serve_test_data(cls):
-    cls.server = HTTPServer(("", cls.test_port), _TestHTTPRequestHandler)
+    cls.server = CountingHTTPServer(("", cls.test_port), _TestHTTPRequestHandler)
     cls.server.serve_forever()
+
+
+class RangeHTTPServer(CountingHTTPServer):
+    """
+    Serves body with an ETag, honouring Range/If-Range requests. The first response
+    is cut short after drop_after bytes, as if the connection dropped.
+    """
+
+    def __init__(
+        self,
+        body: bytes,
+        etag: Optional[str] = '"v1"',
+        content_encoding: Optional[str] = None,
+        drop_after: Optional[int] = None,
+    ):
+        super().__init__(("localhost", 0), _RangeHTTPRequestHandler)
+        self.body = body
+        self.etag = etag
+        self.content_encoding = content_encoding
+        self.drop_after = drop_after
+        self.ranges: List[Optional[str]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://localhost:{self.server_port}/genesis.json"
+
+
+class _RangeHTTPRequestHandler(BaseHTTPRequestHandler):
+    server: RangeHTTPServer
+
+    def log_message(self, *_):
+        pass
+
+    def send_headers(self) -> bytes:
+        body = self.server.body
+        range_ = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_ is not None and (if_range is None or if_range == self.server.etag):
+            offset = int(range_[len("bytes=") : -len("-")])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {offset}-{len(body) - 1}/{len(body)}"
+            )
+            body = body[offset:]
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.etag is not None:
+            self.send_header("ETag", self.server.etag)
+        if self.server.content_encoding is not None:
+            self.send_header("Content-Encoding", self.server.content_encoding)
+        self.end_headers()
+        return body
+
+    def do_HEAD(self):
+        self.send_headers()
+
+    def do_GET(self):
+        self.server.request_count += 1
+        self.server.ranges.append(self.headers.get("Range"))
+        body = self.send_headers()
+        if self.server.drop_after is not None:
+            body = body[: self.server.drop_after]
+            self.server.drop_after = None
+            self.close_connection = True
+        self.wfile.write(body)
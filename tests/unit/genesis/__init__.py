@@ -0,0 +1 @@
+from . import *  # noqa: F401
@@ -0,0 +1,23 @@
+import json
+import unittest
+
+from src.genesis.db.baselines import get_export_height, get_genesis_export_height
+from tests.helpers.genesis_data import test_genesis_data
+
+
+class TestBaselines(unittest.TestCase):
+    def test_get_export_height(self):
+        # NB: `fetchd export` at height H sets initial_height to H + 1
+        self.assertEqual(827200, get_export_height("827201"))
+        for initial_height in (None, "", "1"):
+            self.assertIsNone(get_export_height(initial_height))
+
+    def test_get_genesis_export_height(self):
+        self.assertIsNone(get_genesis_export_height(test_genesis_data))
+        export_data = {**test_genesis_data, "initial_height": "101"}
+        for data in (export_data, json.dumps(export_data).encode()):
+            self.assertEqual(100, get_genesis_export_height(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
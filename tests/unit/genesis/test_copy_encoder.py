@@ -0,0 +1,38 @@
+import json
+import unittest
+from functools import partial
+
+from src.genesis.db.copy_encoder import ParallelCopyEncoder, format_copy_row
+from src.genesis.processing.balances import BalanceManager
+from tests.helpers.genesis_data import test_bank_state_balances
+
+
+class TestCopyEncoder(unittest.TestCase):
+    def test_format_copy_row(self):
+        self.assertEqual(
+            "a\\\\b\\tc\\nd\t\\N\t123\n", format_copy_row(("a\\b\tc\nd", None, 123))
+        )
+
+    def test_iter_blocks(self):
+        balances = [
+            dict(balance, address=f'{balance["address"]}{i}')
+            for i in range(20)
+            for balance in test_bank_state_balances
+        ]
+        lines = [json.dumps(balance) + "\n" for balance in balances]
+        expected = "".join(
+            format_copy_row(row)
+            for balance in balances
+            for row in BalanceManager.get_rows(balance, "test")
+        )
+
+        # NB: many more batches than are kept in flight, rows stay in order
+        for batch_size in (1, 7, 1000):
+            with ParallelCopyEncoder(2, batch_size) as encoder:
+                get_rows = partial(BalanceManager.get_rows, chain_id="test")
+                blocks = encoder.iter_blocks(get_rows, lines)
+                self.assertEqual(expected, b"".join(blocks).decode())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from src.genesis.sources.download import DownloadCache, ResumableHTTPReader
+from src.genesis.sources.genesis_source import GenesisSource
+from tests.helpers.genesis_data import test_genesis_data
+from tests.helpers.http_server import RangeHTTPServer
+
+body = json.dumps(test_genesis_data).encode()
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = DownloadCache(self.cache_dir.name, backoff=0)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def serve(self, *args, **kwargs) -> RangeHTTPServer:
+        server = RangeHTTPServer(*args, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_resume(self):
+        server = self.serve(body, drop_after=100)
+        with ResumableHTTPReader(server.url, backoff=0) as reader:
+            self.assertEqual(body, reader.read())
+
+        # NB: the second request resumes where the connection dropped
+        self.assertListEqual([None, "bytes=100-"], server.ranges)
+
+    def test_cache(self):
+        server = self.serve(body, drop_after=100)
+        path = self.cache.fetch(server.url)
+        with open(path, "rb") as file:
+            self.assertEqual(body, file.read())
+        self.assertEqual(path, self.cache.lookup(server.url))
+
+        # NB: served from the cache without downloading it again
+        self.assertEqual(path, self.cache.fetch(server.url))
+        self.assertEqual(2, server.request_count)
+
+    def test_resume_partial(self):
+        server = self.serve(body)
+        key = self.cache.get_key(server.url, server.etag)
+        with open(f"{self.cache.get_path(key)}.part", "wb") as file:
+            file.write(body[:100])
+
+        # NB: a partial download left by a previous process is resumed
+        path = self.cache.fetch(server.url)
+        with open(path, "rb") as file:
+            self.assertEqual(body, file.read())
+        self.assertListEqual(["bytes=100-"], server.ranges)
+
+    def test_changed(self):
+        server = self.serve(body)
+        path = self.cache.fetch(server.url)
+
+        server.etag = '"v2"'
+        self.assertIsNone(self.cache.lookup(server.url))
+        self.assertNotEqual(path, self.cache.fetch(server.url))
+        self.assertEqual(2, server.request_count)
+
+    def test_stale_partial(self):
+        server = self.serve(body)
+
+        # NB: If-Range doesn't match the partial's version, the whole body is served
+        with ResumableHTTPReader(server.url, 100, '"v0"', backoff=0) as reader:
+            self.assertTrue(reader.restarted)
+            self.assertEqual(body, reader.read())
+
+    def test_no_validator(self):
+        server = self.serve(body, etag=None)
+        self.cache.fetch(server.url)
+
+        # NB: without a validator a cached copy could be stale
+        self.assertIsNone(self.cache.lookup(server.url))
+        self.cache.fetch(server.url)
+        self.assertEqual(2, server.request_count)
+
+    def test_gzip(self):
+        for content_encoding, location in (("gzip", ""), (None, ".gz")):
+            server = self.serve(gzip.compress(body), content_encoding=content_encoding)
+            url = server.url + location
+
+            for cache in (None, self.cache):
+                with GenesisSource(url, cache).open() as stream:
+                    self.assertEqual(body, stream.read())
+
+    def test_gzip_local(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "genesis.json.gz")
+            with open(path, "wb") as file:
+                file.write(gzip.compress(body))
+
+            for location in (path, f"file://{path}"):
+                source = GenesisSource(location)
+                self.assertTrue(source.is_local())
+                self.assertEqual(
+                    test_genesis_data["chain_id"], source.read_value("chain_id")
+                )
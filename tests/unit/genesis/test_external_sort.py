@@ -0,0 +1,30 @@
+import random
+import unittest
+
+from src.genesis.helpers.external_sort import group_sorted, sort_lines
+
+
+class TestExternalSort(unittest.TestCase):
+    def setUp(self):
+        keys = [f"addr{i:04}" for i in range(1000)] * 2
+        random.Random(0).shuffle(keys)
+        self.lines = [f"{key} {i}\n" for i, key in enumerate(keys)]
+
+    def test_sort_lines(self):
+        expected = sorted((line.split()[0], line) for line in self.lines)
+        # NB: in memory, then spilled into runs of (at most) 7 lines
+        for run_size in (len(self.lines) + 1, 7):
+            pairs = sort_lines(self.lines, lambda line: line.split()[0], run_size)
+            self.assertListEqual(expected, list(pairs))
+
+    def test_group_sorted(self):
+        pairs = sort_lines(self.lines, lambda line: line.split()[0], run_size=7)
+        groups = list(group_sorted(pairs))
+        self.assertEqual(1000, len(groups))
+        for key, lines in groups:
+            self.assertEqual(2, len(lines))
+            self.assertTrue(all(line.startswith(key) for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
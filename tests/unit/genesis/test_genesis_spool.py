@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.genesis.sources.genesis_source import GenesisSource
+from src.genesis.sources.genesis_spool import GenesisSpool
+from tests.helpers.genesis_data import test_bank_state_balances, test_genesis_data
+
+balances_path = "app_state.bank.balances[*]"
+contracts_path = "app_state.wasm.contracts[*]"
+
+
+class TestGenesisSpool(unittest.TestCase):
+    def setUp(self):
+        self.genesis_file = tempfile.NamedTemporaryFile("w", suffix=".json")
+        json.dump(test_genesis_data, self.genesis_file)
+        self.genesis_file.flush()
+        self.source = GenesisSource(self.genesis_file.name)
+
+    def tearDown(self):
+        self.genesis_file.close()
+
+    def test_load(self):
+        with GenesisSpool(
+            self.source, "chain_id", balances_path, balances_path, contracts_path
+        ) as spool:
+            spool.load()
+
+            # chain_id follows app_state but is available to every section
+            self.assertEqual(
+                test_genesis_data["chain_id"], spool.read_value("chain_id")
+            )
+            for _ in range(2):
+                self.assertListEqual(
+                    test_bank_state_balances, list(spool.iter_items(balances_path))
+                )
+            self.assertEqual(len(test_bank_state_balances), spool.count(balances_path))
+            self.assertListEqual(
+                test_genesis_data["app_state"]["wasm"].get("contracts", []),
+                list(spool.iter_items(contracts_path)),
+            )
+
+    def test_nested_paths(self):
+        genesis_data = json.loads(json.dumps(test_genesis_data))
+        genesis_data["app_state"]["wasm"] = {
+            "contracts": [
+                {"contract_address": "a", "contract_state": [{"key": "01"}] * 3},
+                {"contract_address": "b", "contract_state": []},
+                {"contract_address": "c", "contract_state": [{"key": "02"}]},
+            ]
+        }
+        states_path = f"{contracts_path}.contract_state[*]"
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as genesis_file:
+            json.dump(genesis_data, genesis_file)
+            genesis_file.flush()
+            with GenesisSpool(
+                GenesisSource(genesis_file.name), contracts_path, states_path
+            ) as spool:
+                spool.load()
+
+                # states are spooled apart from their contracts, along with them
+                self.assertListEqual(
+                    [{"contract_address": a} for a in "abc"],
+                    list(spool.iter_items(contracts_path)),
+                )
+                self.assertListEqual(
+                    [[{"contract_address": "a"}, {"key": "01"}]] * 3
+                    + [[{"contract_address": "c"}, {"key": "02"}]],
+                    list(spool.iter_items(states_path)),
+                )
+                self.assertEqual(4, spool.count(states_path))
+
+    def test_digests(self):
+        with GenesisSpool(self.source, "chain_id", balances_path) as spool:
+            spool.load()
+
+            with open(self.genesis_file.name, "rb") as genesis_file:
+                expected = hashlib.sha256(genesis_file.read()).hexdigest()
+            self.assertEqual(expected, spool.source_digest)
+            self.assertNotEqual(spool.digest(balances_path), spool.digest("chain_id"))
+
+        # NB: section digests don't depend on the rest of the document
+        other_data = dict(test_genesis_data, genesis_time="2000-01-01T00:00:00Z")
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as other_file:
+            json.dump(other_data, other_file, indent=2)
+            other_file.flush()
+            with GenesisSpool(
+                GenesisSource(other_file.name), "chain_id", balances_path
+            ) as other_spool:
+                other_spool.load()
+                self.assertNotEqual(spool.source_digest, other_spool.source_digest)
+                self.assertEqual(
+                    spool.digest(balances_path), other_spool.digest(balances_path)
+                )
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with GenesisSpool(self.source, balances_path, cache_dir=cache_dir) as spool:
+                spool.load()
+                digest = spool.digest(balances_path)
+
+            # NB: the cached spool outlives the one which parsed the source
+            with GenesisSpool(
+                self.source, balances_path, cache_dir=cache_dir
+            ) as cached_spool:
+                with mock.patch.object(GenesisSpool, "_spool") as parse:
+                    cached_spool.load()
+                    parse.assert_not_called()
+
+                self.assertEqual(digest, cached_spool.digest(balances_path))
+                self.assertListEqual(
+                    test_bank_state_balances,
+                    list(cached_spool.iter_items(balances_path)),
+                )
+
+            # other paths of the same source are spooled separately
+            with GenesisSpool(self.source, "chain_id", cache_dir=cache_dir) as spool:
+                spool.load()
+                self.assertEqual(
+                    test_genesis_data["chain_id"], spool.read_value("chain_id")
+                )
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
+    def test_missing_path(self):
+        with GenesisSpool(self.source, "app_state.missing") as spool:
+            spool.load()
+            self.assertListEqual([], list(spool.iter_items("app_state.missing")))
+            with self.assertRaises(KeyError):
+                spool.read_value("app_state.missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import io
+import json
+import unittest
+
+from src.genesis.helpers.json_stream import (
+    JSONStreamError,
+    iter_items,
+    iter_values,
+    parse_path,
+)
+from tests.helpers.genesis_data import test_bank_state_balances, test_genesis_data
+
+balances_path = "app_state.bank.balances[*]"
+
+
+class TestJSONStream(unittest.TestCase):
+    # NB: tiny chunk sizes force every token to straddle a read boundary
+    chunk_sizes = (1, 2, 7, 64, 1 << 20)
+
+    def stream(self, data) -> io.BytesIO:
+        return io.BytesIO(json.dumps(data, indent=2).encode())
+
+    def test_parse_path(self):
+        self.assertEqual(
+            ("app_state", "bank", "balances", "[*]"), parse_path(balances_path)
+        )
+        self.assertEqual(("a", "[*]", "[*]", "b"), parse_path("a[*][*].b"))
+
+    def test_iter_items(self):
+        for chunk_size in self.chunk_sizes:
+            actual = list(
+                iter_items(
+                    self.stream(test_genesis_data), balances_path, chunk_size=chunk_size
+                )
+            )
+            self.assertListEqual(test_bank_state_balances, actual)
+
+    def test_iter_values_document_order(self):
+        data = {
+            "app_state": {
+                "bank": {"balances": [{"address": 'a\\"]}'}], "supply": [[{}]]},
+                "skipped": {"x": ["]", "{", 1.5e3, None, True]},
+                "wasm": {"contracts": [{"contract_address": "addré"}]},
+            },
+            "chain_id": "test",
+            "initial_height": 12345,
+            "inflation": -0.0025,
+            "scale": 1.5e-7,
+            "halted": False,
+        }
+        expected = [
+            (balances_path, {"address": 'a\\"]}'}),
+            ("app_state.wasm.contracts[*]", {"contract_address": "addré"}),
+            ("chain_id", "test"),
+            ("initial_height", 12345),
+            ("inflation", -0.0025),
+            ("scale", 1.5e-7),
+            ("halted", False),
+        ]
+
+        for chunk_size in self.chunk_sizes:
+            actual = list(
+                iter_values(
+                    self.stream(data),
+                    "initial_height",
+                    "chain_id",
+                    balances_path,
+                    "app_state.wasm.contracts[*]",
+                    "inflation",
+                    "scale",
+                    "halted",
+                    chunk_size=chunk_size,
+                )
+            )
+            self.assertListEqual(expected, actual)
+
+    def test_scalar_split_by_read(self):
+        for chunk_size in self.chunk_sizes:
+            actual = list(
+                iter_values(io.BytesIO(b'{"c": -0.0025}'), "c", chunk_size=chunk_size)
+            )
+            self.assertListEqual([("c", -0.0025)], actual)
+
+            actual = list(iter_items(io.BytesIO(b"12e3"), "", chunk_size=chunk_size))
+            self.assertListEqual([12e3], actual)
+
+    def test_blob_paths(self):
+        data = {
+            "codes": [
+                {"id": 1, "bytes": "QUJD" * 100, "pinned": False},
+                {"id": 2, "bytes": 'escaped \\"\u00e9', "state": [{"v": "AA=="}]},
+            ]
+        }
+        for chunk_size in self.chunk_sizes:
+            blobs = []
+
+            def read_blob(path, chunks):
+                chunks = list(chunks)
+                # NB: never more than a read at a time
+                self.assertLessEqual(max(map(len, chunks), default=0), chunk_size)
+                blobs.append((path, "".join(chunks)))
+                return len(blobs) - 1
+
+            actual = list(
+                iter_values(
+                    self.stream(data),
+                    "codes[*]",
+                    chunk_size=chunk_size,
+                    blob_paths=("codes[*].bytes", "codes[*].state[*].v"),
+                    read_blob=read_blob,
+                )
+            )
+            self.assertListEqual(
+                [
+                    ("codes[*]", {"id": 1, "bytes": 0, "pinned": False}),
+                    ("codes[*]", {"id": 2, "bytes": 1, "state": [{"v": 2}]}),
+                ],
+                actual,
+            )
+            self.assertListEqual(
+                [
+                    ("codes[*].bytes", data["codes"][0]["bytes"]),
+                    ("codes[*].bytes", data["codes"][1]["bytes"]),
+                    ("codes[*].state[*].v", "AA=="),
+                ],
+                blobs,
+            )
+
+    def test_nested_paths(self):
+        data = {
+            "contracts": [
+                {"address": "a", "state": [{"k": 1}, {"k": 2}], "info": {"id": 1}},
+                {"address": "b", "state": []},
+            ]
+        }
+        for chunk_size in self.chunk_sizes:
+            # values within those of another path are yielded on their own, first
+            actual = list(
+                iter_values(
+                    self.stream(data),
+                    "contracts[*]",
+                    "contracts[*].state[*]",
+                    chunk_size=chunk_size,
+                )
+            )
+            self.assertListEqual(
+                [
+                    ("contracts[*].state[*]", {"k": 1}),
+                    ("contracts[*].state[*]", {"k": 2}),
+                    ("contracts[*]", {"address": "a", "info": {"id": 1}}),
+                    ("contracts[*]", {"address": "b"}),
+                ],
+                actual,
+            )
+
+            actual = list(
+                iter_values(
+                    self.stream(data),
+                    "contracts[*]",
+                    chunk_size=chunk_size,
+                    skip_paths=("contracts[*].state",),
+                )
+            )
+            self.assertListEqual(
+                [
+                    ("contracts[*]", {"address": "a", "info": {"id": 1}}),
+                    ("contracts[*]", {"address": "b"}),
+                ],
+                actual,
+            )
+
+    def test_missing_path(self):
+        self.assertListEqual(
+            [],
+            list(iter_items(self.stream(test_genesis_data), "app_state.wasm.codes[*]")),
+        )
+
+    def test_truncated_document(self):
+        truncated = io.BytesIO(json.dumps(test_genesis_data).encode()[:100])
+        with self.assertRaises(JSONStreamError):
+            list(iter_items(truncated, "chain_id"))
+
+
+if __name__ == "__main__":
+    unittest.main()
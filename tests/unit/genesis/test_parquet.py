@@ -0,0 +1,71 @@
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+
+from src.genesis.parquet import export_parquet
+from src.genesis.sources.genesis_source import GenesisSource
+from tests.helpers.genesis_data import test_bank_state_balances, test_genesis_data
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow isn't installed")
+class TestParquet(unittest.TestCase):
+    def test_export_parquet(self):
+        import pyarrow.parquet as pq
+
+        genesis_data = json.loads(json.dumps(test_genesis_data))
+        genesis_data["app_state"]["wasm"] = {
+            "contracts": [{"contract_address": "contract1", "contract_info": {}}]
+        }
+        # NB: beyond the 38 digits of decimal128
+        genesis_data["app_state"]["bank"]["balances"][0]["coins"][0]["amount"] = str(
+            10**40
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            genesis_path = os.path.join(directory, "genesis.json")
+            with open(genesis_path, "w") as file:
+                json.dump(genesis_data, file)
+
+            # NB: one row per batch
+            counts = export_parquet(
+                GenesisSource(genesis_path), directory, batch_size=1
+            )
+            self.assertDictEqual(
+                {"accounts": 2, "genesis_balances": 4, "contracts": 1}, counts
+            )
+
+            balances = pq.read_table(
+                os.path.join(directory, "genesis_balances.parquet")
+            )
+            self.assertEqual(4, balances.num_rows)
+            self.assertEqual(
+                genesis_data["chain_id"],
+                balances.schema.metadata[b"chain_id"].decode(),
+            )
+            amounts = {
+                (row["account_id"], row["denom"]): int(row["amount"])
+                for row in balances.to_pylist()
+            }
+            self.assertEqual(10**40, amounts[("addr123", "a-token")])
+            self.assertEqual(
+                {
+                    (balance["address"], coin["denom"])
+                    for balance in test_bank_state_balances
+                    for coin in balance["coins"]
+                },
+                set(amounts),
+            )
+
+            accounts = pq.read_table(os.path.join(directory, "accounts.parquet"))
+            self.assertListEqual(
+                sorted(balance["address"] for balance in test_bank_state_balances),
+                sorted(accounts.column("id").to_pylist()),
+            )
+            contracts = pq.read_table(os.path.join(directory, "contracts.parquet"))
+            self.assertListEqual(["contract1"], contracts.column("id").to_pylist())
+
+
+if __name__ == "__main__":
+    unittest.main()
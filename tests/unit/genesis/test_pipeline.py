@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+
+from src.genesis.helpers.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def test_run(self):
+        outputs = []
+        counters = Pipeline("test", batch_size=3).run(
+            range(10),
+            [("double", lambda i: [i, i]), ("square", lambda i: [i * i])],
+            ("sink", outputs.append),
+        )
+
+        # NB: outputs keep the order of the items
+        self.assertListEqual([i * i for i in range(10) for _ in range(2)], outputs)
+        self.assertListEqual(
+            [("parse", 10), ("double", 10), ("square", 20), ("sink", 20)],
+            [(counter.name, counter.items) for counter in counters],
+        )
+
+    def test_back_pressure(self):
+        read = []
+        written = []
+
+        def items():
+            for i in range(100):
+                read.append(i)
+                yield i
+
+        def sink(i):
+            # NB: no more than the queued batches (and the one being built) are ahead
+            self.assertLessEqual(len(read) - len(written), (2 + 1) * 2 + 1)
+            written.append(i)
+            time.sleep(0.001)
+
+        counters = Pipeline("test", batch_size=2, queue_size=2).run(
+            items(), [], ("sink", sink)
+        )
+        self.assertEqual(100, len(written))
+        # NB: the source waited on the slow sink
+        self.assertGreater(counters[0].waiting, counters[-1].waiting)
+
+    def test_errors(self):
+        def fail(_):
+            raise ValueError("failed")
+
+        def items():
+            yield 1
+            raise ValueError("failed")
+
+        for items_, transform, sink in (
+            (range(10_000), fail, lambda _: None),
+            (items(), lambda i: [i], lambda _: None),
+            (range(10_000), lambda i: [i], fail),
+        ):
+            with self.assertRaisesRegex(ValueError, "failed"):
+                Pipeline("test").run(items_, [("transform", transform)], ("sink", sink))
+
+        # NB: every stage stopped
+        self.assertListEqual(
+            [], [t for t in threading.enumerate() if t.name.startswith("test-")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
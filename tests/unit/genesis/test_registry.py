@@ -0,0 +1,33 @@
+import unittest
+
+from src.genesis.processing.registry import select_processors
+
+
+def get_names(*args, **kwargs):
+    return [processor.name for processor in select_processors(*args, **kwargs)]
+
+
+class TestRegistry(unittest.TestCase):
+    def test_select_processors(self):
+        self.assertListEqual(["accounts", "balances", "contracts"], get_names())
+        self.assertListEqual(["bank", "contracts"], get_names(fused=True))
+
+        # NB: wasm codes, contracts and states are opt-in
+        wasm = ["contracts", "wasm_codes", "wasm_contracts", "contract_states"]
+        self.assertListEqual(wasm, get_names(only=["wasm"]))
+        self.assertListEqual(
+            ["accounts", "wasm_codes"], get_names(only=["accounts", "wasm_codes"])
+        )
+
+        # NB: modules select every processor reading them
+        self.assertListEqual(["accounts", "balances"], get_names(only=["bank"]))
+        self.assertListEqual(["bank"], get_names(fused=True, skip=["wasm"]))
+        self.assertListEqual(["balances"], get_names(only=["bank"], skip=["accounts"]))
+
+    def test_unknown(self):
+        with self.assertRaisesRegex(ValueError, "staking"):
+            select_processors(skip=["staking"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from src.genesis.helpers.pipeline import Pipeline
+from src.genesis.helpers.sharding import Shard, get_shard, run_sharded
+
+
+class TestSharding(unittest.TestCase):
+    def test_get_shard(self):
+        # NB: stable across runs, unlike hash()
+        self.assertEqual(3, get_shard("fetch1abc", 4))
+        self.assertSetEqual({0, 1, 2}, {get_shard(str(i), 3) for i in range(100)})
+
+    def test_shard(self):
+        shards = [Shard(index, 3) for index in range(3)]
+        for key in map(str, range(100)):
+            # NB: every key is in exactly one shard
+            self.assertEqual(1, sum(shard.contains(key) for shard in shards))
+
+        self.assertListEqual(
+            ["balances[0/3]", "balances[1/3]", "balances[2/3]"],
+            shards[1].get_all_section_names("balances"),
+        )
+
+    def test_run_sharded(self):
+        shards = [[] for _ in range(3)]
+        items = [str(i) for i in range(1000)]
+        run_sharded(
+            items, str, [shard.extend for shard in shards], batch_size=7, queue_size=1
+        )
+
+        for i, shard in enumerate(shards):
+            # NB: every shard keeps the order of its items
+            self.assertListEqual([x for x in items if get_shard(x, 3) == i], shard)
+
+    def test_errors(self):
+        def fail(items):
+            for item in items:
+                if item == "500":
+                    raise ValueError("failed")
+
+        consumers = [fail, lambda items: list(items)]
+        with self.assertRaisesRegex(ValueError, "failed"):
+            run_sharded(map(str, range(10_000)), str, consumers, queue_size=1)
+
+    def test_pipeline_errors(self):
+        def copy(items, fail: bool = False):
+            def sink(_):
+                if fail:
+                    raise ValueError("failed")
+
+            Pipeline("test").run(items, [("rows", lambda i: [i])], ("copy", sink))
+
+        # NB: the other pipelines stop (rather than wait) once their items stop
+        consumers = [lambda items: copy(items, fail=True)] + [copy] * 2
+        with self.assertRaisesRegex(ValueError, "failed"):
+            run_sharded(map(str, range(10_000)), str, consumers, queue_size=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
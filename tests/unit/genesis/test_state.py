@@ -0,0 +1,56 @@
+import json
+import unittest
+from unittest import mock
+
+from src.genesis import state
+from src.genesis.state import GenesisState
+from tests.helpers.genesis_data import test_bank_state_balances, test_genesis_data
+from tests.helpers.utils import check_attrs, check_genesis_entries
+
+test_bank_state = test_genesis_data["app_state"]["bank"]
+
+
+class TestGenesisState(unittest.TestCase):
+    def setUp(self):
+        self.content = json.dumps(test_genesis_data).encode()
+
+    def test_lazy(self):
+        genesis = GenesisState(self.content)
+        with mock.patch.object(
+            state, "iter_values", wraps=state.iter_values
+        ) as iter_values:
+            bank = genesis.app_state.bank
+            iter_values.assert_not_called()
+
+            self.assertListEqual(test_bank_state_balances, bank.balances)
+            self.assertListEqual(test_bank_state_balances, bank.balances)
+            # NB: only the section which was accessed is decoded, once
+            self.assertListEqual(
+                ["app_state.bank.balances"],
+                [call.args[1] for call in iter_values.call_args_list],
+            )
+
+    def test_attrs(self):
+        for data in (self.content, test_genesis_data):
+            genesis = GenesisState(data)
+            self.assertEqual(test_genesis_data["chain_id"], genesis.chain_id)
+            check_attrs(self, test_bank_state, genesis.app_state.bank)
+            # missing keys have their default value
+            self.assertListEqual([], genesis.app_state.wasm.contracts)
+
+        with self.assertRaises(AttributeError):
+            genesis.staking = {}  # type: ignore
+
+    def test_leaves(self):
+        expected = [
+            (f"app_state.bank.{key}", test_bank_state[key])
+            for key in ("balances", "supply", "denom_metadata", "params")
+        ]
+        for data in (self.content, test_genesis_data):
+            check_genesis_entries(
+                self, expected, list(GenesisState(data).app_state.bank)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()